@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tamaño de batch adaptativo para las peticiones de clasificación a Gemini.
+
+BATCH_SIZE = 3 era fijo porque con más productos la respuesta se cortaba
+en maxOutputTokens. Pero la ficha de un rechazo ocupa poco y la de un
+aprobado mucho: con 3 fijos casi siempre sobra salida sin usar.
+
+- observe(n, output_tokens, truncated): tras cada respuesta. Media móvil
+  (EWMA) de tokens de salida por producto y de la tasa de cortes.
+- size(): productos por petición para llenar BATCH_FILL_TARGET de
+  MAX_OUTPUT_TOKENS, reducido según la tasa de cortes reciente.
+
+Una respuesta cortada no dice cuánto habría ocupado: se cuenta como si solo
+cupieran n-1 productos. El estado se guarda en batch_size_state.json para
+que un daemon reiniciado no vuelva a aprender desde cero.
+"""
+
+import os
+import logging
+
+import state_store
+
+logger = logging.getLogger("AdaptiveBatch")
+
+# Configuración
+MAX_OUTPUT_TOKENS = 8192
+BATCH_MIN = 1
+BATCH_MAX = int(os.getenv("GEMINI_BATCH_SIZE_MAX", "12"))
+BATCH_INITIAL = int(os.getenv("GEMINI_BATCH_SIZE", "3"))
+BATCH_FILL_TARGET = 0.75   # Margen: la longitud de cada ficha varía mucho
+EWMA_ALPHA = 0.2
+BATCH_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_size_state.json")
+
+_state = None
+
+
+def _initial_state():
+    return {
+        "tokens_per_product": MAX_OUTPUT_TOKENS * BATCH_FILL_TARGET / BATCH_INITIAL,
+        "truncation_rate": 0.0,
+        "observed": 0,
+    }
+
+def _load():
+    global _state
+    if _state is None:
+        _state = state_store.read_json(BATCH_STATE_FILE, None) or _initial_state()
+    return _state
+
+def size():
+    """Productos por petición según lo observado hasta ahora."""
+    state = _load()
+    budget = MAX_OUTPUT_TOKENS * BATCH_FILL_TARGET * (1 - state["truncation_rate"])
+    return max(BATCH_MIN, min(BATCH_MAX, int(budget / max(1.0, state["tokens_per_product"]))))
+
+def observe(products, output_tokens, truncated):
+    """Registra una respuesta de Gemini para un batch de products productos."""
+    if not products or output_tokens is None:
+        return
+    state = _load()
+    if truncated:
+        sample = MAX_OUTPUT_TOKENS / max(1, products - 1)
+    else:
+        sample = output_tokens / products
+    before = size()
+    state["tokens_per_product"] += EWMA_ALPHA * (sample - state["tokens_per_product"])
+    state["truncation_rate"] += EWMA_ALPHA * ((1.0 if truncated else 0.0) - state["truncation_rate"])
+    state["observed"] += 1
+    state_store.write_json(BATCH_STATE_FILE, state, indent=None, fsync=False)
+    if size() != before:
+        logger.info(f"📐 Batch size {before} -> {size()} ({state['tokens_per_product']:.0f} tokens/producto, "
+                    f"{state['truncation_rate']:.0%} cortadas)")
+
+def reset():
+    """Vuelve al tamaño inicial (tests o tras cambiar mucho el prompt)."""
+    global _state
+    _state = _initial_state()
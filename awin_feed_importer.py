@@ -12,6 +12,7 @@ Flujo:
 """
 
 import os
+import io
 import json
 import gzip
 import csv
@@ -19,9 +20,12 @@ import requests
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 import time
 
+import queue_store
+import state_store
+
 # Cargar configuración
 load_dotenv()
 
@@ -101,16 +105,12 @@ def filter_merchant_feeds(feed_list: List[Dict]) -> List[Dict]:
 
 def load_feed_timestamps() -> Dict[str, str]:
     """Carga timestamps de última descarga"""
-    if os.path.exists(FEED_TIMESTAMPS_FILE):
-        with open(FEED_TIMESTAMPS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return state_store.read_json(FEED_TIMESTAMPS_FILE, {})
 
 
 def save_feed_timestamps(timestamps: Dict[str, str]):
-    """Guarda timestamps de feeds descargados"""
-    with open(FEED_TIMESTAMPS_FILE, "w", encoding="utf-8") as f:
-        json.dump(timestamps, f, indent=2, ensure_ascii=False)
+    """Guarda timestamps de feeds descargados (fusiona con lo que haya en disco, bajo lock)"""
+    state_store.update(FEED_TIMESTAMPS_FILE, lambda current: {**(current or {}), **timestamps}, {})
 
 
 def needs_update(feed: Dict, last_timestamps: Dict[str, str]) -> bool:
@@ -124,8 +124,8 @@ def needs_update(feed: Dict, last_timestamps: Dict[str, str]) -> bool:
     return last_timestamps[feed_id] != last_updated
 
 
-def download_and_parse_feed(feed: Dict) -> List[Dict]:
-    """Descarga y parsea CSV gzipped de un feed"""
+def download_and_parse_feed(feed: Dict) -> Iterator[Dict]:
+    """Descarga y parsea CSV gzipped de un feed (streaming: fila a fila)"""
     feed_url = feed.get("URL")
     feed_id = feed.get("Feed ID")
     merchant_id = int(feed.get("Advertiser ID"))
@@ -133,47 +133,48 @@ def download_and_parse_feed(feed: Dict) -> List[Dict]:
     
     log_message(f"Downloading feed {feed_id} from {merchant_name}...")
     
+    parsed = 0
     try:
         # Descargar CSV gzipped
         response = requests.get(feed_url, timeout=60, stream=True)
         response.raise_for_status()
         
-        # Descomprimir y parsear
-        products = []
+        # Descomprimir y parsear sin cargar el CSV entero en memoria
         with gzip.GzipFile(fileobj=response.raw) as gz:
-            csv_content = gz.read().decode('utf-8', errors='ignore')
-            csv_reader = csv.DictReader(csv_content.splitlines())
+            text = io.TextIOWrapper(gz, encoding='utf-8', errors='ignore', newline='')
+            csv_reader = csv.DictReader(text)
             
             for row in csv_reader:
-                products.append({
+                parsed += 1
+                yield {
                     "merchant_id": merchant_id,
                     "merchant_name": merchant_name,
                     "feed_id": feed_id,
                     **row
-                })
+                }
         
-        log_message(f"✓ Parsed {len(products)} products from feed {feed_id}")
-        return products
+        log_message(f"✓ Parsed {parsed} products from feed {feed_id}")
     
     except Exception as e:
-        log_message(f"✗ ERROR downloading feed {feed_id}: {e}")
-        return []
+        log_message(f"✗ ERROR downloading feed {feed_id} (after {parsed} rows): {e}")
 
 
-def apply_quality_filters(products: List[Dict]) -> List[Dict]:
+def apply_quality_filters(products: Iterable[Dict], stats: Optional[Dict] = None) -> Iterator[Dict]:
     """Aplica Filtros de Excelencia (adaptados para Awin sin rating/reviews)"""
-    log_message(f"\n🔍 Applying quality filters to {len(products)} products...")
+    log_message(f"\n🔍 Applying quality filters (streaming)...")
     
-    filtered = []
-    stats = {
-        "total": len(products),
+    if stats is None:
+        stats = {}
+    stats.update({
+        "total": 0,
         "out_of_price_range": 0,
         "missing_ean": 0,
         "out_of_stock": 0,
         "passed": 0
-    }
+    })
     
     for product in products:
+        stats["total"] += 1
         # 1. Price check (12-200€)
         try:
             price_str = product.get("search_price", "0").replace(",", ".")
@@ -202,8 +203,8 @@ def apply_quality_filters(products: List[Dict]) -> List[Dict]:
             continue
         
         # ✓ Producto aprobado - rating/reviews los filtra Gemini
-        filtered.append(product)
         stats["passed"] += 1
+        yield product
     
     # Resumen
     log_message(f"\n📊 Filter Results:")
@@ -211,17 +212,15 @@ def apply_quality_filters(products: List[Dict]) -> List[Dict]:
     log_message(f"  ✗ Price out of range (€{MIN_PRICE}-{MAX_PRICE}): {stats['out_of_price_range']}")
     log_message(f"  ✗ Missing EAN: {stats['missing_ean']}")
     log_message(f"  ✗ Out of stock: {stats['out_of_stock']}")
-    log_message(f"  ✓ PASSED: {stats['passed']} ({(stats['passed']/stats['total']*100):.1f}%)")
+    log_message(f"  ✓ PASSED: {stats['passed']} ({(stats['passed']/max(1, stats['total'])*100):.1f}%)")
     log_message(f"\n💡 NOTE: Rating/reviews not in Awin feeds. Gemini will filter quality.")
-    
-    return filtered
 
 
-def transform_to_giftia_format(products: List[Dict]) -> List[Dict]:
+def transform_to_giftia_format(products: Iterable[Dict]) -> Iterator[Dict]:
     """Transforma productos de Awin al formato de pending_products.json"""
-    log_message(f"\n🔄 Transforming {len(products)} products to Giftia format...")
+    log_message(f"\n🔄 Transforming products to Giftia format...")
     
-    transformed = []
+    transformed = 0
     for product in products:
         # Extraer datos básicos
         title = product.get("product_name", "").strip()
@@ -279,35 +278,20 @@ def transform_to_giftia_format(products: List[Dict]) -> List[Dict]:
             "queued_at": datetime.now().isoformat()
         }
         
-        transformed.append(giftia_product)
-    
-    log_message(f"✓ Transformation complete: {len(transformed)} products ready")
-    return transformed
-
-
-def add_to_pending_queue(products: List[Dict]):
-    """Añade productos a pending_products.json"""
-    # Cargar cola existente
-    if os.path.exists(PENDING_PRODUCTS_FILE):
-        with open(PENDING_PRODUCTS_FILE, "r", encoding="utf-8") as f:
-            pending = json.load(f)
-    else:
-        pending = []
+        transformed += 1
+        yield giftia_product
     
-    # Evitar duplicados por EAN
-    existing_eans = {p.get("ean") for p in pending if p.get("ean")}
-    new_products = [p for p in products if p.get("ean") not in existing_eans]
-    
-    # Añadir nuevos productos
-    pending.extend(new_products)
-    
-    # Guardar
-    with open(PENDING_PRODUCTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(pending, f, indent=2, ensure_ascii=False)
-    
-    log_message(f"\n✓ Added {len(new_products)} new products to pending queue")
-    log_message(f"  (Skipped {len(products) - len(new_products)} duplicates by EAN)")
-    log_message(f"  Total pending: {len(pending)} products")
+    log_message(f"✓ Transformation complete: {transformed} products ready")
+
+
+def add_to_pending_queue(products: Iterable[Dict]) -> int:
+    """Añade productos a la cola (streaming, deduplicado por EAN/MPID contra el índice de la cola)"""
+    added, skipped = queue_store.add_many(products)
+    
+    log_message(f"\n✓ Added {added} new products to pending queue")
+    log_message(f"  (Skipped {skipped} duplicates by EAN)")
+    log_message(f"  Total pending: {queue_store.quick_count()} products")
+    return added
 
 
 def main():
@@ -342,36 +326,23 @@ def main():
     
     log_message(f"\n📥 {len(feeds_to_update)} feeds need updating")
     
-    # 5. Descargar y procesar feeds
-    all_products = []
+    # 5-8. Descargar -> filtrar -> transformar -> encolar, en streaming.
+    # Ni el feed ni la cola se cargan enteros en memoria.
     new_timestamps = last_timestamps.copy()
+    filter_stats = {}
+    added = 0
     
     for feed in feeds_to_update:
         products = download_and_parse_feed(feed)
-        all_products.extend(products)
+        filtered_products = apply_quality_filters(products, filter_stats)
+        giftia_products = transform_to_giftia_format(filtered_products)
+        added += add_to_pending_queue(giftia_products)
         
         # Actualizar timestamp
         new_timestamps[str(feed.get("feed_id"))] = feed.get("last_updated")
         
         time.sleep(1)  # Rate limiting cortés
     
-    if not all_products:
-        log_message("✗ No products downloaded")
-        return
-    
-    # 6. Aplicar filtros de calidad
-    filtered_products = apply_quality_filters(all_products)
-    
-    if not filtered_products:
-        log_message("✗ No products passed quality filters")
-        return
-    
-    # 7. Transformar a formato Giftia
-    giftia_products = transform_to_giftia_format(filtered_products)
-    
-    # 8. Añadir a pending queue
-    add_to_pending_queue(giftia_products)
-    
     # 9. Guardar timestamps
     save_feed_timestamps(new_timestamps)
     
@@ -380,9 +351,7 @@ def main():
     log_message("\n" + "=" * 80)
     log_message(f"✓ IMPORT COMPLETE in {elapsed:.1f}s")
     log_message(f"  Feeds processed: {len(feeds_to_update)}")
-    log_message(f"  Products downloaded: {len(all_products)}")
-    log_message(f"  Products passed filters: {len(filtered_products)}")
-    log_message(f"  New products added to queue: Ready for Gemini processing")
+    log_message(f"  New products added to queue: {added} - Ready for Gemini processing")
     log_message("=" * 80)
 
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trabajos batch (offline) para Gemini: para vaciar colas enormes.
+
+Tras un import de Awin con 20k+ productos el bucle online (petición y
+respuesta, GEMINI_CONCURRENCY en vuelo) tarda horas y ocupa al worker. La
+Batch API de Gemini procesa un fichero JSONL de peticiones en segundo plano,
+a mitad de precio y sin pelear con el RPM del pool.
+
+Cada trabajo vive en BULK_DIR con su job_id:
+- {job_id}.json             estado (prepared → submitted → succeeded/failed → merged)
+- {job_id}.requests.jsonl   una línea {"key", "request"} por petición
+- {job_id}.items.jsonl      los productos del trabajo (ya fuera de la cola)
+- {job_id}.results.jsonl    una línea {"key", "response"|"error"} al terminar
+
+Todo está en disco: un proceso que muera se retoma con el mismo job_id.
+
+Ejecutores (EXECUTORS): "gemini" (Files API + batchGenerateContent) y
+"local" (las mismas peticiones con gemini_client, sin Batch API: útil en
+tests o si la cuenta no tiene Batch API). register_executor() añade otros.
+
+Uso:
+    python bulk_jobs.py                  # Lista de trabajos
+    python bulk_jobs.py JOB_ID           # Estado de un trabajo
+"""
+
+import os
+import time
+import uuid
+import logging
+import requests
+
+import gemini_client
+import records
+import state_store
+
+logger = logging.getLogger("BulkJobs")
+
+# Configuración
+BULK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bulk_jobs")
+BULK_EXECUTOR = os.getenv("GEMINI_BULK_EXECUTOR", "gemini")
+BULK_POLL_SECONDS = int(os.getenv("GEMINI_BULK_POLL_SECONDS", "60"))
+DONE_STATES = ("succeeded", "failed")
+
+
+# ============================================================================
+# FICHEROS DEL TRABAJO
+# ============================================================================
+
+def job_path(job_id, suffix=".json"):
+    return os.path.join(BULK_DIR, f"{job_id}{suffix}")
+
+def load_job(job_id):
+    """Estado del trabajo o None si no existe."""
+    return state_store.read_json(job_path(job_id), None)
+
+def update_job(job_id, **changes):
+    """Actualiza campos del estado bajo lock. Retorna el estado nuevo."""
+    def _apply(job):
+        job.update(changes)
+        job["updated"] = time.time()
+        return job
+    return state_store.update(job_path(job_id), _apply, {})
+
+def list_jobs():
+    if not os.path.isdir(BULK_DIR):
+        return []
+    jobs = [load_job(name[:-5]) for name in sorted(os.listdir(BULK_DIR))
+            if name.endswith(".json") and not name.endswith(".tmp.json")]
+    return [job for job in jobs if job]
+
+def create_job(requests_by_key, items, meta=None, executor=None):
+    """Escribe un trabajo nuevo en disco (estado "prepared"). Retorna su job_id.
+
+    requests_by_key: [(key, GenerateContentRequest)]; items: los productos;
+    meta: datos del llamador para el merge (p. ej. qué items van en cada key).
+    """
+    os.makedirs(BULK_DIR, exist_ok=True)
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    records.write_records(job_path(job_id, ".requests.jsonl"),
+                          ({"key": key, "request": request} for key, request in requests_by_key))
+    records.write_records(job_path(job_id, ".items.jsonl"), items)
+    state_store.write_json(job_path(job_id), {
+        "job_id": job_id,
+        "state": "prepared",
+        "executor": executor or BULK_EXECUTOR,
+        "requests": len(requests_by_key),
+        "items": len(items),
+        "meta": meta or {},
+        "merged_keys": [],
+        "created": time.time(),
+        "updated": time.time(),
+    })
+    logger.info(f"📝 Trabajo {job_id}: {len(requests_by_key)} peticiones, {len(items)} productos")
+    return job_id
+
+def job_items(job_id):
+    return records.read_records(job_path(job_id, ".items.jsonl"))
+
+def job_results(job_id):
+    """{key: texto de la respuesta o None si esa petición falló}."""
+    results = {}
+    for line in records.iter_records(job_path(job_id, ".results.jsonl")):
+        candidate = ((line.get("response") or {}).get("candidates") or [{}])[0]
+        parts = candidate.get("content", {}).get("parts") or [{}]
+        results[line.get("key")] = parts[0].get("text") if "response" in line else None
+    return results
+
+
+# ============================================================================
+# EJECUTOR "gemini": Files API + batchGenerateContent
+# ============================================================================
+
+def _key():
+    return gemini_client.GEMINI_API_KEYS[0]
+
+def _gemini_submit(job):
+    """Sube el JSONL y crea el batch. Retorna los campos a guardar en el estado."""
+    path = job_path(job["job_id"], ".requests.jsonl")
+    size = os.path.getsize(path)
+    start = requests.post(f"{gemini_client.GEMINI_BASE_URL}/upload/v1beta/files?key={_key()}", json={
+        "file": {"display_name": f"giftia-{job['job_id']}"}
+    }, headers={
+        "X-Goog-Upload-Protocol": "resumable",
+        "X-Goog-Upload-Command": "start",
+        "X-Goog-Upload-Header-Content-Length": str(size),
+        "X-Goog-Upload-Header-Content-Type": "application/jsonl",
+    }, timeout=60)
+    start.raise_for_status()
+    with open(path, 'rb') as f:
+        upload = requests.post(start.headers["X-Goog-Upload-URL"], data=f, headers={
+            "Content-Length": str(size),
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        }, timeout=600)
+    upload.raise_for_status()
+    input_file = upload.json()["file"]["name"]
+
+    batch = requests.post(
+        f"{gemini_client.GEMINI_BASE_URL}/v1beta/models/{gemini_client.GEMINI_MODEL}:batchGenerateContent?key={_key()}",
+        json={"batch": {"display_name": f"giftia-{job['job_id']}", "input_config": {"file_name": input_file}}},
+        timeout=60)
+    batch.raise_for_status()
+    return {"remote_file": input_file, "remote_batch": batch.json()["name"]}
+
+def _gemini_poll(job):
+    """"running", "succeeded" o "failed" (+ campos a guardar)."""
+    response = requests.get(f"{gemini_client.GEMINI_BASE_URL}/v1beta/{job['remote_batch']}?key={_key()}", timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    remote_state = data.get("metadata", {}).get("state", "")
+    if remote_state == "BATCH_STATE_SUCCEEDED":
+        return "succeeded", {"remote_results": data.get("response", {}).get("responsesFile")}
+    if remote_state in ("BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"):
+        return "failed", {"remote_state": remote_state}
+    return "running", {"remote_state": remote_state}
+
+def _gemini_fetch(job):
+    """Descarga el JSONL de resultados a {job_id}.results.jsonl."""
+    url = f"{gemini_client.GEMINI_BASE_URL}/download/v1beta/{job['remote_results']}:download?alt=media&key={_key()}"
+    with requests.get(url, stream=True, timeout=600) as response:
+        response.raise_for_status()
+        tmp_file = job_path(job["job_id"], ".results.jsonl.tmp")
+        with open(tmp_file, 'wb') as f:
+            for chunk in response.iter_content(1 << 20):
+                f.write(chunk)
+    os.replace(tmp_file, job_path(job["job_id"], ".results.jsonl"))
+
+
+# ============================================================================
+# EJECUTOR "local": las mismas peticiones por gemini_client
+# ============================================================================
+
+def _local_submit(job):
+    """Ejecuta todas las peticiones ya (con el pool de keys) y deja los resultados."""
+    lines = records.read_records(job_path(job["job_id"], ".requests.jsonl"))
+    prompts = [line["request"]["contents"][0]["parts"][0]["text"] for line in lines]
+    config = lines[0]["request"].get("generationConfig", {}) if lines else {}
+    texts = gemini_client.generate_many(prompts, temperature=config.get("temperature", 0.4),
+                                        max_output_tokens=config.get("maxOutputTokens", 8192),
+                                        response_schema=config.get("responseSchema"))
+    records.write_records(job_path(job["job_id"], ".results.jsonl"), (
+        {"key": line["key"], "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]}}
+        if text is not None else {"key": line["key"], "error": {"message": "sin respuesta"}}
+        for line, text in zip(lines, texts)))
+    return {}
+
+def _local_poll(job):
+    return "succeeded", {}
+
+def _local_fetch(job):
+    pass  # _local_submit ya dejó los resultados
+
+
+EXECUTORS = {
+    "gemini": {"submit": _gemini_submit, "poll": _gemini_poll, "fetch": _gemini_fetch},
+    "local": {"submit": _local_submit, "poll": _local_poll, "fetch": _local_fetch},
+}
+
+def register_executor(name, submit, poll, fetch):
+    """Añade un ejecutor: submit(job) → dict, poll(job) → (estado, dict), fetch(job)."""
+    EXECUTORS[name] = {"submit": submit, "poll": poll, "fetch": fetch}
+
+
+# ============================================================================
+# CICLO DE VIDA
+# ============================================================================
+
+def advance(job_id):
+    """Un paso del trabajo: enviar, consultar o descargar. Retorna el estado."""
+    job = load_job(job_id)
+    if job is None:
+        raise ValueError(f"Trabajo {job_id} no existe en {BULK_DIR}")
+    executor = EXECUTORS[job["executor"]]
+    if job["state"] == "prepared":
+        remote = executor["submit"](job)
+        job = update_job(job_id, state="submitted", submitted=time.time(), **remote)
+        logger.info(f"🚀 Trabajo {job_id} enviado ({job['executor']})")
+    if job["state"] == "submitted":
+        state, remote = executor["poll"](job)
+        job = update_job(job_id, **remote)
+        if state == "succeeded":
+            executor["fetch"](job)
+            job = update_job(job_id, state="succeeded", finished=time.time())
+            logger.info(f"✅ Trabajo {job_id} terminado")
+        elif state == "failed":
+            job = update_job(job_id, state="failed", finished=time.time())
+            logger.warning(f"❌ Trabajo {job_id} falló ({job.get('remote_state', '?')})")
+    return job["state"]
+
+def wait(job_id, poll_seconds=None):
+    """Avanza el trabajo hasta succeeded/failed (o ya merged). Retorna el estado."""
+    while True:
+        state = advance(job_id)
+        if state in DONE_STATES or state == "merged":
+            return state
+        time.sleep(poll_seconds or BULK_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    import sys
+    jobs = [load_job(sys.argv[1])] if len(sys.argv) > 1 else list_jobs()
+    if not any(jobs):
+        print("📭 No hay trabajos batch")
+    for job in filter(None, jobs):
+        merged = len(job.get("merged_keys", []))
+        print(f"📦 {job['job_id']}: {job['state']} ({job['executor']}) | {job['items']} productos, "
+              f"{job['requests']} peticiones, {merged} integradas")
@@ -3,33 +3,36 @@
 import json
 import requests
 
-# Verificar productos en cola
+import queue_store
+import records
+
+# Verificar productos en cola (sin cargar la cola entera)
 try:
-    with open("pending_products.json", "r", encoding="utf-8") as f:
-        queue = json.load(f)
-    print(f"✓ Productos en cola: {len(queue)}")
+    print(f"✓ Productos en cola: {queue_store.quick_count()}")
 except:
     print("✗ No hay pending_products.json")
 
-# Verificar productos procesados
+# Verificar productos procesados (una pasada en streaming)
 try:
-    with open("processed_products.json", "r", encoding="utf-8") as f:
-        processed = json.load(f)
-    
-    published = [p for p in processed if p.get("status") == "published"]
-    rejected = [p for p in processed if p.get("status") == "rejected"]
-    errors = [p for p in processed if p.get("status") == "error"]
+    total = 0
+    statuses = {"published": 0, "rejected": 0, "error": 0}
+    error_codes = {400: 0, 500: 0}
+    for p in records.iter_records("processed_products.json"):
+        total += 1
+        status = p.get("status")
+        if status in statuses:
+            statuses[status] += 1
+        if status == "error" and p.get("http_code") in error_codes:
+            error_codes[p.get("http_code")] += 1
     
-    print(f"✓ Productos procesados: {len(processed)}")
-    print(f"  - Publicados: {len(published)}")
-    print(f"  - Rechazados: {len(rejected)}")
-    print(f"  - Errores: {len(errors)}")
+    print(f"✓ Productos procesados: {total}")
+    print(f"  - Publicados: {statuses['published']}")
+    print(f"  - Rechazados: {statuses['rejected']}")
+    print(f"  - Errores: {statuses['error']}")
     
-    if errors:
-        error_400 = [e for e in errors if e.get("http_code") == 400]
-        error_500 = [e for e in errors if e.get("http_code") == 500]
-        print(f"    → Error 400: {len(error_400)}")
-        print(f"    → Error 500: {len(error_500)}")
+    if statuses["error"]:
+        print(f"    → Error 400: {error_codes[400]}")
+        print(f"    → Error 500: {error_codes[500]}")
 except:
     print("✗ No hay processed_products.json")
 
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché persistente de clasificaciones y fichas SEO de Gemini.
+
+Los mismos productos se mandaban a Gemini una y otra vez: reintentos,
+reprocesados, reclasificaciones y el mismo EAN que llega desde varios
+merchants de Awin. Ahora cada resultado válido se guarda en SQLite y un
+acierto evita la llamada.
+
+Clave (fingerprint): sha1 de
+- título normalizado (minúsculas, sin acentos ni signos, espacios simples)
+- banda de precio (PRICE_BANDS): 24,99€ y 26€ comparten resultado
+- versión del prompt (la pone cada llamador: "curador-v51", "reclassify-v1"...)
+- versión del schema (version de giftia_schema.json + hash del fichero)
+
+Cambiar el prompt o el schema invalida la caché sin borrarla a mano.
+Las entradas caducan a los CACHE_TTL_DAYS y, por encima de CACHE_MAX_ENTRIES,
+se expulsan las menos usadas recientemente.
+
+Uso:
+    python classification_cache.py            # Estado
+    python classification_cache.py --evict    # Caducadas + exceso fuera
+    python classification_cache.py --clear    # Vaciar
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger("ClassificationCache")
+
+# Configuración
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB_FILE = os.getenv("CLASSIFICATION_CACHE_DB", os.path.join(BASE_DIR, "classification_cache.db"))
+CACHE_TTL_DAYS = float(os.getenv("CLASSIFICATION_CACHE_TTL_DAYS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX", "50000"))
+EVICT_EVERY = 200  # Comprobar tamaño cada N escrituras
+PRICE_BANDS = (10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000)
+SCHEMA_FILE = os.path.join(BASE_DIR, "giftia_schema.json")
+BUSY_TIMEOUT_SECONDS = 30
+
+_conn = None
+_conn_path = None
+_conn_pid = None
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "stores": 0}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS cache (
+    fingerprint TEXT PRIMARY KEY,
+    prompt_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache(last_used);
+CREATE INDEX IF NOT EXISTS idx_cache_created_at ON cache(created_at);
+"""
+
+
+def _schema_version():
+    """version de giftia_schema.json + hash corto (por si se edita sin subir versión)."""
+    try:
+        with open(SCHEMA_FILE, 'rb') as f:
+            raw = f.read()
+        version = json.loads(raw.decode('utf-8')).get("version", "")
+        return f"{version}-{hashlib.sha1(raw).hexdigest()[:8]}"
+    except (OSError, ValueError):
+        return "sin-schema"
+
+SCHEMA_VERSION = _schema_version()
+
+
+# ============================================================================
+# FINGERPRINT
+# ============================================================================
+
+def normalize_title(title):
+    """Título comparable: minúsculas, sin acentos ni signos, espacios simples."""
+    text = unicodedata.normalize("NFKD", str(title or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+def price_band(price):
+    """Banda de precio ("20-30", "1000+") o "?" si no se entiende el precio."""
+    try:
+        value = float(str(price).replace("€", "").replace(",", ".").strip())
+    except (TypeError, ValueError):
+        return "?"
+    low = 0
+    for limit in PRICE_BANDS:
+        if value < limit:
+            return f"{low}-{limit}"
+        low = limit
+    return f"{low}+"
+
+def fingerprint(title, price, prompt_version):
+    """Clave de caché de un producto para un prompt concreto."""
+    parts = [normalize_title(title), price_band(price), prompt_version, SCHEMA_VERSION]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+# ============================================================================
+# CONEXIÓN
+# ============================================================================
+
+def _connect():
+    """Conexión perezosa por proceso (se reabre si cambia CACHE_DB_FILE o tras fork)."""
+    global _conn, _conn_path, _conn_pid
+    if _conn is not None and _conn_path == CACHE_DB_FILE and _conn_pid == os.getpid():
+        return _conn
+    if _conn is not None and _conn_pid == os.getpid():
+        _conn.close()
+    _conn = sqlite3.connect(CACHE_DB_FILE, timeout=BUSY_TIMEOUT_SECONDS,
+                            isolation_level=None, check_same_thread=False)
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _conn.executescript(SCHEMA_SQL)
+    _conn_path = CACHE_DB_FILE
+    _conn_pid = os.getpid()
+    return _conn
+
+
+# ============================================================================
+# API
+# ============================================================================
+
+def get(title, price, prompt_version, now=None):
+    """Resultado guardado para este producto y prompt, o None (y cuenta el fallo)."""
+    now = now or time.time()
+    key = fingerprint(title, price, prompt_version)
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT result, created_at FROM cache WHERE fingerprint = ?", (key,)).fetchone()
+        if row is not None and now - row[1] > CACHE_TTL_DAYS * 86400:
+            conn.execute("DELETE FROM cache WHERE fingerprint = ?", (key,))
+            row = None
+        if row is None:
+            stats["misses"] += 1
+            return None
+        conn.execute("UPDATE cache SET last_used = ?, hits = hits + 1 WHERE fingerprint = ?", (now, key))
+    stats["hits"] += 1
+    return json.loads(row[0])
+
+def put(title, price, prompt_version, result, now=None):
+    """Guarda un resultado válido de Gemini (no guardar fallos ni None)."""
+    if result is None:
+        return
+    now = now or time.time()
+    key = fingerprint(title, price, prompt_version)
+    payload = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+    with _lock:
+        _connect().execute(
+            "INSERT OR REPLACE INTO cache (fingerprint, prompt_version, result, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)", (key, prompt_version, payload, now, now))
+        stats["stores"] += 1
+        check = stats["stores"] % EVICT_EVERY == 0
+    if check:
+        evict(now)
+
+def evict(now=None):
+    """Borra caducadas y, si sobra, las menos usadas. Retorna cuántas borró."""
+    now = now or time.time()
+    with _lock:
+        conn = _connect()
+        removed = conn.execute("DELETE FROM cache WHERE created_at < ?",
+                               (now - CACHE_TTL_DAYS * 86400,)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - CACHE_MAX_ENTRIES
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM cache WHERE fingerprint IN "
+                "(SELECT fingerprint FROM cache ORDER BY last_used LIMIT ?)", (excess,)).rowcount
+    if removed:
+        logger.info(f"🧹 Caché: {removed} entradas expulsadas")
+    return removed
+
+def count():
+    with _lock:
+        return _connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+def clear():
+    with _lock:
+        _connect().execute("DELETE FROM cache")
+
+def hit_rate():
+    """Aciertos / consultas de este proceso (0.0 si no hubo consultas)."""
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+def report():
+    """Línea de resumen para el final de cada ejecución."""
+    lookups = stats["hits"] + stats["misses"]
+    return (f"💾 Caché Gemini: {stats['hits']}/{lookups} aciertos ({hit_rate():.0%}), "
+            f"{stats['stores']} nuevas, {count()} guardadas")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Caché de clasificaciones Gemini')
+    parser.add_argument('--evict', action='store_true', help='Expulsa caducadas y exceso')
+    parser.add_argument('--clear', action='store_true', help='Vacía la caché')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+        print("🗑️ Caché vaciada")
+    if args.evict:
+        print(f"🧹 Expulsadas: {evict()}")
+
+    with _lock:
+        rows = _connect().execute(
+            "SELECT prompt_version, COUNT(*), SUM(hits) FROM cache GROUP BY prompt_version").fetchall()
+    print(f"💾 {CACHE_DB_FILE}: {count()} entradas (máx {CACHE_MAX_ENTRIES}, TTL {CACHE_TTL_DAYS:g} días)")
+    print(f"📐 Schema: {SCHEMA_VERSION}")
+    for prompt_version, entries, hits in rows:
+        print(f"   └ {prompt_version}: {entries} entradas, {hits or 0} aciertos")
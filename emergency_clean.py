@@ -1,7 +1,9 @@
-import json
 import os
 
-QUEUE_FILE = 'pending_products.json'
+import queue_store
+import records
+
+QUEUE_FILE = queue_store.QUEUE_SNAPSHOT_FILE
 BACKUP_FILE = 'pending_products.json.bak'
 
 # Palabras prohibidas explícitas (Music & Media)
@@ -16,6 +18,27 @@ BAD_CATEGORIES = [
     "revistas", "películas"
 ]
 
+def is_bad_item(item):
+    title_lower = item.get('title', '').lower()
+    # Algunos items traen category del CSV, otros no
+    cat_lower = item.get('category', '').lower() if 'category' in item else ""
+
+    # 1. Filtro por Categoría
+    for bad_cat in BAD_CATEGORIES:
+        if bad_cat in cat_lower:
+            return True
+
+    # 2. Filtro por Keywords en Título
+    for kw in KILLER_KEYWORDS:
+        if kw in title_lower:
+            return True
+
+    # 3. Filtro Precio (Safety Check)
+    if item.get('price', 0) < 12:
+        return True
+
+    return False
+
 def clean_queue():
     if not os.path.exists(QUEUE_FILE):
         print("No hay cola para limpiar.")
@@ -23,60 +46,17 @@ def clean_queue():
 
     print(f"🧹 Iniciando limpieza profunda de {QUEUE_FILE}...")
     
-    with open(QUEUE_FILE, 'r', encoding='utf-8') as f:
-        queue = json.load(f)
-    
-    initial_count = len(queue)
-    clean_items = []
-    removed_count = 0
-    
-    for item in queue:
-        title_lower = item.get('title', '').lower()
-        desc_lower = item.get('description', '').lower()
-        # Algunos items traen category del CSV, otros no
-        cat_lower = item.get('category', '').lower() if 'category' in item else ""
-
-        is_bad = False
-
-        # 1. Filtro por Categoría
-        for bad_cat in BAD_CATEGORIES:
-            if bad_cat in cat_lower:
-                is_bad = True
-                break
-        
-        if is_bad:
-            removed_count += 1
-            continue
-
-        # 2. Filtro por Keywords en Título
-        for kw in KILLER_KEYWORDS:
-            if kw in title_lower:
-                is_bad = True
-                break
-        
-        if is_bad:
-            removed_count += 1
-            continue
-            
-        # 3. Filtro Precio (Safety Check)
-        if item.get('price', 0) < 12:
-             removed_count += 1
-             continue
-
-        clean_items.append(item)
-
-    # Crear backup
-    if os.path.exists(QUEUE_FILE):
-        os.rename(QUEUE_FILE, BACKUP_FILE)
+    # Crear backup (JSONL)
+    initial_count = records.write_records(BACKUP_FILE, queue_store.items())
 
-    # Guardar cola limpia
-    with open(QUEUE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(clean_items, f, indent=2, ensure_ascii=False)
+    # Borrado atómico bajo el lock de la cola: lo que encolen los hunters
+    # mientras tanto no se pierde (antes se reescribía el fichero entero)
+    removed_count = queue_store.remove_where(is_bad_item)
 
     print(f"✅ Limpieza completada.")
     print(f"   Inicales: {initial_count}")
     print(f"   Eliminados (Música/Basura): {removed_count}")
-    print(f"   Restantes (Válidos): {len(clean_items)}")
+    print(f"   Restantes (Válidos): {queue_store.count()}")
 
 if __name__ == "__main__":
     clean_queue()
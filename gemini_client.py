@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente Gemini compartido: asyncio + pool de keys con token bucket de RPM y TPM.
+
+Antes cada script llamaba a generateContent a su manera: una petición cada
+vez y sleeps fijos entre llamadas (GEMINI_PACING_SECONDS, 60s tras un 429).
+Con el plan de pago dejábamos sin usar casi toda la cuota.
+
+- Pool de keys: cada key tiene sus dos cubos, peticiones por minuto
+  (GEMINI_RPM) y tokens por minuto (GEMINI_TPM), y cada petición va a la
+  key con más margen. El estado vive en gemini_rate_state.json bajo el lock
+  de state_store, así que lo comparten el procesador, el hunter y las
+  herramientas aunque corran a la vez.
+- Un 429 enfría solo esa key: el tiempo que diga Retry-After (o retryDelay
+  del cuerpo), o un backoff que se dobla con cada 429 seguido. Las demás
+  keys siguen trabajando; solo se espera si todas están enfriándose.
+- generate(prompt): una llamada síncrona que respeta el pool.
+- generate_many(prompts): mantiene hasta GEMINI_CONCURRENCY peticiones en
+  vuelo (asyncio) y devuelve los textos en el mismo orden (None si falla).
+- pool_status(): margen, enfriamiento y uso de cada key (python gemini_client.py).
+
+Los tokens de entrada se estiman al reservar (~4 caracteres por token) y
+al terminar se carga la diferencia real según usageMetadata.
+
+Prefijo estático (prefix=...): las instrucciones largas del curador se
+registran una vez por key con la API de context caching (cachedContents,
+GEMINI_CONTEXT_TTL) y cada llamada solo manda el sufijo del batch. El
+nombre del contexto se guarda en gemini_context_cache.json para que lo
+reutilicen todos los procesos. Si la API no lo acepta (modelo sin caché,
+prefijo por debajo del mínimo de tokens) o el contexto caducó, el prefijo
+se manda inline, siempre delante: así al menos aprovecha la caché implícita.
+
+GEMINI_BASE_URL cambia el host de la API (p. ej. http://127.0.0.1:8765 con
+gemini_stub.py para medir sin gastar cuota).
+
+Uso:
+    python gemini_client.py           # Estado del pool de keys
+"""
+
+import os
+import re
+import time
+import hashlib
+import asyncio
+import logging
+import requests
+from dotenv import load_dotenv
+
+import state_store
+
+load_dotenv()
+
+logger = logging.getLogger("GeminiClient")
+
+# Configuración
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")  # Otro host: gemini_stub.py
+GEMINI_API_URL = "{base}/v1beta/models/{model}:generateContent?key={key}"
+GEMINI_API_KEYS = [k.strip() for k in os.getenv("GEMINI_API_KEYS", os.getenv("GEMINI_API_KEY", "")).split(",") if k.strip()]
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "1000"))        # Por key
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))     # Por key
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "8"))
+GEMINI_RATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemini_rate_state.json")
+GEMINI_CACHE_URL = "{base}/v1beta/cachedContents?key={key}"
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0"
+GEMINI_CONTEXT_TTL = int(os.getenv("GEMINI_CONTEXT_TTL", "3600"))  # Segundos de vida del contexto
+GEMINI_CONTEXT_RETRY = 3600   # Tras un fallo al crear el contexto, inline durante este tiempo
+GEMINI_CONTEXT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemini_context_cache.json")
+GEMINI_MAX_ATTEMPTS = 10      # Ciclos de 429/error antes de rendirse con un prompt
+RATE_LIMIT_BACKOFF = 5        # Enfriamiento de una key tras un 429 sin Retry-After (se dobla)
+RATE_LIMIT_BACKOFF_MAX = 60
+CHARS_PER_TOKEN = 4
+
+stats = {"calls": 0, "failed": 0, "rate_limited": 0, "tokens": 0, "waited": 0.0, "cached_tokens": 0}
+
+
+# ============================================================================
+# POOL DE KEYS: TOKEN BUCKET POR KEY (compartido entre procesos)
+# ============================================================================
+
+def estimate_tokens(prompt):
+    """Estimación barata de tokens de entrada (~4 caracteres por token)."""
+    return max(1, len(prompt) // CHARS_PER_TOKEN)
+
+def key_id(key):
+    """Identificador de una key para ficheros y logs (nunca guardar la key)."""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+def _read_pool(now):
+    """Estado de todas las keys rellenado hasta now (llamar con el lock cogido)."""
+    state = state_store.read_json(GEMINI_RATE_FILE, None) or {}
+    pool = state.get("keys", {})
+    for key in GEMINI_API_KEYS:
+        entry = pool.setdefault(key_id(key), {})
+        elapsed = max(0.0, now - entry.get("updated", now))
+        entry["requests"] = min(GEMINI_RPM, entry.get("requests", GEMINI_RPM) + elapsed * GEMINI_RPM / 60)
+        entry["tokens"] = min(GEMINI_TPM, entry.get("tokens", GEMINI_TPM) + elapsed * GEMINI_TPM / 60)
+        entry["updated"] = now
+    return {"keys": pool}
+
+def _write_pool(state):
+    # Sin fsync: si se pierde por un crash, el bucket arranca lleno y el 429 lo corrige
+    state_store.write_json(GEMINI_RATE_FILE, state, indent=None, fsync=False)
+
+def _headroom(entry):
+    """Fracción de cuota libre (la menor de RPM y TPM), penalizada por 429 recientes."""
+    free = min(entry["requests"] / GEMINI_RPM, max(0.0, entry["tokens"]) / GEMINI_TPM)
+    return free / (1 + entry.get("strikes", 0))
+
+def _wait_for(entry, tokens, now):
+    return max(0.0,
+               entry.get("cooldown_until", 0) - now,
+               (1 - entry["requests"]) * 60 / GEMINI_RPM,
+               (tokens - entry["tokens"]) * 60 / GEMINI_TPM)
+
+def try_acquire(tokens, now=None):
+    """Reserva 1 petición + tokens en la key con más margen.
+
+    Retorna (índice de key, 0) o (None, segundos hasta que alguna key tenga cupo).
+    """
+    now = now or time.time()
+    tokens = min(tokens, GEMINI_TPM)  # Un prompt enorme no debe esperar para siempre
+    with state_store.file_lock(GEMINI_RATE_FILE):
+        state = _read_pool(now)
+        ready = []
+        wait = None
+        for index, key in enumerate(GEMINI_API_KEYS):
+            entry = state["keys"][key_id(key)]
+            key_wait = _wait_for(entry, tokens, now)
+            if key_wait == 0:
+                ready.append((_headroom(entry), -index, index))
+            else:
+                wait = key_wait if wait is None else min(wait, key_wait)
+        if not ready:
+            return None, wait or 0.0
+        index = max(ready)[2]
+        entry = state["keys"][key_id(GEMINI_API_KEYS[index])]
+        entry["requests"] -= 1
+        entry["tokens"] -= tokens
+        entry["calls"] = entry.get("calls", 0) + 1
+        _write_pool(state)
+    return index, 0
+
+def settle(index, reserved, used):
+    """Ajusta el cubo de tokens de la key con el consumo real y la marca sana."""
+    with state_store.file_lock(GEMINI_RATE_FILE):
+        state = _read_pool(time.time())
+        entry = state["keys"][key_id(GEMINI_API_KEYS[index])]
+        if used is not None:
+            entry["tokens"] -= used - reserved  # Puede quedar en negativo
+        entry["strikes"] = 0
+        _write_pool(state)
+
+def cooldown(index, retry_after=None):
+    """429 en una key: enfriarla Retry-After segundos o con backoff creciente.
+
+    Retorna los segundos de enfriamiento.
+    """
+    now = time.time()
+    with state_store.file_lock(GEMINI_RATE_FILE):
+        state = _read_pool(now)
+        entry = state["keys"][key_id(GEMINI_API_KEYS[index])]
+        strikes = entry.get("strikes", 0)
+        seconds = retry_after or min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF * 2 ** strikes)
+        entry["strikes"] = strikes + 1
+        entry["rate_limited"] = entry.get("rate_limited", 0) + 1
+        entry["cooldown_until"] = max(entry.get("cooldown_until", 0), now + seconds)
+        _write_pool(state)
+    return seconds
+
+def pool_status():
+    """Estado de cada key: margen, enfriamiento, uso y 429 acumulados."""
+    now = time.time()
+    with state_store.file_lock(GEMINI_RATE_FILE):
+        state = _read_pool(now)
+    keys = []
+    for index, key in enumerate(GEMINI_API_KEYS):
+        entry = state["keys"][key_id(key)]
+        keys.append({
+            "key": index + 1,
+            "id": key_id(key),
+            "requests": entry["requests"],
+            "tokens": entry["tokens"],
+            "utilization": 1 - min(entry["requests"] / GEMINI_RPM, max(0.0, entry["tokens"]) / GEMINI_TPM),
+            "cooldown_for": max(0.0, entry.get("cooldown_until", 0) - now),
+            "calls": entry.get("calls", 0),
+            "rate_limited": entry.get("rate_limited", 0),
+        })
+    return keys
+
+def bucket_status():
+    """Cupo total del pool ahora mismo: {"requests", "tokens", "blocked_for"}."""
+    keys = pool_status()
+    return {
+        "requests": sum(k["requests"] for k in keys),
+        "tokens": sum(k["tokens"] for k in keys),
+        "blocked_for": min((k["cooldown_for"] for k in keys), default=0.0),
+    }
+
+async def acquire(tokens):
+    """Espera (sin bloquear el event loop) hasta que alguna key tenga cupo. Retorna su índice."""
+    while True:
+        index, wait = await asyncio.to_thread(try_acquire, tokens)
+        if index is not None:
+            return index
+        stats["waited"] += wait
+        await asyncio.sleep(wait)
+
+
+# ============================================================================
+# CONTEXT CACHING (prefijo estático de los prompts)
+# ============================================================================
+
+def _context_id(key, prefix, prefix_version):
+    prefix_hash = hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:8]
+    return f"{key_id(key)}:{prefix_version}-{prefix_hash}"
+
+def _create_context(key, prefix, prefix_version):
+    """Registra el prefijo con cachedContents. Retorna (nombre, expira) o (None, None)."""
+    payload = {
+        "model": f"models/{GEMINI_MODEL}",
+        "displayName": f"giftia-{prefix_version}",
+        "contents": [{"role": "user", "parts": [{"text": prefix}]}],
+        "ttl": f"{GEMINI_CONTEXT_TTL}s",
+    }
+    try:
+        response = _post(GEMINI_CACHE_URL.format(base=GEMINI_BASE_URL, key=key), payload, 30)
+    except Exception as e:
+        logger.warning(f"⚠️ Context cache excepción: {e}")
+        return None, None
+    if response.status_code != 200:
+        logger.info(f"ℹ️ Context cache no disponible ({response.status_code}), prefijo inline: {response.text[:100]}")
+        return None, None
+    logger.info(f"🧊 Prefijo {prefix_version} registrado como {response.json().get('name')}")
+    return response.json().get("name"), time.time() + GEMINI_CONTEXT_TTL
+
+def _live_context(entry, now):
+    return entry.get("name") and entry.get("expires", 0) - 60 > now
+
+def context_for(key, prefix, prefix_version, now=None):
+    """Nombre del contexto cacheado para este prefijo y key (lo crea si hace falta) o None."""
+    if not GEMINI_CONTEXT_CACHE:
+        return None
+    now = now or time.time()
+    context_id = _context_id(key, prefix, prefix_version)
+    with state_store.file_lock(GEMINI_CONTEXT_FILE):
+        entry = (state_store.read_json(GEMINI_CONTEXT_FILE, None) or {}).get(context_id, {})
+    if _live_context(entry, now):
+        return entry["name"]
+    if entry.get("failed_until", 0) > now:
+        return None
+
+    # Petición HTTP fuera del lock: no frena al resto de llamadas a Gemini
+    name, expires = _create_context(key, prefix, prefix_version)
+    with state_store.file_lock(GEMINI_CONTEXT_FILE):
+        contexts = state_store.read_json(GEMINI_CONTEXT_FILE, None) or {}
+        entry = contexts.get(context_id, {})
+        if _live_context(entry, now):
+            # Otro proceso lo registró mientras tanto: todos usan el suyo (el nuestro caduca por TTL)
+            return entry["name"]
+        contexts = {k: v for k, v in contexts.items()
+                    if max(v.get("expires", 0), v.get("failed_until", 0)) > now}
+        contexts[context_id] = ({"name": name, "expires": expires} if name
+                                else {"failed_until": now + GEMINI_CONTEXT_RETRY})
+        state_store.write_json(GEMINI_CONTEXT_FILE, contexts, indent=None, fsync=False)
+    return name
+
+def forget_context(key, prefix, prefix_version):
+    """El contexto ya no existe en la API (caducado o borrado): recrearlo la próxima vez."""
+    context_id = _context_id(key, prefix, prefix_version)
+    with state_store.file_lock(GEMINI_CONTEXT_FILE):
+        contexts = state_store.read_json(GEMINI_CONTEXT_FILE, None) or {}
+        contexts.pop(context_id, None)
+        state_store.write_json(GEMINI_CONTEXT_FILE, contexts, indent=None, fsync=False)
+
+
+# ============================================================================
+# PETICIONES
+# ============================================================================
+
+def _post(url, payload, timeout):
+    return requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=timeout)
+
+def _retry_after(response):
+    """Segundos de la cabecera Retry-After o del retryDelay ("37s") del cuerpo, o None."""
+    header = (getattr(response, "headers", None) or {}).get("Retry-After")
+    try:
+        return float(header) if header else float(re.search(r'"retryDelay":\s*"([\d.]+)s"', response.text).group(1))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def _call(key, payload, timeout):
+    """Una petición HTTP. Retorna (estado, resultado, tokens usados).
+
+    estado: "ok", "rate_limited", "retry" (timeout/5xx) o "error".
+    resultado: {"text", "finish_reason", "output_tokens"} si estado es "ok";
+    {"retry_after": segundos o None} si es "rate_limited".
+    """
+    url = GEMINI_API_URL.format(base=GEMINI_BASE_URL, model=GEMINI_MODEL, key=key)
+    try:
+        response = _post(url, payload, timeout)
+    except Exception as e:
+        logger.warning(f"⚠️ Gemini excepción: {e}")
+        return "retry", None, None
+    if response.status_code == 429:
+        return "rate_limited", {"retry_after": _retry_after(response)}, None
+    if response.status_code >= 500:
+        logger.warning(f"⚠️ Gemini error {response.status_code}, reintentando")
+        return "retry", None, None
+    if response.status_code != 200:
+        logger.error(f"Gemini error {response.status_code}: {response.text[:100]}")
+        return "error", None, None
+    data = response.json()
+    candidate = data.get("candidates", [{}])[0]
+    usage = data.get("usageMetadata", {})
+    result = {
+        "text": candidate.get("content", {}).get("parts", [{}])[0].get("text", ""),
+        "finish_reason": candidate.get("finishReason", ""),  # "MAX_TOKENS" = respuesta cortada
+        "output_tokens": usage.get("candidatesTokenCount"),
+        "cached_tokens": usage.get("cachedContentTokenCount", 0),
+    }
+    return "ok", result, usage.get("totalTokenCount")
+
+async def agenerate(prompt, temperature=0.4, max_output_tokens=8192, timeout=60, full=False,
+                    response_schema=None, prefix=None, prefix_version="", max_attempts=None):
+    """Llamada asíncrona a Gemini respetando el pool de keys. Retorna el texto o None.
+
+    Con full=True retorna el dict de _call (texto, finish_reason, output_tokens).
+    Con response_schema (ver gemini_schema.py) Gemini responde JSON que lo cumple.
+    Con prefix, prompt es solo el sufijo: el prefijo va por context caching
+    (o inline delante si no hay contexto). Subir prefix_version al cambiarlo.
+    max_attempts limita los intentos (por defecto GEMINI_MAX_ATTEMPTS por key):
+    quien tenga un fallback propio pasa 1-2 para no quedarse minutos en backoff.
+    """
+    if not GEMINI_API_KEYS:
+        logger.error("❌ No hay API keys de Gemini configuradas!")
+        return None
+
+    generation_config = {"temperature": temperature, "maxOutputTokens": max_output_tokens}
+    if response_schema:
+        generation_config["responseMimeType"] = "application/json"
+        generation_config["responseSchema"] = response_schema
+    inline = f"{prefix}\n\n{prompt}" if prefix else prompt
+    use_context = bool(prefix)
+    reserved = estimate_tokens(inline)
+    backoff = RATE_LIMIT_BACKOFF
+    attempts = max_attempts or GEMINI_MAX_ATTEMPTS * len(GEMINI_API_KEYS)
+    for attempt in range(attempts):
+        key_index = await acquire(reserved)
+        key = GEMINI_API_KEYS[key_index]
+        context = await asyncio.to_thread(context_for, key, prefix, prefix_version) if use_context else None
+        payload = {"contents": [{"parts": [{"text": prompt if context else inline}]}],
+                   "generationConfig": generation_config}
+        if context:
+            payload["cachedContent"] = context
+        status, result, used = await asyncio.to_thread(_call, key, payload, timeout)
+
+        if status == "ok":
+            stats["calls"] += 1
+            stats["tokens"] += used or reserved
+            stats["cached_tokens"] += result["cached_tokens"] or 0
+            await asyncio.to_thread(settle, key_index, reserved, used)
+            return result if full else result["text"]
+        if status == "error" and context:
+            # Contexto caducado o borrado en la API: olvidarlo y repetir inline
+            await asyncio.to_thread(forget_context, key, prefix, prefix_version)
+            use_context = False
+            continue
+        if status == "error":
+            break
+        if status == "retry":
+            if attempt < attempts - 1:  # Sin esperar para rendirse
+                await asyncio.sleep(backoff)
+                backoff = min(RATE_LIMIT_BACKOFF_MAX, backoff * 2)
+            continue
+
+        # 429: enfriar solo esta key; acquire elegirá otra con margen
+        stats["rate_limited"] += 1
+        seconds = await asyncio.to_thread(cooldown, key_index, result["retry_after"])
+        logger.warning(f"🔄 Key {key_index + 1} quota exceeded, enfriando {seconds:.0f}s")
+
+    stats["failed"] += 1
+    return None
+
+async def agenerate_many(prompts, concurrency=None, **kwargs):
+    """Lanza todos los prompts con hasta concurrency peticiones en vuelo."""
+    semaphore = asyncio.Semaphore(concurrency or GEMINI_CONCURRENCY)
+
+    async def one(prompt):
+        async with semaphore:
+            return await agenerate(prompt, **kwargs)
+
+    return await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+def generate(prompt, **kwargs):
+    """Versión síncrona de agenerate (para scripts sin event loop)."""
+    return asyncio.run(agenerate(prompt, **kwargs))
+
+def generate_many(prompts, concurrency=None, **kwargs):
+    """Versión síncrona de agenerate_many. Textos en el orden de prompts."""
+    if not prompts:
+        return []
+    return asyncio.run(agenerate_many(prompts, concurrency, **kwargs))
+
+
+if __name__ == "__main__":
+    print(f"🔑 Keys: {len(GEMINI_API_KEYS)} | Modelo: {GEMINI_MODEL} | Concurrencia: {GEMINI_CONCURRENCY}")
+    print(f"📊 Límite por key: {GEMINI_RPM:.0f} RPM / {GEMINI_TPM:.0f} TPM")
+    for k in pool_status():
+        cooling = f" | ⏳ enfriando {k['cooldown_for']:.0f}s" if k["cooldown_for"] else ""
+        print(f"   └ Key {k['key']} ({k['id']}): uso {k['utilization']:.0%} | "
+              f"{k['requests']:.0f} peticiones, {k['tokens']:.0f} tokens libres | "
+              f"{k['calls']} llamadas, {k['rate_limited']} 429s{cooling}")
+    contexts = state_store.read_json(GEMINI_CONTEXT_FILE, None) or {}
+    active = [v["name"] for v in contexts.values() if v.get("expires", 0) > time.time()]
+    print(f"🧊 Contextos cacheados activos: {len(active)} (context caching {'on' if GEMINI_CONTEXT_CACHE else 'off'})")
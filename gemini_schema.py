@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Salida estructurada de Gemini: responseSchema generado desde giftia_schema.json.
+
+Pedíamos el JSON en prosa ("SOLO JSON VÁLIDO. Sin markdown") y luego lo
+reparábamos con regex; aun así Gemini inventaba categorías ("Fandom",
+"Hogar") que validate_category tenía que corregir con una tabla.
+
+Ahora la petición lleva responseMimeType=application/json y un
+responseSchema con los enums de giftia_schema.json (categorías, edades,
+géneros, destinatarios, ocasiones): Gemini no puede salirse de ellos.
+
+- CURATOR_SCHEMA: array de fichas del curador (process_queue, batch)
+- TRIAGE_SCHEMA: array {i, ok, q, category} de la criba barata
+- SIMPLE_SCHEMA: clasificación rápida de un producto
+- RECLASSIFY_SCHEMA: array {id, category} (reclassify_products)
+- generation_options(schema): kwargs para gemini_client (vacío si
+  GEMINI_STRUCTURED_OUTPUT=0, p. ej. con un modelo que no lo soporte)
+- parse(text, schema): JSON → registros con los tipos del schema. Los
+  valores fuera de enum o de tipo se descartan (el llamador pone su
+  fallback); si la respuesta viene cortada se salvan los objetos completos.
+
+Uso:
+    python gemini_schema.py           # Imprime CURATOR_SCHEMA
+"""
+
+import os
+import json
+import logging
+
+import json_salvage
+
+logger = logging.getLogger("GeminiSchema")
+
+# Configuración
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "giftia_schema.json")
+STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1") != "0"
+
+
+def _load_schema():
+    try:
+        with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Error cargando giftia_schema.json: {e}")
+        return {}
+
+SCHEMA = _load_schema()
+CATEGORIES = list(SCHEMA.get("categories", {}))
+AGES = list(SCHEMA.get("ages", {}))
+GENDERS = list(SCHEMA.get("genders", {}))
+RECIPIENTS = list(SCHEMA.get("recipients", {}))
+OCCASIONS = list(SCHEMA.get("occasions", {}))
+MARKETING_HOOKS = ["core", "habitat", "style", "hedonism", "wildcard"]  # Los del prompt del curador
+
+
+# ============================================================================
+# SCHEMAS (subconjunto OpenAPI que acepta generationConfig.responseSchema)
+# ============================================================================
+
+STRING = {"type": "STRING"}
+INTEGER = {"type": "INTEGER"}
+NUMBER = {"type": "NUMBER"}
+BOOLEAN = {"type": "BOOLEAN"}
+
+def _enum(values):
+    # Sin valores (schema no cargado) mejor un string libre que un enum vacío
+    return {"type": "STRING", "enum": values} if values else STRING
+
+def _array(items):
+    return {"type": "ARRAY", "items": items}
+
+def _object(properties, required=()):
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(required),
+        "propertyOrdering": list(properties),
+    }
+
+CURATOR_ITEM = _object({
+    "i": INTEGER,
+    "ok": BOOLEAN,
+    "q": INTEGER,
+    "giftia_score": NUMBER,
+    "category": _enum(CATEGORIES),
+    "age": _array(_enum(AGES)),
+    "gender": _enum(GENDERS),
+    "recipients": _array(_enum(RECIPIENTS)),
+    "occasions": _array(_enum(OCCASIONS)),
+    "marketing_hook": _enum(MARKETING_HOOKS),
+    "seo_title": STRING,
+    "meta_description": STRING,
+    "h1_title": STRING,
+    "short_description": STRING,
+    "expert_opinion": STRING,
+    "pros": _array(STRING),
+    "cons": _array(STRING),
+    "full_description": STRING,
+    "who_is_for": STRING,
+    "faqs": _array(_object({"q": STRING, "a": STRING}, required=("q", "a"))),
+    "verdict": STRING,
+    "slug": STRING,
+}, required=("i", "ok", "q"))  # Un rechazo solo necesita i, ok y q
+
+CURATOR_SCHEMA = _array(CURATOR_ITEM)
+
+TRIAGE_SCHEMA = _array(_object({
+    "i": INTEGER,
+    "ok": BOOLEAN,
+    "q": INTEGER,
+    "category": _enum(CATEGORIES),
+}, required=("i", "ok", "q", "category")))
+
+SIMPLE_SCHEMA = _object({
+    "is_good_gift": BOOLEAN,
+    "category": _enum(CATEGORIES),
+    "target_gender": _enum(GENDERS),
+    "gift_quality": INTEGER,
+    "is_duplicate": BOOLEAN,
+    "reject_reason": STRING,
+}, required=("is_good_gift", "category", "gift_quality"))
+
+RECLASSIFY_SCHEMA = _array(_object({"id": INTEGER, "category": _enum(CATEGORIES)}, required=("id", "category")))
+
+
+def generation_options(schema):
+    """kwargs de gemini_client.generate para pedir salida con este schema."""
+    return {"response_schema": schema} if STRUCTURED_OUTPUT else {}
+
+
+# ============================================================================
+# PARSEO A REGISTROS TIPADOS
+# ============================================================================
+
+def coerce(value, schema):
+    """value con los tipos de schema, o None si no encaja."""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        if not isinstance(value, dict):
+            return None
+        record = {}
+        for key, sub in schema["properties"].items():
+            if key in value:
+                typed = coerce(value[key], sub)
+                if typed is not None:
+                    record[key] = typed
+        return record
+    if kind == "ARRAY":
+        if not isinstance(value, list):
+            value = [value]  # "age": "adultos" en vez de ["adultos"]
+        items = [coerce(v, schema["items"]) for v in value]
+        return [v for v in items if v is not None]
+    if kind == "STRING":
+        if not isinstance(value, str):
+            return None
+        if "enum" in schema and value not in schema["enum"]:
+            return None
+        return value
+    if kind == "BOOLEAN":
+        if isinstance(value, str):
+            return {"true": True, "false": False}.get(value.strip().lower())
+        return value if isinstance(value, bool) else None
+    try:
+        if isinstance(value, bool):
+            return None
+        return int(float(value)) if kind == "INTEGER" else float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse(text, schema):
+    """Respuesta de Gemini → registro (OBJECT) o lista de registros (ARRAY).
+
+    Con salida estructurada json.loads basta; si falla (respuesta cortada o
+    modo prosa) se recuperan los objetos completos con json_salvage.
+    """
+    is_array = schema.get("type") == "ARRAY"
+    if not text:
+        return [] if is_array else None
+    try:
+        value = json.loads(text)
+    except ValueError:
+        objects = json_salvage.salvage_array(text)
+        value = objects if is_array else (objects[0] if objects else None)
+    if is_array:
+        return [r for r in coerce(value, schema) if r] if value is not None else []
+    return coerce(value, schema) or None
+
+
+if __name__ == "__main__":
+    print(json.dumps(CURATOR_SCHEMA, indent=2, ensure_ascii=False))
+    print(f"✅ Structured output: {'activado' if STRUCTURED_OUTPUT else 'desactivado'}")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita generateContent de Gemini (sin red, sin cuota).
+
+Para medir el procesador, el juez del hunter o las herramientas sin gastar
+cuota: se arranca el stub y se apunta GEMINI_BASE_URL a él.
+
+- generateContent: responde JSON válido contra giftia_schema.json. Usa el
+  responseSchema de la petición; sin él lo deduce del prompt (curador,
+  criba o clasificación simple, ver gemini_schema.py). Un objeto por cada
+  producto numerado del prompt ("1. ...", "2. ...").
+- cachedContents: acepta el prefijo y cuenta sus tokens como cacheados.
+- Fallos inyectables, con semilla para que dos corridas sean iguales:
+  latencia (fixed:S, uniform:MIN,MAX, lognormal:MEDIANA,SIGMA), 429 con
+  Retry-After, 5xx, respuestas cortadas (MAX_TOKENS) y JSON mal formado
+  (markdown, comas finales, comillas sin escapar: lo que arregla
+  json_salvage.py). Con --rpm cada key tiene además su límite por minuto.
+- Si la respuesta supera maxOutputTokens se corta como haría Gemini.
+
+Uso:
+    python gemini_stub.py --port 8765 --latency uniform:0.5,2 --rate-429 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8765 python process_queue.py
+"""
+
+import os
+import re
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import gemini_schema
+
+logger = logging.getLogger("GeminiStub")
+
+# Configuración (todo se puede cambiar con start(**config) o por CLI)
+STUB_CONFIG = {
+    "latency": os.getenv("GEMINI_STUB_LATENCY", "fixed:0"),
+    "rate_429": float(os.getenv("GEMINI_STUB_RATE_429", "0")),
+    "retry_after": float(os.getenv("GEMINI_STUB_RETRY_AFTER", "1")),
+    "rate_5xx": float(os.getenv("GEMINI_STUB_RATE_5XX", "0")),
+    "rate_truncated": float(os.getenv("GEMINI_STUB_RATE_TRUNCATED", "0")),
+    "rate_malformed": float(os.getenv("GEMINI_STUB_RATE_MALFORMED", "0")),
+    "rpm": float(os.getenv("GEMINI_STUB_RPM", "0")),  # Límite por key (0 = sin límite)
+    "approve_rate": 0.7,  # Fracción de productos con ok/is_good_gift = true
+    "seed": int(os.getenv("GEMINI_STUB_SEED", "42")),
+}
+CHARS_PER_TOKEN = 4
+MALFORMATIONS = ("markdown", "trailing_comma", "unescaped_quotes")
+
+stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "truncated": 0, "malformed": 0, "contexts": 0}
+
+_lock = threading.Lock()
+_rng = random.Random(STUB_CONFIG["seed"])
+_contexts = {}  # nombre → tokens del prefijo
+_calls_by_key = {}  # key → timestamps del último minuto
+
+
+# ============================================================================
+# RESPUESTAS DE EJEMPLO (válidas contra el schema)
+# ============================================================================
+
+WORDS = ("regalo perfecto para sorprender con estilo y calidad que se nota desde el primer día "
+         "diseño cuidado materiales duraderos ideal para compartir momentos especiales").split()
+
+def _words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def sample_value(schema, rng, index=1, key=""):
+    """Un valor aleatorio que cumple schema (formato responseSchema de gemini_schema)."""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        return {k: sample_value(sub, rng, index, k) for k, sub in schema["properties"].items()}
+    if kind == "ARRAY":
+        return [sample_value(schema["items"], rng, index, key) for _ in range(rng.randint(1, 3))]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "BOOLEAN":
+        return rng.random() < STUB_CONFIG["approve_rate"] if key in ("ok", "is_good_gift") else False
+    if kind == "INTEGER":
+        return index if key in ("i", "id") else rng.randint(3, 10)
+    if kind == "NUMBER":
+        return round(rng.uniform(5, 10), 1)
+    if key in ("slug",):
+        return "-".join(rng.choice(WORDS) for _ in range(4))
+    long_fields = ("full_description", "expert_opinion", "who_is_for", "verdict", "a")
+    return _words(rng, 60 if key in long_fields else 12)
+
+def count_products(prompt):
+    """Productos numerados del prompt ("1. Título")."""
+    numbers = [int(n) for n in re.findall(r'^\s*(\d+)\.\s', prompt, re.MULTILINE)]
+    return max(numbers, default=1)
+
+def schema_for(prompt, generation_config):
+    """responseSchema de la petición o, en modo prosa, el que pide el prompt."""
+    if generation_config.get("responseSchema"):
+        return generation_config["responseSchema"]
+    if "PRODUCTOS A EVALUAR" in prompt:
+        return gemini_schema.CURATOR_SCHEMA
+    if '"ok": true, "q"' in prompt:
+        return gemini_schema.TRIAGE_SCHEMA
+    return gemini_schema.SIMPLE_SCHEMA
+
+def sample_answer(prompt, generation_config, rng):
+    schema = schema_for(prompt, generation_config)
+    if schema.get("type") == "ARRAY":
+        return [sample_value(schema["items"], rng, n + 1) for n in range(count_products(prompt))]
+    return sample_value(schema, rng)
+
+
+# ============================================================================
+# FALLOS INYECTADOS
+# ============================================================================
+
+def sample_latency(spec, rng):
+    """Segundos de latencia: "fixed:S", "uniform:MIN,MAX" o "lognormal:MEDIANA,SIGMA"."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(values[0]), values[1])
+    return values[0] if values else 0.0
+
+def malform(text, rng):
+    """Estropea el JSON como lo hace Gemini a veces (json_salvage debe poder arreglarlo)."""
+    kind = rng.choice(MALFORMATIONS)
+    if kind == "trailing_comma":
+        return re.sub(r'(["\d\]e])(\s*[}\]])', r'\1,\2', text, count=3)
+    if kind == "unescaped_quotes":
+        # Comillas sin escapar dentro de un texto: "regalo "perfecto" para..."
+        broken = re.sub(r'(": "\w+) (\w+) ', r'\1 "\2" ', text, count=1)
+        if broken != text:
+            return broken
+    return f"Aquí tienes la clasificación:\n```json\n{text}\n```"
+
+def _rate_limited(key, now):
+    """Límite RPM por key (ventana deslizante de 60s)."""
+    if not STUB_CONFIG["rpm"]:
+        return False
+    calls = [t for t in _calls_by_key.get(key, []) if now - t < 60]
+    _calls_by_key[key] = calls
+    if len(calls) >= STUB_CONFIG["rpm"]:
+        return True
+    calls.append(now)
+    return False
+
+
+# ============================================================================
+# SERVIDOR HTTP
+# ============================================================================
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        key = parse_qs(url.query).get("key", [""])[0]
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+        if url.path.endswith("/cachedContents"):
+            return self._send(200, create_context(payload))
+        if url.path.endswith(":generateContent"):
+            status, body, headers = generate_content(key, payload)
+            return self._send(status, body, headers)
+        self._send(404, {"error": {"code": 404, "message": f"{url.path} no existe en el stub"}})
+
+
+def create_context(payload):
+    text = "".join(p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", []))
+    with _lock:
+        stats["contexts"] += 1
+        name = f"cachedContents/stub-{stats['contexts']}"
+        _contexts[name] = len(text) // CHARS_PER_TOKEN
+    return {"name": name, "model": payload.get("model", ""), "usageMetadata": {"totalTokenCount": _contexts[name]}}
+
+def generate_content(key, payload):
+    """Respuesta a un generateContent: (status, cuerpo, cabeceras)."""
+    prompt = "".join(p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", []))
+    generation_config = payload.get("generationConfig", {})
+    with _lock:
+        stats["requests"] += 1
+        roll = _rng.random()
+        latency = sample_latency(STUB_CONFIG["latency"], _rng)
+        seed = _rng.random()
+        limited = _rate_limited(key, time.time())
+    time.sleep(latency)
+
+    rate_429, rate_5xx = STUB_CONFIG["rate_429"], STUB_CONFIG["rate_5xx"]
+    if limited or roll < rate_429:
+        with _lock:
+            stats["rate_limited"] += 1
+        retry_after = STUB_CONFIG["retry_after"]
+        return 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded (stub)",
+                               "details": [{"retryDelay": f"{retry_after:g}s"}]}}, {"Retry-After": f"{retry_after:g}"}
+    if roll < rate_429 + rate_5xx:
+        with _lock:
+            stats["errors"] += 1
+        return 503, {"error": {"code": 503, "status": "UNAVAILABLE", "message": "The model is overloaded (stub)"}}, {}
+
+    # Contenido determinista por petición: no depende del orden en que lleguen los hilos
+    rng = random.Random(seed)
+    text = json.dumps(sample_answer(prompt, generation_config, rng), ensure_ascii=False)
+    finish_reason = "STOP"
+    max_chars = generation_config.get("maxOutputTokens", 8192) * CHARS_PER_TOKEN
+    if rng.random() < STUB_CONFIG["rate_truncated"] or len(text) > max_chars:
+        text = text[:min(max_chars, int(len(text) * rng.uniform(0.4, 0.9)))]
+        finish_reason = "MAX_TOKENS"
+    malformed = finish_reason == "STOP" and rng.random() < STUB_CONFIG["rate_malformed"]
+    if malformed:
+        text = malform(text, rng)
+    with _lock:
+        stats["ok"] += 1
+        stats["truncated"] += finish_reason == "MAX_TOKENS"
+        stats["malformed"] += malformed
+        cached = _contexts.get(payload.get("cachedContent"), 0)
+
+    prompt_tokens = len(prompt) // CHARS_PER_TOKEN + cached
+    output_tokens = len(text) // CHARS_PER_TOKEN
+    return 200, {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": finish_reason}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                          "cachedContentTokenCount": cached, "totalTokenCount": prompt_tokens + output_tokens},
+    }, {}
+
+def configure(**config):
+    """Cambia la configuración y reinicia semilla, estadísticas y contadores."""
+    global _rng
+    unknown = set(config) - set(STUB_CONFIG)
+    if unknown:
+        raise ValueError(f"Opciones desconocidas: {', '.join(sorted(unknown))}")
+    with _lock:
+        STUB_CONFIG.update(config)
+        _rng = random.Random(STUB_CONFIG["seed"])
+        _contexts.clear()
+        _calls_by_key.clear()
+        for name in stats:
+            stats[name] = 0
+
+def start(port=0, host="127.0.0.1", **config):
+    """Arranca el stub en un hilo. Retorna (servidor, base_url); parar con server.shutdown()."""
+    configure(**config)
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Stub local de la API de Gemini (generateContent).')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default=STUB_CONFIG["latency"], help='fixed:S | uniform:MIN,MAX | lognormal:MEDIANA,SIGMA')
+    parser.add_argument('--rate-429', type=float, default=STUB_CONFIG["rate_429"], help='Fracción de peticiones con 429')
+    parser.add_argument('--retry-after', type=float, default=STUB_CONFIG["retry_after"], help='Segundos de Retry-After en los 429')
+    parser.add_argument('--rate-5xx', type=float, default=STUB_CONFIG["rate_5xx"], help='Fracción de peticiones con 503')
+    parser.add_argument('--rate-truncated', type=float, default=STUB_CONFIG["rate_truncated"], help='Fracción de respuestas cortadas')
+    parser.add_argument('--rate-malformed', type=float, default=STUB_CONFIG["rate_malformed"], help='Fracción de JSON mal formado')
+    parser.add_argument('--rpm', type=float, default=STUB_CONFIG["rpm"], help='Límite de peticiones por minuto y key')
+    parser.add_argument('--seed', type=int, default=STUB_CONFIG["seed"])
+    args = parser.parse_args()
+
+    server, base_url = start(args.port, latency=args.latency, rate_429=args.rate_429, retry_after=args.retry_after,
+                             rate_5xx=args.rate_5xx, rate_truncated=args.rate_truncated,
+                             rate_malformed=args.rate_malformed, rpm=args.rpm, seed=args.seed)
+    print(f"🧪 Stub de Gemini en {base_url}")
+    print(f"   GEMINI_BASE_URL={base_url} python process_queue.py")
+    try:
+        while True:
+            time.sleep(30)
+            print(f"📊 {stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n🛑 Stub parado. {stats}")
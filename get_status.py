@@ -1,5 +1,13 @@
-import json
 import os
+import sys
+
+project_dir = 'c:/Users/Walter/Projects/giftia-hunter'
+if os.path.isdir(project_dir):
+    os.chdir(project_dir)  # queue_store usa rutas relativas
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import queue_store
+import records
 
 pending_file = 'c:/Users/Walter/Projects/giftia-hunter/pending_products.json'
 processed_file = 'c:/Users/Walter/Projects/giftia-hunter/processed_products.json'
@@ -8,9 +16,7 @@ report = []
 
 if os.path.exists(pending_file):
     try:
-        with open(pending_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            report.append(f"PENDING: {len(data)}")
+        report.append(f"PENDING: {queue_store.quick_count()}")
     except:
         report.append("PENDING: Error reading")
 else:
@@ -18,9 +24,7 @@ else:
 
 if os.path.exists(processed_file):
     try:
-        with open(processed_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            report.append(f"PROCESSED: {len(data)}")
+        report.append(f"PROCESSED: {records.count_records(processed_file)}")
     except:
         report.append("PROCESSED: Error reading")
 else:
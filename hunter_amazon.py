@@ -20,6 +20,12 @@ import re
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from dotenv import load_dotenv
 
+import gemini_client
+import publish_outbox
+import queue_store
+import wp_ingest
+import records
+
 # Fix encoding para Windows (evitar crash con emojis en cp1252)
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -41,19 +47,17 @@ def parse_price(price_str):
 
 GEMINI_TIMEOUT_SECONDS = 8
 # Ã°Å¸â€â€˜ API KEY - Leer desde .env (NUNCA hardcodear)
-GEMINI_API_KEYS = [os.getenv("GEMINI_API_KEY", "")]
-_current_key_index = 0  # ÃƒÂndice de la key actual
-GEMINI_MODEL = "gemini-2.0-flash"  # Modelo mÃƒÂ¡s reciente y rÃƒÂ¡pido
-GEMINI_RETRY_WAIT = 60  # Segundos a esperar cuando quota excedida
-GEMINI_MAX_RETRIES = 3  # MÃƒÂ¡ximo intentos antes de fallback
-GEMINI_PACING_SECONDS = 10  # Ã°Å¸ÂÂ¢ PACING SEGURO: 10s entre llamadas (6 RPM, muy bajo del lÃƒÂ­mite 15 RPM)
+GEMINI_API_KEYS = gemini_client.GEMINI_API_KEYS  # GEMINI_API_KEYS="k1,k2" o GEMINI_API_KEY
+GEMINI_MODEL = gemini_client.GEMINI_MODEL
+GEMINI_JUDGE_ATTEMPTS = 2  # Intentos por producto; si fallan, fallback regex (sin minutos de backoff)
+GEMINI_PACING_SECONDS = 0  # Sin pausa fija: el ritmo lo marca el token bucket de gemini_client (RPM/TPM)
+JUDGE_PROMPT_VERSION = "juez-v1"  # Subir al cambiar judge_prompt_prefix (nuevo contexto cacheado)
 
 # Ã°Å¸â€œÂ¦ COLA LOCAL - Productos pendientes de anÃƒÂ¡lisis AI
-PENDING_QUEUE_FILE = "pending_products.json"
-PROCESSED_LOG_FILE = "processed_products.json"
+PENDING_QUEUE_FILE = queue_store.QUEUE_SNAPSHOT_FILE
+PROCESSED_LOG_FILE = "processed_products.json"  # JSONL (ver records.py)
+PROCESSED_LOG_MAX = 500
 
-# Variable global para controlar el pacing de Gemini
-_last_gemini_call = 0
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -68,8 +72,8 @@ from webdriver_manager.chrome import ChromeDriverManager
 # ============================================================================
 
 # Environment-based configuration
-WP_TOKEN = os.getenv("WP_API_TOKEN", "nu27OrX2t5VZQmrGXfoZk3pbcS97yiP5")  # Fallback para desarrollo
-WP_API_URL = os.getenv("WP_API_URL", "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php")
+WP_TOKEN = wp_ingest.WP_TOKEN  # WP_API_TOKEN / WP_API_URL: los lee wp_ingest, que hace el envio
+WP_API_URL = wp_ingest.WP_API_URL
 AMAZON_TAG = os.getenv("AMAZON_TAG", "GIFTIA-21")
 DEBUG = os.getenv("DEBUG", "0") == "1"
 
@@ -197,7 +201,7 @@ if sys.platform == 'win32':
 logger.info("[HUNTER] Ã°Å¸â€™Å½ INICIANDO v11.0 - THE GIFTIA STANDARD")
 logger.info(f"[HUNTER] API Endpoint: {WP_API_URL}")
 logger.info(f"[HUNTER] Gemini API: {len(GEMINI_API_KEYS)} keys configuradas (rotaciÃƒÂ³n automÃƒÂ¡tica)")
-logger.info(f"[HUNTER] Ã°Å¸ÂÂ¢ Pacing: {GEMINI_PACING_SECONDS}s entre llamadas (6 RPM seguro)")
+logger.info(f"[HUNTER] Gemini: limite por key {gemini_client.GEMINI_RPM:.0f} RPM / {gemini_client.GEMINI_TPM:.0f} TPM")
 logger.info(f"[HUNTER] Debug Mode: {'ENABLED' if DEBUG else 'DISABLED'}")
 
 # ============================================================================
@@ -206,73 +210,48 @@ logger.info(f"[HUNTER] Debug Mode: {'ENABLED' if DEBUG else 'DISABLED'}")
 
 def load_pending_queue():
     """Carga productos pendientes de anÃƒÂ¡lisis."""
-    try:
-        if os.path.exists(PENDING_QUEUE_FILE):
-            with open(PENDING_QUEUE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.warning(f"Error cargando cola: {e}")
-    return []
+    return queue_store.items()
 
 def save_pending_queue(queue):
     """Guarda la cola de productos pendientes."""
     try:
-        with open(PENDING_QUEUE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(queue, f, ensure_ascii=False, indent=2)
+        queue_store.replace_all(queue)
     except Exception as e:
         logger.error(f"Error guardando cola: {e}")
 
 def add_to_pending_queue(product):
     """AÃƒÂ±ade un producto a la cola de pendientes."""
-    queue = load_pending_queue()
-    # Evitar duplicados por ASIN
-    if not any(p.get('asin') == product.get('asin') for p in queue):
-        product['queued_at'] = datetime.now().isoformat()
-        queue.append(product)
-        save_pending_queue(queue)
-        logger.info(f"Ã°Å¸â€œÂ¦ EN COLA [{len(queue)}]: {product.get('title', '')[:40]}...")
+    # Evitar duplicados por ASIN/EAN (indice de la cola, sin recorrerla)
+    product['queued_at'] = datetime.now().isoformat()
+    if queue_store.add_unique(product) is not None:
+        logger.info(f"Ã°Å¸â€œÂ¦ EN COLA [{queue_store.count()}]: {product.get('title', '')[:40]}...")
         return True
     return False
 
 def get_pending_count():
     """Retorna cuÃƒÂ¡ntos productos hay en cola."""
-    return len(load_pending_queue())
+    return queue_store.quick_count()  # Sidecar de metadatos, sin cargar la cola
 
 def log_processed_product(product, result):
     """Registra producto procesado (para anÃƒÂ¡lisis posterior)."""
     try:
-        processed = []
-        if os.path.exists(PROCESSED_LOG_FILE):
-            with open(PROCESSED_LOG_FILE, 'r', encoding='utf-8') as f:
-                processed = json.load(f)
-        
         product['processed_at'] = datetime.now().isoformat()
         product['ai_result'] = result
-        processed.append(product)
-        
-        # Mantener solo ÃƒÂºltimos 500 para no crecer infinito
-        if len(processed) > 500:
-            processed = processed[-500:]
+        records.append_records(PROCESSED_LOG_FILE, [product])
         
-        with open(PROCESSED_LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(processed, f, ensure_ascii=False, indent=2)
+        # Mantener solo los ultimos PROCESSED_LOG_MAX (recorte amortizado al doble)
+        if records.count_records(PROCESSED_LOG_FILE) > 2 * PROCESSED_LOG_MAX:
+            records.trim_records(PROCESSED_LOG_FILE, PROCESSED_LOG_MAX)
     except Exception as e:
         logger.warning(f"Error logging processed: {e}")
 
 def get_next_from_queue():
     """Obtiene el siguiente producto de la cola (FIFO)."""
-    queue = load_pending_queue()
-    if queue:
-        product = queue.pop(0)
-        save_pending_queue(queue)
-        return product
-    return None
+    return queue_store.pop()
 
 def remove_from_queue(asin):
     """Elimina un producto de la cola por ASIN."""
-    queue = load_pending_queue()
-    queue = [p for p in queue if p.get('asin') != asin]
-    save_pending_queue(queue)
+    queue_store.remove_where(lambda p: p.get('asin') == asin)
 
 # Variable global para modo cola
 QUEUE_MODE = os.getenv("QUEUE_MODE", "queue").lower()  # 'queue', 'direct', 'hybrid'
@@ -1127,46 +1106,22 @@ def detect_target_gender(title, description=""):
 # Ã°Å¸Â§Â  GEMINI JUDGE - El Juez AI para clasificaciÃƒÂ³n inteligente
 # ============================================================================
 
-def ask_gemini_judge(title, price, category_hint="", already_sent_categories=None):
+def judge_prompt_prefix():
     """
-    Consulta a Gemini para clasificar el producto de forma inteligente.
-    Con retry automÃƒÂ¡tico cuando se excede la quota (429).
-    
-    Retorna un dict con:
-    - is_good_gift: bool
-    - target_gender: 'male', 'female', 'any'
-    - category: categorÃƒÂ­a de gf_category (inventario WordPress)
-    - vibes: lista de vibes de personalidad (gf_vibe)
-    - reasoning: explicaciÃƒÂ³n breve
-    - is_duplicate: bool (si ya tenemos algo muy similar)
+    Instrucciones fijas del juez (iguales para cada producto: van por context caching).
+    Cualquier cambio aqui debe subir JUDGE_PROMPT_VERSION.
     """
-    if not GEMINI_API_KEYS or len(GEMINI_API_KEYS) == 0:
-        # Sin API keys, usar fallback al sistema anterior
-        logger.debug("Ã¢Å¡Â Ã¯Â¸Â Gemini no configurado, usando fallback regex")
-        return None
-    
-    # Construir contexto de productos ya enviados
-    sent_context = ""
-    if already_sent_categories:
-        sent_items = [f"{cat}: {count}" for cat, count in already_sent_categories.items() if count > 0]
-        if sent_items:
-            sent_context = f"Ya tengo en mi lista: {', '.join(sent_items[:10])}."
-    
     # Usar la constante global VALID_CATEGORIES
     # Edades y ocasiones del schema (fuente ÃƒÂºnica de verdad)
     valid_ages = list(GIFTIA_SCHEMA.get('ages', {}).keys()) if GIFTIA_SCHEMA else ["nino", "teen", "joven", "adulto", "senior", "mayor"]
     valid_occasions = list(GIFTIA_SCHEMA.get('occasions', {}).keys()) if GIFTIA_SCHEMA else ["cumple", "navidad", "amigoinvisible", "sanvalentin", "aniversario", "diaMadre", "graduacion", "boda", "gracias", "random"]
     valid_genders = list(GIFTIA_SCHEMA.get('genders', {}).keys()) if GIFTIA_SCHEMA else ["unisex", "male", "female", "kids"]
     
-    prompt = f"""Eres el CURADOR PRINCIPAL de "Giftia". Tu criterio combina:
+    return f"""Eres el CURADOR PRINCIPAL de "Giftia". Tu criterio combina:
 Ã°Å¸â€Â§ INGENIERO (utilidad y calidad) + Ã°Å¸Â§Â­ EXPLORADOR (originalidad) + Ã°Å¸ÂÂ· HEDONISTA (placer)
 
 Tu misiÃƒÂ³n: Filtrar la basura del e-commerce para encontrar "GEMAS" que hagan sentir INTELIGENTE y GENEROSO a quien regala.
 
-PRODUCTO: {title}
-PRECIO: {price} EUR
-{sent_context}
-
 Ã¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢Â
 Ã°Å¸â€™Å½ THE GIFTIA STANDARD - MATRIZ DE DECISIÃƒâ€œN
 Para APROBAR, debe superar AL MENOS UNO de estos 4 filtros.
@@ -1244,82 +1199,58 @@ CRITERIOS CLASIFICACIÃƒâ€œN:
 
 Solo JSON."""
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.1,  # Muy determinista
-            "maxOutputTokens": 500  # Aumentado para campos enriquecidos
-        }
-    }
+def ask_gemini_judge(title, price, category_hint="", already_sent_categories=None):
+    """
+    Consulta a Gemini para clasificar el producto de forma inteligente.
+    Pocos intentos (GEMINI_JUDGE_ATTEMPTS): si Gemini no responde, el llamador usa el regex.
     
-    # Ã°Å¸ÂÂ¢ PACING: Esperar para no exceder 15 RPM del Free Tier
-    global _last_gemini_call, _current_key_index
-    time_since_last = time.time() - _last_gemini_call
-    if time_since_last < GEMINI_PACING_SECONDS:
-        wait_time = GEMINI_PACING_SECONDS - time_since_last
-        logger.debug(f"Ã°Å¸ÂÂ¢ Pacing: esperando {wait_time:.1f}s antes de llamar a Gemini...")
-        time.sleep(wait_time)
-    _last_gemini_call = time.time()
-    
-    # Ã°Å¸â€â€˜ ROTACIÃƒâ€œN DE KEYS: Intentar con cada key disponible
-    keys_tried = 0
-    while keys_tried < len(GEMINI_API_KEYS):
-        current_key = GEMINI_API_KEYS[_current_key_index]
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={current_key}"
-        
-        try:
-            response = requests.post(
-                url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=GEMINI_TIMEOUT_SECONDS
-            )
-            
-            # Quota exceeded - rotar a siguiente key
-            if response.status_code == 429:
-                old_index = _current_key_index
-                _current_key_index = (_current_key_index + 1) % len(GEMINI_API_KEYS)
-                keys_tried += 1
-                logger.info(f"Ã°Å¸â€â€˜ Key {old_index + 1} quota excedida Ã¢â€ â€™ Rotando a Key {_current_key_index + 1}")
-                
-                if keys_tried < len(GEMINI_API_KEYS):
-                    time.sleep(1)  # Breve pausa antes de intentar con otra key
-                    continue
-                else:
-                    # Todas las keys agotadas, esperar y reintentar
-                    logger.warning(f"Ã¢Å¡Â Ã¯Â¸Â Todas las {len(GEMINI_API_KEYS)} keys agotadas. Esperando {GEMINI_RETRY_WAIT}s...")
-                    time.sleep(GEMINI_RETRY_WAIT)
-                    keys_tried = 0  # Reiniciar contador para otro ciclo
-                    continue
-            
-            if response.status_code != 200:
-                logger.warning(f"Ã¢Å¡Â Ã¯Â¸Â Gemini error {response.status_code}: {response.text[:100]}")
-                return None
-            
-            data = response.json()
-            text_response = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            
-            # Limpiar respuesta (a veces Gemini aÃƒÂ±ade markdown)
-            text_response = text_response.strip()
-            if text_response.startswith("```"):
-                text_response = re.sub(r'^```json?\s*', '', text_response)
-                text_response = re.sub(r'\s*```$', '', text_response)
-            
-            result = json.loads(text_response)
-            logger.debug(f"Ã°Å¸Â§Â  Gemini: {result}")
-            return result
-            
-        except json.JSONDecodeError as e:
-            logger.warning(f"Ã¢Å¡Â Ã¯Â¸Â Gemini JSON invÃƒÂ¡lido: {text_response[:100]}")
-            return None
-        except requests.exceptions.Timeout:
-            logger.warning("Ã¢Å¡Â Ã¯Â¸Â Gemini timeout")
-            return None
-        except Exception as e:
-            logger.warning(f"Ã¢Å¡Â Ã¯Â¸Â Gemini error: {e}")
-            return None
+    Retorna un dict con:
+    - is_good_gift: bool
+    - target_gender: 'male', 'female', 'any'
+    - category: categorÃƒÂ­a de gf_category (inventario WordPress)
+    - vibes: lista de vibes de personalidad (gf_vibe)
+    - reasoning: explicaciÃƒÂ³n breve
+    - is_duplicate: bool (si ya tenemos algo muy similar)
+    """
+    if not GEMINI_API_KEYS or len(GEMINI_API_KEYS) == 0:
+        # Sin API keys, usar fallback al sistema anterior
+        logger.debug("Ã¢Å¡Â Ã¯Â¸Â Gemini no configurado, usando fallback regex")
+        return None
     
-    return None
+    # Construir contexto de productos ya enviados
+    sent_context = ""
+    if already_sent_categories:
+        sent_items = [f"{cat}: {count}" for cat, count in already_sent_categories.items() if count > 0]
+        if sent_items:
+            sent_context = f"Ya tengo en mi lista: {', '.join(sent_items[:10])}."
+    
+    prompt = f"""PRODUCTO: {title}
+PRECIO: {price} EUR
+{sent_context}
+
+Clasifica este producto. Solo JSON."""
+
+    # Cliente compartido: token bucket RPM/TPM con el procesador y las herramientas
+    text_response = gemini_client.generate(prompt, temperature=0.1, max_output_tokens=500,
+                                           timeout=GEMINI_TIMEOUT_SECONDS, prefix=judge_prompt_prefix(),
+                                           prefix_version=JUDGE_PROMPT_VERSION,
+                                           max_attempts=GEMINI_JUDGE_ATTEMPTS)
+    if not text_response:
+        return None
+    
+    # Limpiar respuesta (a veces Gemini aÃƒÂ±ade markdown)
+    text_response = text_response.strip()
+    if text_response.startswith("```"):
+        text_response = re.sub(r'^```json?\s*', '', text_response)
+        text_response = re.sub(r'\s*```$', '', text_response)
+    
+    try:
+        result = json.loads(text_response)
+        logger.debug(f"Ã°Å¸Â§Â  Gemini: {result}")
+        return result
+    except json.JSONDecodeError as e:
+        logger.warning(f"Ã¢Å¡Â Ã¯Â¸Â Gemini JSON invÃƒÂ¡lido: {text_response[:100]}")
+        return None
 
 
 def classify_with_gemini_or_fallback(title, price, description=""):
@@ -1808,39 +1739,26 @@ def send_to_giftia(datos):
     gender_emoji = {"male": "Ã°Å¸â€˜Â¨", "female": "Ã°Å¸â€˜Â©", "kids": "Ã°Å¸â€˜Â¶", "unisex": "Ã°Å¸â€˜Â¥"}.get(target_gender, "Ã°Å¸â€˜Â¥")
     logger.info(f"{source_emoji} ENVIANDO [Score:{score}|Q:{gift_quality}] {gender_emoji} [{gemini_category}] {datos['title'][:40]}...")
     
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-            'X-GIFTIA-TOKEN': WP_TOKEN,
-            'User-Agent': 'GiftiaHunter/10.0'
-        }
-        
-        logger.debug(f"POST a {WP_API_URL}")
-        logger.debug(f"Token: {WP_TOKEN[:10]}...")
-        logger.debug(f"Datos: {json.dumps(datos, ensure_ascii=False)[:200]}...")
-        
-        response = requests.post(
-            WP_API_URL,
-            data=json.dumps(datos, ensure_ascii=False).encode('utf-8'),
-            headers=headers,
-            timeout=10
-        )
-        
-        logger.debug(f"Respuesta status: {response.status_code}")
-        logger.debug(f"Respuesta body: {response.text[:200]}")
-        
-        if response.status_code == 200:
-            logger.info(f"OK: {datos['title'][:40]} guardado en WordPress")
-            # Registrar para evitar duplicados
-            register_sent_product(datos["asin"], datos["title"])
-            return True
-        else:
-            logger.error(f"Error API {response.status_code}: {response.text[:100]}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Excepcion al enviar: {str(e)}")
+    # Write-ahead: la clasificacion ya esta pagada. Si el hunter muere antes
+    # de que WordPress conteste, process_queue.py lo republica desde el outbox
+    outbox_ids = publish_outbox.put([(datos, {"category": gemini_category, "gift_quality": gift_quality or 0,
+                                              "gender": target_gender, "source": source})])
+    
+    # Envio con reintentos (429 con Retry-After, 5xx) compartido con process_queue
+    result = wp_ingest.ingest_one(datos, user_agent='GiftiaHunter/10.0')
+    if result["ok"]:
+        publish_outbox.done(outbox_ids)
+        logger.info(f"OK: {datos['title'][:40]} guardado en WordPress")
+        # Registrar para evitar duplicados
+        register_sent_product(datos["asin"], datos["title"])
+        return True
+    if result.get("retryable"):
+        publish_outbox.fail(outbox_ids, result.get("error", ""))
+        logger.warning(f"WordPress sin respuesta ({result['http_code']}): queda en el outbox")
         return False
+    publish_outbox.done(outbox_ids)
+    logger.error(f"Error API {result['http_code']}: {result.get('error', '')[:100]}")
+    return False
 
 
 # ============================================================================
@@ -1865,9 +1783,8 @@ def queue_for_ai_analysis(datos):
         logger.debug(f"Ã°Å¸â€â€ž DUPLICADO (ASIN ya enviado): {title[:40]}...")
         return False
     
-    # Ya estÃƒÂ¡ en cola?
-    queue = load_pending_queue()
-    if any(p.get('asin') == asin for p in queue):
+    # Ya estÃƒÂ¡ en cola? (lookup en el indice de la cola)
+    if queue_store.contains(datos):
         logger.debug(f"Ã°Å¸â€â€ž YA EN COLA: {title[:40]}...")
         return False
     
@@ -1906,6 +1823,8 @@ def queue_for_ai_analysis(datos):
     
     # Ã‚Â¡Producto vÃƒÂ¡lido! AÃƒÂ±adir a cola
     logger.info(f"Ã¢Å“â€¦ CANDIDATO [Rating:{rating_value}Ã¢Â­Â|Reviews:{review_count}]: {title[:50]}...")
+    # Pre-score barato para priorizar la cola (queue_priority.py)
+    datos["pre_score"] = calculate_gift_score(title, datos.get("price", "0"), datos.get("description", ""))
     return add_to_pending_queue(datos)
 
 
@@ -2039,7 +1958,8 @@ def run_queue_processor(max_products=None, pacing_seconds=None):
         return 0
     
     logger.info(f"Ã°Å¸Å¡â‚¬ PROCESANDO COLA: {queue_size} productos pendientes")
-    logger.info(f"Ã¢ÂÂ±Ã¯Â¸Â Pacing: {pacing_seconds}s entre productos ({60/pacing_seconds:.1f} RPM)")
+    if pacing_seconds:
+        logger.info(f"Ã¢ÂÂ±Ã¯Â¸Â Pacing: {pacing_seconds}s entre productos ({60/pacing_seconds:.1f} RPM)")
     
     if max_products:
         logger.info(f"Ã°Å¸â€œÅ  LÃƒÂ­mite: {max_products} productos mÃƒÂ¡ximo")
@@ -2071,7 +1991,7 @@ def run_queue_processor(max_products=None, pacing_seconds=None):
             # No devolver a cola para evitar bucle infinito
         
         # Pacing - esperar antes del siguiente
-        if get_pending_count() > 0:
+        if pacing_seconds and get_pending_count() > 0:
             logger.debug(f"Ã¢ÂÂ³ Esperando {pacing_seconds}s...")
             time.sleep(pacing_seconds)
     
@@ -2516,7 +2436,6 @@ if __name__ == "__main__":
                 logger.info(f"Ã°Å¸Â§Â  INICIANDO PROCESAMIENTO IA")
                 logger.info(f"Ã¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢ÂÃ¢â€¢Â")
                 logger.info(f"Ã°Å¸â€œÂ¦ Productos en cola: {queue_size}")
-                logger.info(f"Ã¢ÂÂ±Ã¯Â¸Â Tiempo estimado: {queue_size * GEMINI_PACING_SECONDS / 60:.1f} minutos")
                 logger.info(f"")
                 
                 # En modo queue, NO procesamos - usar process_queue.py
@@ -2548,5 +2467,6 @@ if __name__ == "__main__":
             continue
     
     # Fin del while - limpieza
+    queue_store.compact()  # Volcar journal al snapshot de la cola
     driver.quit()
     logger.info("Ã°Å¸ÂÂ Driver cerrado, sesiÃƒÂ³n de 6 horas terminada")
\ No newline at end of file
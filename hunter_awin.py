@@ -16,8 +16,11 @@ import time
 import hashlib
 from datetime import datetime
 
+import queue_store
+import records
+
 # Archivos de configuración
-PENDING_QUEUE_FILE = os.path.join(os.path.dirname(__file__), "pending_products.json")
+PENDING_QUEUE_FILE = queue_store.QUEUE_SNAPSHOT_FILE
 PROCESSED_LOG_FILE = os.path.join(os.path.dirname(__file__), "processed_products.json")
 INVENTORY_FILE = os.path.join(os.path.dirname(__file__), "published_inventory.json")
 SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "giftia_schema.json")
@@ -198,24 +201,13 @@ def load_existing_ids():
     # 2. Chequear log de procesados recientes
     if os.path.exists(PROCESSED_LOG_FILE):
         try:
-            with open(PROCESSED_LOG_FILE, 'r', encoding='utf-8') as f:
-                processed = json.load(f)
-                for item in processed:
-                    if 'asin' in item:
-                        existing_ids.add(item['asin'])
+            for item in records.iter_records(PROCESSED_LOG_FILE):
+                if 'asin' in item:
+                    existing_ids.add(item['asin'])
         except Exception as e:
             print(f"⚠️ Error leyendo processed log: {e}")
-            
-    # 3. Chequear cola actual
-    if os.path.exists(PENDING_QUEUE_FILE):
-        try:
-            with open(PENDING_QUEUE_FILE, 'r', encoding='utf-8') as f:
-                queue = json.load(f)
-                for item in queue:
-                    if 'asin' in item:
-                        existing_ids.add(item['asin'])
-        except Exception as e:
-            print(f"⚠️ Error leyendo cola pendiente: {e}")
+
+    # 3. La cola actual no se carga: queue_store.add_many() deduplica con su índice
 
     return existing_ids
 
@@ -231,8 +223,8 @@ def process_awin_feed(filepath, limit=None):
     existing_ids = load_existing_ids()
     print(f"🔍 {len(existing_ids)} productos ya conocidos (se ignorarán)")
     
-    new_products = []
-    chunk_size = 500  # Leer y guardar cada 500 para proteger memoria
+    new_products = []  # Lote pendiente de encolar
+    chunk_size = 100   # Encolar cada 100 para proteger memoria
     count = 0
     added = 0
     skipped = 0
@@ -283,17 +275,18 @@ def process_awin_feed(filepath, limit=None):
                 print(f"❌ Error: No se encontraron columnas críticas (Name, Price, URL).")
                 return
 
-            current_queue = []
-            # Si existe cola previa, cargarla para hacer append
-            if os.path.exists(PENDING_QUEUE_FILE):
-                try:
-                    with open(PENDING_QUEUE_FILE, 'r', encoding='utf-8') as pf:
-                        current_queue = json.load(pf)
-                except:
-                    current_queue = []
+            def flush():
+                """Encola el lote (solo escribe los nuevos). Retorna añadidos."""
+                nonlocal skipped
+                if not new_products:
+                    return 0
+                new_count, dup_count = queue_store.add_many(new_products)
+                skipped += dup_count
+                new_products.clear()
+                return new_count
 
             for row in reader:
-                if limit and added >= limit:
+                if limit and added + len(new_products) >= limit:
                     break
                 
                 count += 1
@@ -362,19 +355,16 @@ def process_awin_feed(filepath, limit=None):
                 if not product['image_url'] or product['price'] == 0:
                     continue
 
-                current_queue.append(product)
+                new_products.append(product)
                 existing_ids.add(giftia_id)
-                added += 1
                 
                 # Guardado incremental
-                if len(current_queue) % 100 == 0:
-                     print(f"💾 Guardando lote... (Cola: {len(current_queue)})")
-                     with open(PENDING_QUEUE_FILE, 'w', encoding='utf-8') as out:
-                        json.dump(current_queue, out, ensure_ascii=False, indent=2)
+                if len(new_products) >= chunk_size:
+                    added += flush()
+                    print(f"💾 Guardando lote... (Añadidos: {added})")
 
             # Guardado final
-            with open(PENDING_QUEUE_FILE, 'w', encoding='utf-8') as out:
-                json.dump(current_queue, out, ensure_ascii=False, indent=2)
+            added += flush()
 
     except Exception as e:
         print(f"❌ Error fatal procesando CSV: {e}")
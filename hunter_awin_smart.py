@@ -9,6 +9,9 @@ import os, json, gzip, csv, sys, requests
 from datetime import datetime
 from dotenv import load_dotenv
 
+import queue_store
+import state_store
+
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
     sys.stderr.reconfigure(encoding='utf-8', errors='replace')
@@ -16,7 +19,7 @@ if sys.platform == 'win32':
 load_dotenv()
 
 # Configuración
-PENDING_QUEUE_FILE = "pending_products.json"
+PENDING_QUEUE_FILE = queue_store.QUEUE_SNAPSHOT_FILE
 STATE_FILE = "hunter_awin_state.json"
 LOG_FILE = "hunter_awin.log"
 AWIN_API_KEY = os.getenv("AWIN_API_KEY", "")
@@ -233,40 +236,28 @@ def apply_filters(row, processed_ids, merchant_id=None):
     return True, (price, uid)
 
 def load_state():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except: pass
-    return {"last_run": None, "processed_ids": []}
-
-def save_state(state):
-    with open(STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+    """Estado + versión (para guardar de forma optimista al final)"""
+    state, version = state_store.load(STATE_FILE)
+    return state or {"last_run": None, "processed_ids": []}, version
 
-def load_queue():
-    try:
-        with open(PENDING_QUEUE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+def save_state(state, version):
+    """Guarda el estado. Si otra ejecución lo cambió entretanto, fusiona processed_ids."""
+    while not state_store.save(STATE_FILE, state, version):
+        log("⚠️ Estado modificado por otro proceso, fusionando...")
+        current, version = load_state()
+        merged = list(dict.fromkeys(current.get("processed_ids", []) + state["processed_ids"]))
+        state["processed_ids"] = merged[-50000:]
 
 def save_to_queue(products):
-    queue = load_queue()
-    existing_ids = {p.get('identifiers', {}).get('ean') or p.get('identifiers', {}).get('merchant_product_id') for p in queue}
-    
-    new_count = 0
-    for p in products:
-        pid = p.get('identifiers', {}).get('ean') or p.get('identifiers', {}).get('merchant_product_id')
-        if pid and pid not in existing_ids:
-            p['queued_at'] = datetime.now().isoformat()
-            queue.append(p)
-            existing_ids.add(pid)
-            new_count += 1
-    
-    with open(PENDING_QUEUE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(queue, f, indent=2, ensure_ascii=False)
-    
+    """Encola en streaming; la cola deduplica por EAN/MPID con su índice (sin cargarla entera)"""
+    def with_id(products):
+        for p in products:
+            ids = p.get('identifiers', {})
+            if ids.get('ean') or ids.get('merchant_product_id'):
+                p['queued_at'] = datetime.now().isoformat()
+                yield p
+    
+    new_count, _ = queue_store.add_many(with_id(products))
     return new_count
 
 def get_feed_url(mid, fid):
@@ -383,7 +374,7 @@ def run_hunter():
     log(f"Precio: {MIN_PRICE}€ - {MAX_PRICE}€")
     log(f"Categorías: Tech/Gaming/Electrónica")
     
-    state = load_state()
+    state, state_version = load_state()
     log(f"\n📂 Última ejecución: {state.get('last_run', 'Nunca')}")
     
     all_products = []
@@ -405,7 +396,7 @@ def run_hunter():
     
     state["last_run"] = datetime.now().isoformat()
     state["processed_ids"] = list(all_ids)[-50000:]
-    save_state(state)
+    save_state(state, state_version)
     
     log(f"\n{'='*70}")
     log(f"📊 RESUMEN FINAL")
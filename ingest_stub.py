@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita api-ingest.php (sin WordPress).
+
+Para probar wp_ingest.py y medir el procesador sin publicar nada: se
+arranca el stub y se apunta WP_API_URL a él.
+
+- POST /api-ingest.php: un producto (modo clásico). Guarda por ASIN (o EAN).
+- POST /api-ingest.php?action=bulk_ingest: {"products": [...]} y responde
+  {"success", "results": [{"index", "success", "post_id", "code", "error"}]}.
+  Un bloque con un producto que no es un objeto JSON se rechaza entero (400).
+  Con --no-bulk responde 404 "Acción desconocida", como un plugin antiguo.
+- Fallos inyectables con semilla: latencia, 429 del bloque con Retry-After,
+  fallo transitorio por producto (503) y productos sin ASIN/título
+  rechazados (400, no se reintentan).
+- Idempotente como el plugin: el mismo ASIN actualiza el mismo post_id.
+
+Uso:
+    python ingest_stub.py --port 8766 --rate-item-fail 0.1
+    WP_API_URL=http://127.0.0.1:8766/api-ingest.php python process_queue.py
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger("IngestStub")
+
+# Configuración (todo se puede cambiar con start(**config) o por CLI)
+STUB_CONFIG = {
+    "latency": float(os.getenv("INGEST_STUB_LATENCY", "0")),  # Segundos por petición
+    "bulk": os.getenv("INGEST_STUB_BULK", "1") != "0",
+    "rate_429": float(os.getenv("INGEST_STUB_RATE_429", "0")),
+    "retry_after": float(os.getenv("INGEST_STUB_RETRY_AFTER", "1")),
+    "rate_item_fail": float(os.getenv("INGEST_STUB_RATE_ITEM_FAIL", "0")),
+    "seed": int(os.getenv("INGEST_STUB_SEED", "42")),
+}
+
+stats = {"requests": 0, "bulk_requests": 0, "rate_limited": 0, "created": 0, "updated": 0, "failed": 0}
+posts = {}  # ASIN/EAN → {"post_id", "product"}
+
+_lock = threading.Lock()
+_rng = random.Random(STUB_CONFIG["seed"])
+
+
+def _product_key(product):
+    return product.get("asin") or product.get("ean") or product.get("gtin")
+
+def save_product(product):
+    """Guarda un producto como el plugin. Retorna el resultado de ese producto."""
+    if not isinstance(product, dict) or not _product_key(product) or not product.get("title"):
+        stats["failed"] += 1
+        return {"success": False, "code": 400, "error": "Faltan asin/ean o title"}
+    if _rng.random() < STUB_CONFIG["rate_item_fail"]:
+        stats["failed"] += 1
+        return {"success": False, "code": 503, "error": "Database busy (stub)"}
+    key = _product_key(product)
+    if key in posts:
+        posts[key]["product"] = product
+        stats["updated"] += 1
+    else:
+        posts[key] = {"post_id": 1000 + len(posts), "product": product}
+        stats["created"] += 1
+    return {"success": True, "code": 200, "post_id": posts[key]["post_id"]}
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        action = parse_qs(urlparse(self.path).query).get("action", [""])[0]
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"success": False, "error": "JSON inválido"})
+        time.sleep(STUB_CONFIG["latency"])
+
+        with _lock:
+            stats["requests"] += 1
+            if _rng.random() < STUB_CONFIG["rate_429"]:
+                stats["rate_limited"] += 1
+                retry_after = f"{STUB_CONFIG['retry_after']:g}"
+                return self._send(429, {"success": False, "error": "Rate limit (stub)"}, {"Retry-After": retry_after})
+            if action == "bulk_ingest" and STUB_CONFIG["bulk"]:
+                stats["bulk_requests"] += 1
+                products = payload.get("products", [])
+                if not all(isinstance(p, dict) for p in products):
+                    return self._send(400, {"success": False, "error": "Producto mal formado en el bloque"})
+                results = [dict(save_product(p), index=n) for n, p in enumerate(products)]
+                return self._send(200, {"success": all(r["success"] for r in results), "results": results})
+            if action:
+                return self._send(404, {"success": False, "error": f"Acción desconocida: {action}"})
+            result = save_product(payload)
+        self._send(result.pop("code"), result)
+
+
+def configure(**config):
+    """Cambia la configuración y vacía los posts, la semilla y las estadísticas."""
+    global _rng
+    unknown = set(config) - set(STUB_CONFIG)
+    if unknown:
+        raise ValueError(f"Opciones desconocidas: {', '.join(sorted(unknown))}")
+    with _lock:
+        STUB_CONFIG.update(config)
+        _rng = random.Random(STUB_CONFIG["seed"])
+        posts.clear()
+        for name in stats:
+            stats[name] = 0
+
+def start(port=0, host="127.0.0.1", **config):
+    """Arranca el stub en un hilo. Retorna (servidor, url de api-ingest.php)."""
+    configure(**config)
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api-ingest.php"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Stub local de api-ingest.php.')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=STUB_CONFIG["latency"], help='Segundos por petición')
+    parser.add_argument('--no-bulk', action='store_true', help='Sin action=bulk_ingest (plugin antiguo)')
+    parser.add_argument('--rate-429', type=float, default=STUB_CONFIG["rate_429"], help='Fracción de peticiones con 429')
+    parser.add_argument('--retry-after', type=float, default=STUB_CONFIG["retry_after"])
+    parser.add_argument('--rate-item-fail', type=float, default=STUB_CONFIG["rate_item_fail"],
+                        help='Fracción de productos con fallo transitorio')
+    parser.add_argument('--seed', type=int, default=STUB_CONFIG["seed"])
+    args = parser.parse_args()
+
+    server, url = start(args.port, latency=args.latency, bulk=not args.no_bulk, rate_429=args.rate_429,
+                        retry_after=args.retry_after, rate_item_fail=args.rate_item_fail, seed=args.seed)
+    print(f"🧪 Stub de api-ingest.php en {url}")
+    print(f"   WP_API_URL={url} python process_queue.py")
+    try:
+        while True:
+            time.sleep(30)
+            print(f"📊 {stats} | {len(posts)} posts")
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n🛑 Stub parado. {stats}")
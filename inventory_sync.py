@@ -18,10 +18,11 @@ import os
 import json
 import csv
 import sys
-import requests
-import time
 from dotenv import load_dotenv
 
+import payload_hashes
+import wp_limiter
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -38,7 +39,7 @@ def get_wp_snapshot():
     print("📡 Obteniendo snapshot de inventario WP...")
     try:
         url = f"{WP_API_BASE}?action=inventory_snapshot&token={WP_TOKEN}"
-        resp = requests.get(url, timeout=60)
+        resp = wp_limiter.request("GET", url, timeout=60)
         resp.raise_for_status()
         data = resp.json()
         
@@ -128,22 +129,26 @@ def update_product_batch(updates):
     headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {WP_TOKEN}'}
     
     for up in updates:
+        # El motivo es texto para el log: no cuenta como cambio
+        if payload_hashes.unchanged("stock", {k: v for k, v in up.items() if k != 'reason'}):
+            print(f"   ♻️ Sin cambios ID {up['post_id']}: ya enviado")
+            continue
         try:
             url = f"{WP_API_BASE}?action=update_stock&token={WP_TOKEN}"
-            resp = requests.post(url, json=up, headers=headers, timeout=10)
+            resp = wp_limiter.request("POST", url, json=up, headers=headers, timeout=10)
             
             if resp.status_code == 200:
                 print(f"   ✅ OK ID {up['post_id']}: {up['reason']}")
+                payload_hashes.remember("stock", {k: v for k, v in up.items() if k != 'reason'})
                 success_count += 1
             else:
                 print(f"   ⚠️ Falló ID {up['post_id']}: {resp.text}")
-                
-            time.sleep(0.1) # Rate limit suave
             
         except Exception as e:
             print(f"   ❌ Error req ID {up['post_id']}: {e}")
             
     print(f"🏁 Finalizado. Éxito: {success_count}/{len(updates)}")
+    print(payload_hashes.report())
 
 def main():
     print("=== GIFTIA INVENTORY SELF-HEALING ===")
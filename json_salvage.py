@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parser tolerante para los arrays JSON que devuelve Gemini.
+
+Antes: re.search(r'\[[\s\S]*\]') + parches con regex + json.loads. Si la
+respuesta venía cortada por maxOutputTokens (o un solo objeto traía una
+comilla sin escapar) se perdía el batch entero, aunque 4 de 5 fichas
+estuvieran completas.
+
+salvage_array(text) recorre el texto carácter a carácter, separando los
+objetos de primer nivel del array, y retorna todos los que están completos.
+Por el camino repara lo que Gemini suele romper:
+- ```json ... ``` y texto antes o después del array
+- comillas sin escapar dentro de un string ("Taza "Mejor Papá"")
+- escapes inválidos (\' o \ suelto) y caracteres de control en strings
+- comas finales antes de } o ]
+- el último objeto a medias (respuesta cortada): se descarta solo ese
+
+Uso:
+    python json_salvage.py last_gemini_response.txt   # Qué se recupera de un volcado
+"""
+
+import json
+import logging
+
+logger = logging.getLogger("JsonSalvage")
+
+VALID_ESCAPES = '"\\/bfnrtu'
+RAW_RESPONSE_HEADER = "=== RAW RESPONSE ==="
+
+
+def _closes_string(text, pos):
+    """¿La comilla en pos cierra el string? Solo si detrás viene , : } ] o el final."""
+    for c in text[pos + 1:]:
+        if not c.isspace():
+            return c in ",:}]"
+    return True
+
+def _strip_trailing_comma(buf):
+    while buf and buf[-1].isspace():
+        buf.pop()
+    if buf and buf[-1] == ",":
+        buf.pop()
+
+def _objects(text):
+    """Genera el texto (ya reparado) de cada objeto de primer nivel completo."""
+    start = text.find("[")
+    if 0 <= text.find("{") < start:
+        start = -1  # Un objeto suelto, no un array: el [ es de un campo
+    pos = start + 1 if start >= 0 else 0
+    buf = None          # Objeto en curso (lista de caracteres) o None entre objetos
+    depth = 0
+    in_string = False
+    while pos < len(text):
+        c = text[pos]
+        if buf is None:
+            if c == "{":
+                buf, depth = ["{"], 1
+            elif c == "]" and start >= 0:
+                return  # Fin del array
+        elif in_string:
+            if c == "\\":
+                nxt = text[pos + 1:pos + 2]
+                if nxt and nxt in VALID_ESCAPES:
+                    buf += [c, nxt]
+                    pos += 1
+                else:
+                    buf.append("\\\\")
+            elif c == '"':
+                if _closes_string(text, pos):
+                    in_string = False
+                    buf.append(c)
+                else:
+                    buf.append('\\"')
+            elif c < " ":
+                buf.append(" ")
+            else:
+                buf.append(c)
+        elif c == '"':
+            in_string = True
+            buf.append(c)
+        elif c in "{[":
+            depth += 1
+            buf.append(c)
+        elif c in "}]":
+            _strip_trailing_comma(buf)
+            depth -= 1
+            buf.append(c)
+            if depth == 0:
+                yield "".join(buf)
+                buf = None
+        else:
+            buf.append(c)
+        pos += 1
+
+def salvage_array(text):
+    """Objetos (dicts) completos de un array JSON, aunque esté cortado o roto."""
+    results = []
+    skipped = 0
+    for chunk in _objects(text or ""):
+        try:
+            value = json.loads(chunk, strict=False)
+        except json.JSONDecodeError:
+            skipped += 1
+            continue
+        if isinstance(value, dict):
+            results.append(value)
+    if skipped:
+        logger.warning(f"🩹 {skipped} objetos irrecuperables en la respuesta de Gemini")
+    return results
+
+def raw_response(dump):
+    """Respuesta original de un volcado last_gemini_response*.txt."""
+    if RAW_RESPONSE_HEADER not in dump:
+        return dump
+    raw = dump.split(RAW_RESPONSE_HEADER, 1)[1]
+    return raw.split("\n\n=== ", 1)[0].strip("\n")
+
+
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1], encoding="utf-8") as f:
+        objects = salvage_array(raw_response(f.read()))
+    print(f"🩹 {len(objects)} objetos recuperados")
+    for obj in objects:
+        print(f"   └ i={obj.get('i', '?')} ok={obj.get('ok', '?')} {str(obj.get('title', ''))[:60]}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hash del último payload enviado a WordPress por producto: upserts idempotentes.
+
+Las herramientas de mantenimiento (reprocess_existing, fix_massive_seo,
+fix_seo_today, reclassify_products) e inventory_sync volvían a mandar
+payloads idénticos a lo que ya estaba publicado: carga para WordPress y
+minutos de ejecución para nada.
+
+- unchanged(scope, payload): True si el hash canónico del payload coincide
+  con el último enviado con éxito para ese producto (y lo cuenta como
+  saltado). El llamador no lo envía.
+- remember(scope, payload): tras un envío confirmado por WordPress.
+- forget(payload): el producto cambió por otra vía (p. ej. wp_ingest lo
+  republicó entero): se borran sus hashes de todos los scopes.
+
+Un producto se identifica por post_id, ASIN o EAN (el que traiga el
+payload o se pase aparte): basta que coincida uno. El scope separa los
+tipos de escritura que tocan campos distintos ("seo", "stock",
+"category"): actualizar el stock no obliga a reenviar el SEO.
+
+Hash canónico: sha256 del JSON con claves ordenadas, sin los campos de
+IGNORED_FIELDS (marcas de tiempo que cambian en cada ejecución).
+PAYLOAD_HASH_SKIP=0 desactiva los saltos (se envía todo y se recuerda).
+
+Uso:
+    python payload_hashes.py            # Estado
+    python payload_hashes.py --clear    # Vaciar (el próximo envío va entero)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("PayloadHashes")
+
+# Configuración
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HASH_DB_FILE = os.getenv("PAYLOAD_HASH_DB", os.path.join(BASE_DIR, "payload_hashes.db"))
+HASH_SKIP = os.getenv("PAYLOAD_HASH_SKIP", "1") != "0"
+IGNORED_FIELDS = ("processed_at", "discovered_at", "updated_at", "timestamp")
+BUSY_TIMEOUT_SECONDS = 30
+
+_conn = None
+_conn_path = None
+_conn_pid = None
+_lock = threading.Lock()
+stats = {"skipped": 0, "sent": 0}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS hashes (
+    scope TEXT NOT NULL,
+    post_id TEXT,
+    asin TEXT,
+    ean TEXT,
+    hash TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hashes_post_id ON hashes(post_id);
+CREATE INDEX IF NOT EXISTS idx_hashes_asin ON hashes(asin);
+CREATE INDEX IF NOT EXISTS idx_hashes_ean ON hashes(ean);
+"""
+
+
+# ============================================================================
+# HASH E IDENTIFICADORES
+# ============================================================================
+
+def canonical_hash(payload):
+    """sha256 del payload en JSON canónico (claves ordenadas, sin IGNORED_FIELDS)."""
+    data = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def identifiers(payload, post_id=None):
+    """(post_id, asin, ean) del producto como texto (None si no lo trae)."""
+    post_id = post_id or payload.get("post_id")
+    ean = payload.get("ean") or payload.get("gtin")
+    return (str(post_id) if post_id else None, payload.get("asin") or None, str(ean) if ean else None)
+
+def _match(ids):
+    """WHERE y parámetros de las filas de cualquiera de los identificadores."""
+    columns = [(column, value) for column, value in zip(("post_id", "asin", "ean"), ids) if value]
+    return " OR ".join(f"{column} = ?" for column, _ in columns), [value for _, value in columns]
+
+
+# ============================================================================
+# CONEXIÓN
+# ============================================================================
+
+def _connect():
+    """Conexión perezosa por proceso (se reabre si cambia HASH_DB_FILE o tras fork)."""
+    global _conn, _conn_path, _conn_pid
+    if _conn is not None and _conn_path == HASH_DB_FILE and _conn_pid == os.getpid():
+        return _conn
+    if _conn is not None and _conn_pid == os.getpid():
+        _conn.close()
+    _conn = sqlite3.connect(HASH_DB_FILE, timeout=BUSY_TIMEOUT_SECONDS,
+                            isolation_level=None, check_same_thread=False)
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _conn.executescript(SCHEMA_SQL)
+    _conn_path = HASH_DB_FILE
+    _conn_pid = os.getpid()
+    return _conn
+
+
+# ============================================================================
+# API
+# ============================================================================
+
+def unchanged(scope, payload, post_id=None):
+    """True si WordPress ya tiene este payload (mismo hash en este scope): no hace falta enviarlo."""
+    where, params = _match(identifiers(payload, post_id))
+    if not where:
+        return False
+    with _lock:
+        rows = _connect().execute(f"SELECT hash FROM hashes WHERE scope = ? AND ({where})",
+                                  [scope] + params).fetchall()
+    if HASH_SKIP and any(row[0] == canonical_hash(payload) for row in rows):
+        stats["skipped"] += 1
+        return True
+    return False
+
+def remember(scope, payload, post_id=None, now=None):
+    """Apunta el hash de un payload que WordPress confirmó."""
+    ids = identifiers(payload, post_id)
+    where, params = _match(ids)
+    if not where:
+        return
+    now = now or time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Una fila por producto y scope: se juntan los identificadores conocidos
+            rows = conn.execute(f"SELECT post_id, asin, ean FROM hashes WHERE scope = ? AND ({where})",
+                                [scope] + params).fetchall()
+            merged = [value or next((row[n] for row in rows if row[n]), None) for n, value in enumerate(ids)]
+            conn.execute(f"DELETE FROM hashes WHERE scope = ? AND ({where})", [scope] + params)
+            conn.execute("INSERT INTO hashes (scope, post_id, asin, ean, hash, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         [scope] + merged + [canonical_hash(payload), now])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    stats["sent"] += 1
+
+def forget(payload, post_id=None):
+    """Borra los hashes del producto en todos los scopes. Retorna cuántos."""
+    where, params = _match(identifiers(payload, post_id))
+    if not where or not os.path.exists(HASH_DB_FILE):  # Sin herramientas de mantenimiento no hay nada que olvidar
+        return 0
+    with _lock:
+        return _connect().execute(f"DELETE FROM hashes WHERE {where}", params).rowcount
+
+def count():
+    with _lock:
+        return _connect().execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+def clear():
+    with _lock:
+        _connect().execute("DELETE FROM hashes")
+
+def report():
+    """Línea de resumen para el final de cada ejecución."""
+    total = stats["skipped"] + stats["sent"]
+    return f"♻️ Envíos sin cambios saltados: {stats['skipped']}/{total} ({stats['sent']} enviados)"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Hashes de payloads enviados a WordPress')
+    parser.add_argument('--clear', action='store_true', help='Vacía los hashes')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+        print("🗑️ Hashes vaciados")
+
+    with _lock:
+        rows = _connect().execute("SELECT scope, COUNT(*), MAX(updated_at) FROM hashes GROUP BY scope").fetchall()
+    print(f"♻️ {HASH_DB_FILE}: {count()} productos con hash (saltos {'on' if HASH_SKIP else 'off'})")
+    for scope, entries, last in rows:
+        print(f"   └ {scope}: {entries} productos, último envío {time.strftime('%Y-%m-%d %H:%M', time.localtime(last))}")
@@ -10,11 +10,25 @@ import json
 import time
 import re
 import logging
-import requests
 import argparse
+import threading
+from queue import Queue
 from datetime import datetime
 from dotenv import load_dotenv
 
+import adaptive_batch
+import bulk_jobs
+import classification_cache
+import gemini_client
+import gemini_schema
+import publish_outbox
+import queue_store
+import records
+import retry_queue
+import state_store
+import wp_ingest
+import wp_limiter
+
 # Fix encoding para Windows (evitar crash con emojis en cp1252)
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -24,21 +38,31 @@ if sys.platform == 'win32':
 load_dotenv()
 
 # Configuración
-PENDING_QUEUE_FILE = "pending_products.json"
-PROCESSED_LOG_FILE = "processed_products.json"
-GEMINI_PACING_SECONDS = 1  # Con plan de pago podemos ir RÁPIDO
-WP_PACING_SECONDS = 5  # Delay entre envíos a WP para evitar 429
-BATCH_SIZE = 3  # Reducido a 3 para evitar respuestas cortadas por Gemini
+PENDING_QUEUE_FILE = queue_store.QUEUE_SNAPSHOT_FILE
+PROCESSED_LOG_FILE = "processed_products.json"  # JSONL (ver records.py)
+PROCESSED_LOG_MAX = 500
+GEMINI_CONCURRENCY = gemini_client.GEMINI_CONCURRENCY  # Batches en vuelo (el ritmo lo marca el token bucket)
+BATCH_SIZE = adaptive_batch.BATCH_INITIAL  # Tamaño inicial: luego se adapta a los tokens de salida (adaptive_batch.py)
+PROMPT_VERSION = "curador-v51"  # Subir al cambiar el prompt: invalida la caché de clasificaciones
+TRIAGE_ENABLED = os.getenv("GEMINI_TRIAGE", "1") != "0"  # Criba barata antes de la ficha SEO
+TRIAGE_BATCH_SIZE = int(os.getenv("GEMINI_TRIAGE_BATCH_SIZE", "40"))  # Títulos por petición de criba
+TRIAGE_MAX_OUTPUT_TOKENS = 2048
+TRIAGE_PROMPT_VERSION = "triage-v1"
+MIN_GIFT_QUALITY = 5  # Por debajo se rechaza (criba y run_processor)
+PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "2"))  # Hilos publicando en WordPress
+PUBLISH_CHANNEL_SIZE = int(os.getenv("PUBLISH_CHANNEL_SIZE", "4"))  # Bloques clasificados esperando a WordPress
+BULK_SUBMIT_LIMIT = int(os.getenv("GEMINI_BULK_SUBMIT_LIMIT", "5000"))  # Productos por trabajo batch (--bulk-limit)
 
 # APIs - Leer desde .env (NUNCA hardcodear secrets)
-WP_API_URL = os.getenv("WP_API_URL", "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php")
-WP_TOKEN = os.getenv("WP_API_TOKEN", "")
-GEMINI_API_KEYS = [os.getenv("GEMINI_API_KEY", "")]
+WP_API_URL = wp_ingest.WP_API_URL  # El envío (en bloque, con reintentos) lo hace wp_ingest.py
 
 # Logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger("QueueProcessor")
 
+# Tokens Gemini por etapa (para tokens por producto publicado)
+token_stats = {"triage": 0, "seo": 0, "triaged": 0, "triage_rejected": 0}
+
 # ==========================================
 # CARGAR SCHEMA DESDE giftia_schema.json - FUENTE ÚNICA DE VERDAD
 # ==========================================
@@ -87,10 +111,6 @@ print(f"   Generos: {len(VALID_GENDERS)} - {VALID_GENDERS}")
 print(f"   Destinatarios: {len(VALID_RECIPIENTS)} - {VALID_RECIPIENTS}")
 print(f"   Ocasiones: {len(VALID_OCCASIONS)} - {VALID_OCCASIONS[:5]}...")
 
-# Estado Gemini
-current_key_index = 0
-gemini_call_count = 0
-
 def generate_seo_slug(title):
     """Genera un slug SEO desde el título si Gemini no lo proporciona."""
     import unicodedata
@@ -116,46 +136,41 @@ PUBLISHED_INVENTORY_FILE = "published_inventory.json"
 
 def load_published_inventory():
     """Carga el inventario de productos ya publicados, agrupados por categoría."""
-    try:
-        if os.path.exists(PUBLISHED_INVENTORY_FILE):
-            with open(PUBLISHED_INVENTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.warning(f"Error cargando inventario: {e}")
-    return {}
+    return state_store.read_json(PUBLISHED_INVENTORY_FILE, {})
 
 def save_published_inventory(inventory):
     """Guarda el inventario de productos publicados."""
     try:
-        with open(PUBLISHED_INVENTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(inventory, f, ensure_ascii=False, indent=2)
+        state_store.write_json(PUBLISHED_INVENTORY_FILE, inventory)
     except Exception as e:
         logger.error(f"Error guardando inventario: {e}")
 
 def add_to_inventory(product, classification):
     """Añade un producto publicado al inventario para futura deduplicación."""
-    inventory = load_published_inventory()
     category = classification.get("category", "otros")
     
-    if category not in inventory:
-        inventory[category] = []
-    
     # Guardar info resumida para comparación
     price = float(str(product.get("price", "0")).replace(",", ".").replace("€", "").strip() or 0)
-    inventory[category].append({
+    entry = {
         "title": product.get("title", ""),
         "original_title": product.get("original_title", product.get("title", "")),
         "price": price,
         "gift_quality": classification.get("gift_quality", 5),
         "asin": product.get("asin", ""),
         "added_at": datetime.now().isoformat()
-    })
+    }
     
-    # Mantener máximo 50 productos por categoría (los más recientes)
-    if len(inventory[category]) > 50:
+    def _add(inventory):
+        inventory.setdefault(category, []).append(entry)
+        # Mantener máximo 50 productos por categoría (los más recientes)
         inventory[category] = inventory[category][-50:]
+        return inventory
     
-    save_published_inventory(inventory)
+    # Bajo lock: otros workers/hunters pueden estar escribiendo a la vez
+    try:
+        state_store.update(PUBLISHED_INVENTORY_FILE, _add, {})
+    except Exception as e:
+        logger.error(f"Error guardando inventario: {e}")
 
 def get_similar_products_context(products):
     """Genera contexto de productos similares ya publicados para cada producto del batch."""
@@ -186,59 +201,45 @@ def get_similar_products_context(products):
     
     return context_per_product
 
+# La cola vive en queue_store (backend journal o sqlite, ver QUEUE_BACKEND)
 def load_pending_queue():
-    try:
-        if os.path.exists(PENDING_QUEUE_FILE):
-            with open(PENDING_QUEUE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.warning(f"Error cargando cola: {e}")
-    return []
+    return queue_store.items()
 
 def save_pending_queue(queue):
     try:
-        with open(PENDING_QUEUE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(queue, f, ensure_ascii=False, indent=2)
+        queue_store.replace_all(queue)
     except Exception as e:
         logger.error(f"Error guardando cola: {e}")
 
 def get_next_from_queue():
-    queue = load_pending_queue()
-    if queue:
-        product = queue.pop(0)
-        save_pending_queue(queue)
-        return product
-    return None
+    return queue_store.pop()
 
-def get_batch_from_queue(batch_size=BATCH_SIZE):
-    """Obtiene un batch de productos de la cola."""
-    queue = load_pending_queue()
-    if not queue:
-        return []
-    batch = queue[:batch_size]
-    remaining = queue[batch_size:]
-    save_pending_queue(remaining)
-    return batch
+def get_batch_from_queue(batch_size=None):
+    """Reserva un batch de productos de la cola (confirmar con ack_batch)."""
+    return queue_store.claim_batch(batch_size or adaptive_batch.size())
+
+def ack_batch(products):
+    """Confirma productos ya procesados para que salgan de la cola."""
+    if products:
+        queue_store.ack(products)
+
+def nack_batch(products):
+    """Devuelve a la cola productos reservados que no se llegaron a procesar."""
+    for product in products:
+        queue_store.nack(product)
 
 def get_pending_count():
-    return len(load_pending_queue())
+    return queue_store.count()
 
 def log_processed_product(product, result):
     try:
-        processed = []
-        if os.path.exists(PROCESSED_LOG_FILE):
-            with open(PROCESSED_LOG_FILE, 'r', encoding='utf-8') as f:
-                processed = json.load(f)
-        
         product['processed_at'] = datetime.now().isoformat()
         product['ai_result'] = result
-        processed.append(product)
+        records.append_records(PROCESSED_LOG_FILE, [product])
         
-        if len(processed) > 500:
-            processed = processed[-500:]
-        
-        with open(PROCESSED_LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(processed, f, ensure_ascii=False, indent=2)
+        # Mantener solo los últimos PROCESSED_LOG_MAX (recorte amortizado al doble)
+        if records.count_records(PROCESSED_LOG_FILE) > 2 * PROCESSED_LOG_MAX:
+            records.trim_records(PROCESSED_LOG_FILE, PROCESSED_LOG_MAX)
     except Exception as e:
         logger.warning(f"Error logging: {e}")
 
@@ -334,55 +335,15 @@ def validate_category(category):
             return valid
     return "otros"
 
-def call_gemini(prompt):
-    global current_key_index, gemini_call_count
-    
-    if not GEMINI_API_KEYS:
-        logger.error("❌ No hay API keys configuradas!")
-        return None
-    
-    max_wait_cycles = 10  # Máximo 10 ciclos de espera (10 minutos total)
-    wait_cycle = 0
-    
-    while wait_cycle < max_wait_cycles:
-        for key_attempt in range(len(GEMINI_API_KEYS)):
-            key = GEMINI_API_KEYS[current_key_index]
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={key}"
-            
-            try:
-                response = requests.post(url, json={
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.4,        # Un poco más creativo
-                        "maxOutputTokens": 8192    # Suficiente para ficha completa (600-800 palabras)
-                    }
-                }, timeout=60)  # Más tiempo para respuestas largas
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                    gemini_call_count += 1
-                    return text
-                elif response.status_code == 429:
-                    logger.warning(f"🔄 Key {current_key_index+1} quota exceeded, probando siguiente...")
-                    current_key_index = (current_key_index + 1) % len(GEMINI_API_KEYS)
-                else:
-                    logger.error(f"Gemini error {response.status_code}: {response.text[:100]}")
-                    return None
-            except Exception as e:
-                logger.error(f"Gemini exception: {e}")
-                current_key_index = (current_key_index + 1) % len(GEMINI_API_KEYS)
-        
-        # Todas las keys agotadas - ESPERAR en vez de fallback
-        wait_cycle += 1
-        wait_seconds = 60  # Esperar 1 minuto
-        logger.info(f"⏳ Todas las keys agotadas. Esperando {wait_seconds}s... (intento {wait_cycle}/{max_wait_cycles})")
-        time.sleep(wait_seconds)
-    
-    logger.error("❌ Tiempo de espera agotado después de 10 minutos. Saltando producto.")
-    return None
+def call_gemini(prompt, **kwargs):
+    """Una llamada a Gemini a través del cliente compartido (token bucket RPM/TPM)."""
+    return gemini_client.generate(prompt, temperature=0.4, max_output_tokens=8192, timeout=60, **kwargs)
 
 def classify_with_gemini(title, price, description=""):
+    cached = classification_cache.get(title, price, "simple-v1")
+    if cached:
+        return cached
+    
     prompt = f"""Analiza este producto de Amazon como regalo:
 
 TÍTULO: {title}
@@ -399,24 +360,21 @@ CRITERIOS:
 - gift_quality: 1-10 (calidad como regalo)
 - Rechaza: consumibles básicos, repuestos, accesorios genéricos, packs múltiples del mismo producto"""
 
-    response = call_gemini(prompt)
+    response = call_gemini(prompt, **gemini_schema.generation_options(gemini_schema.SIMPLE_SCHEMA))
     
-    if response:
-        try:
-            json_match = re.search(r'\{[^{}]+\}', response.replace('\n', ' '))
-            if json_match:
-                data = json.loads(json_match.group())
-                return {
-                    "is_good_gift": data.get("is_good_gift", False),
-                    "category": validate_category(data.get("category", "otros")),
-                    "target_gender": data.get("target_gender", "unisex"),
-                    "gift_quality": int(data.get("gift_quality", 5)),
-                    "is_duplicate": data.get("is_duplicate", False),
-                    "reject_reason": data.get("reject_reason", ""),
-                    "source": "gemini"
-                }
-        except Exception as e:
-            logger.warning(f"Error parseando respuesta Gemini: {e}")
+    data = gemini_schema.parse(response, gemini_schema.SIMPLE_SCHEMA)
+    if data:
+        classification = {
+            "is_good_gift": data.get("is_good_gift", False),
+            "category": validate_category(data.get("category", "otros")),
+            "target_gender": data.get("target_gender", "unisex"),
+            "gift_quality": data.get("gift_quality", 5),
+            "is_duplicate": data.get("is_duplicate", False),
+            "reject_reason": data.get("reject_reason", ""),
+            "source": "gemini"
+        }
+        classification_cache.put(title, price, "simple-v1", classification)
+        return classification
     
     # SIN FALLBACK - retorna None para que el producto vuelva a cola
     return None
@@ -425,22 +383,142 @@ def classify_batch_with_gemini(products):
     """Clasifica productos según giftia_schema.json - FUENTE ÚNICA DE VERDAD."""
     if not products:
         return []
-    
-    # Construir lista de productos para el prompt con más contexto
+    return classify_batches_with_gemini([products])[0]
+
+def classify_products_with_gemini(products):
+    """Clasifica productos: primero la caché; luego la criba; la ficha SEO solo a los aprobados.
+
+    La ficha SEO va en batches adaptativos, en paralelo.
+    """
+    classifications = [classification_cache.get(p.get("title", ""), p.get("price", ""), PROMPT_VERSION)
+                       for p in products]
+    pending = [i for i, c in enumerate(classifications) if c is None]
+    if TRIAGE_ENABLED and pending:
+        verdicts = triage_products([products[i] for i in pending])
+        for i, verdict in zip(pending, verdicts):
+            if verdict is not None and not is_triage_approved(verdict):
+                classifications[i] = triage_rejection(verdict)
+        pending = [i for i in pending if classifications[i] is None]
+    batch_size = adaptive_batch.size()
+    index_batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    tokens_before = gemini_client.stats["tokens"]
+    results = classify_batches_with_gemini([[products[i] for i in batch] for batch in index_batches])
+    token_stats["seo"] += gemini_client.stats["tokens"] - tokens_before
+    for batch, batch_results in zip(index_batches, results):
+        for i, classification in zip(batch, batch_results):
+            classifications[i] = classification
+            classification_cache.put(products[i].get("title", ""), products[i].get("price", ""),
+                                     PROMPT_VERSION, classification)
+    return classifications
+
+def triage_products(products):
+    """Criba: muchos títulos por petición, solo ok/q/category. None si no hay veredicto.
+
+    Los veredictos se cachean aparte (TRIAGE_PROMPT_VERSION): un producto
+    aprobado cuya ficha SEO falle no vuelve a pasar por la criba.
+    """
+    verdicts = [classification_cache.get(p.get("title", ""), p.get("price", ""), TRIAGE_PROMPT_VERSION)
+                for p in products]
+    pending = [i for i, v in enumerate(verdicts) if v is None]
+    index_batches = [pending[i:i + TRIAGE_BATCH_SIZE] for i in range(0, len(pending), TRIAGE_BATCH_SIZE)]
+    prompts = [build_triage_prompt([products[i] for i in batch]) for batch in index_batches]
+    tokens_before = gemini_client.stats["tokens"]
+    responses = gemini_client.generate_many(prompts, temperature=0.2, max_output_tokens=TRIAGE_MAX_OUTPUT_TOKENS,
+                                            timeout=60, **gemini_schema.generation_options(gemini_schema.TRIAGE_SCHEMA))
+    token_stats["triage"] += gemini_client.stats["tokens"] - tokens_before
+    for batch, response in zip(index_batches, responses):
+        by_index = {r["i"]: r for r in gemini_schema.parse(response, gemini_schema.TRIAGE_SCHEMA)
+                    if "i" in r and "ok" in r}
+        for n, i in enumerate(batch):
+            verdicts[i] = by_index.get(n + 1)
+            classification_cache.put(products[i].get("title", ""), products[i].get("price", ""),
+                                     TRIAGE_PROMPT_VERSION, verdicts[i])
+    token_stats["triaged"] += len(pending)
+    token_stats["triage_rejected"] += sum(1 for i in pending if verdicts[i] is not None
+                                          and not is_triage_approved(verdicts[i]))
+    return verdicts
+
+def is_triage_approved(verdict):
+    return bool(verdict.get("ok")) and verdict.get("q", 0) >= MIN_GIFT_QUALITY
+
+def triage_rejection(verdict):
+    """Clasificación de un producto rechazado en la criba (sin ficha SEO)."""
+    category = verdict.get("category", "")
+    return {
+        "is_good_gift": False,
+        "gift_quality": verdict.get("q", 0),
+        "category": category if category in VALID_CATEGORIES else "otros",
+        "source": "gemini-triage",
+    }
+
+def build_triage_prompt(products):
+    """Prompt corto de criba: solo decidir si es buen regalo, su calidad y categoría."""
     products_text = ""
     for i, p in enumerate(products):
-        title = p.get("title", "Sin título")[:150]
-        price = p.get("price", "0")
-        rating = p.get("rating", "N/A")
-        reviews = p.get("reviews_count", "N/A")
-        products_text += f"\n{i+1}. {title}\n   Precio: {price}€ | Rating: {rating} | Reviews: {reviews}"
-    
-    prompt = f"""Eres el CURADOR JEFE y EXPERTO SEO de Giftia.es. Tu trabajo es:
+        products_text += f"\n{i+1}. {p.get('title', 'Sin título')[:150]} | {p.get('price', '0')}€"
+    return f"""Eres el CURADOR JEFE de Giftia.es. Decide qué productos merecen ficha como regalo.
+
+PRODUCTOS:{products_text}
+
+APRUEBA (ok: true) si cumple los filtros de excelencia: utilidad elevada, algo que el
+destinatario no se compraría solo, factor sorpresa o diseño especial, orgullo al regalarlo.
+
+RECHAZA (ok: false):
+- Recambios, pilas, cables, toner, consumibles básicos
+- Productos de limpieza o puramente funcionales
+- Cosas aburridas que nadie regalaría con emoción
+- Repuestos o accesorios sueltos sin gracia
+
+q: calidad como regalo de 1 a 10.
+category: una de {', '.join(VALID_CATEGORIES)}
+(bebés 0-2 años → Bebes, niños 3-12 años → Ninos, nunca Tech ni Decoración).
+
+Responde SOLO un JSON array, un objeto por producto: [{{"i": 1, "ok": true, "q": 8, "category": "Tech"}}]"""
+
+def classify_batches_with_gemini(batches):
+    """Clasifica varios batches con GEMINI_CONCURRENCY peticiones en vuelo.
+
+    Si Gemini responde pero faltan productos (respuesta cortada o JSON roto),
+    los que faltan se parten en dos mitades y se reintentan en otra ronda,
+    hasta llegar a productos sueltos. Si Gemini no responde, no se parte:
+    esos productos van a la cola de reintentos.
+    """
+    results = [[None] * len(batch) for batch in batches]
+    prefix = curator_prompt_prefix()
+    work = [(n, list(range(len(batch)))) for n, batch in enumerate(batches)]
+    while work:
+        prompts = [build_batch_suffix([batches[n][i] for i in positions]) for n, positions in work]
+        responses = gemini_client.generate_many(prompts, temperature=0.4, max_output_tokens=8192, timeout=60,
+                                                full=True, prefix=prefix, prefix_version=PROMPT_VERSION,
+                                                **gemini_schema.generation_options(gemini_schema.CURATOR_SCHEMA))
+        retry = []
+        for (n, positions), response in zip(work, responses):
+            products = [batches[n][i] for i in positions]
+            if response is None:
+                continue
+            truncated = response["finish_reason"] == "MAX_TOKENS"
+            adaptive_batch.observe(len(products), response["output_tokens"], truncated)
+            parsed = parse_batch_response(response["text"], products)
+            for i, classification in zip(positions, parsed):
+                results[n][i] = classification
+            missing = [i for i, classification in zip(positions, parsed) if classification is None]
+            if missing and len(positions) > 1:
+                half = (len(missing) + 1) // 2
+                retry += [(n, part) for part in (missing[:half], missing[half:]) if part]
+                logger.info(f"✂️ Batch de {len(positions)} incompleto{' (cortado)' if truncated else ''}: "
+                            f"reintentando {len(missing)} en mitades")
+        work = retry
+    return results
+
+def curator_prompt_prefix():
+    """Instrucciones fijas del curador (iguales en cada batch: van por context caching).
+
+    Cualquier cambio aquí debe subir PROMPT_VERSION.
+    """
+    return f"""Eres el CURADOR JEFE y EXPERTO SEO de Giftia.es. Tu trabajo es:
 1. Seleccionar regalos que EMOCIONEN
 2. Crear fichas de producto optimizadas para posicionar en Google
 
-PRODUCTOS A EVALUAR:{products_text}
-
 ===============================================================================
 FILTROS DE EXCELENCIA (4 filtros para aprobar)
 ===============================================================================
@@ -757,483 +835,469 @@ Si no cumples estas longitudes, la ficha no posicionará en Google.
 
 SOLO JSON VÁLIDO. Sin explicaciones. Sin markdown. Sin ```json."""
 
-    response = call_gemini(prompt)
-    
+def build_batch_suffix(products):
+    """Parte variable del prompt del curador: los productos del batch."""
+    # Construir lista de productos para el prompt con más contexto
+    products_text = ""
+    for i, p in enumerate(products):
+        title = p.get("title", "Sin título")[:150]
+        price = p.get("price", "0")
+        rating = p.get("rating", "N/A")
+        reviews = p.get("reviews_count", "N/A")
+        products_text += f"\n{i+1}. {title}\n   Precio: {price}€ | Rating: {rating} | Reviews: {reviews}"
+    return f"""PRODUCTOS A EVALUAR:{products_text}
+
+Responde con el JSON array: un objeto por producto, "i" = su número en la lista."""
+
+def build_batch_prompt(products):
+    """Prompt del curador completo (prefijo + productos) para enviarlo inline."""
+    return f"{curator_prompt_prefix()}\n\n{build_batch_suffix(products)}"
+
+def parse_batch_response(response, products):
+    """Mapea la respuesta de Gemini a una clasificación por producto (None si falta)."""
     if not response:
         return [None] * len(products)  # No se pudo clasificar
     
     try:
-        # Buscar array JSON en la respuesta
-        json_match = re.search(r'\[[\s\S]*\]', response)
-        if json_match:
-            json_str = json_match.group()
-            
-            # Limpiar JSON problemático
-            json_str = re.sub(r',\s*]', ']', json_str)  # Quitar coma trailing
-            json_str = re.sub(r',\s*}', '}', json_str)  # Quitar coma trailing en objetos
-            json_str = json_str.replace('…', '...')  # Reemplazar elipsis unicode
-            json_str = re.sub(r'[\x00-\x1f]', ' ', json_str)  # Quitar caracteres de control
-            json_str = json_str.replace('\\"', "'")  # Reemplazar escaped quotes problemáticas
+        # Fichas con los tipos y enums del schema (objetos completos aunque venga cortada)
+        results = gemini_schema.parse(response, gemini_schema.CURATOR_SCHEMA)
+        if len(results) < len(products):
+            logger.warning(f"🩹 Batch Gemini incompleto: {len(results)}/{len(products)} fichas recuperadas")
+            # Guardar respuesta para debug (corpus de tests/gemini_responses)
+            with open('last_gemini_response.txt', 'w', encoding='utf-8') as f:
+                f.write(f"=== RAW RESPONSE ===\n{response}\n\n=== SALVAGED ===\n{len(results)}")
+        else:
+            # DEBUG: Siempre guardar la última respuesta para verificar
+            with open('last_gemini_response_ok.txt', 'w', encoding='utf-8') as f:
+                f.write(f"=== RAW RESPONSE ===\n{response}\n\n=== PARSED RESULTS ===\n{json.dumps(results, indent=2, ensure_ascii=False)}")
+
+        # Mapear resultados a productos. Con una respuesta parcial no se
+        # puede mapear por posición si traen i: un hueco desplazaría el resto.
+        by_index = {r.get("i"): r for r in results if isinstance(r.get("i"), int)}
+        classifications = []
+        for i, product in enumerate(products):
+            # Buscar resultado correspondiente por índice
+            result = by_index.get(i + 1)
             
-            # Debug: guardar respuesta si falla
-            try:
-                results = json.loads(json_str)
-                # DEBUG: Siempre guardar la última respuesta para verificar
-                with open('last_gemini_response_ok.txt', 'w', encoding='utf-8') as f:
-                    f.write(f"=== RAW RESPONSE ===\n{response}\n\n=== PARSED RESULTS ===\n{json.dumps(results, indent=2, ensure_ascii=False)}")
-            except json.JSONDecodeError as je:
-                logger.warning(f"Error parseando batch Gemini: {je}")
-                # Guardar respuesta para debug
-                with open('last_gemini_response.txt', 'w', encoding='utf-8') as f:
-                    f.write(f"=== RAW RESPONSE ===\n{response}\n\n=== EXTRACTED JSON ===\n{json_str}")
-                return [None] * len(products)
+            # Si la respuesta no trae i, usar por posición
+            if not by_index and i < len(results):
+                result = results[i]
             
-            # Mapear resultados a productos
-            classifications = []
-            for i, product in enumerate(products):
-                # Buscar resultado correspondiente por índice
-                result = None
-                for r in results:
-                    if r.get("i") == i + 1:
-                        result = r
-                        break
+            if result:
+                # Obtener título optimizado
+                opt_title = result.get("title", "") or product.get("title", "")
+                # Obtener slug - si no hay, generarlo desde título
+                seo_slug = result.get("slug", "")
+                if not seo_slug and opt_title:
+                    seo_slug = generate_seo_slug(opt_title)
+                
+                # Obtener categoría - DEBE coincidir con giftia_schema.json
+                category = result.get("category", "Tech")
+                if category not in VALID_CATEGORIES:
+                    category = VALID_CATEGORIES[0] if VALID_CATEGORIES else "Tech"
                 
-                # Si no encontró por i, usar por posición
-                if result is None and i < len(results):
-                    result = results[i]
+                # Obtener edad - array de valores del schema
+                age_raw = result.get("age", [])
+                if isinstance(age_raw, str):
+                    age_raw = [age_raw]
+                ages = [a for a in age_raw if a in VALID_AGES]
+                if not ages:
+                    ages = ["adultos"]  # Fallback
                 
-                if result:
-                    # Obtener título optimizado
-                    opt_title = result.get("title", "") or product.get("title", "")
-                    # Obtener slug - si no hay, generarlo desde título
-                    seo_slug = result.get("slug", "")
-                    if not seo_slug and opt_title:
-                        seo_slug = generate_seo_slug(opt_title)
+                # Obtener género
+                gender = result.get("gender", "unisex")
+                if gender not in VALID_GENDERS:
+                    gender = "unisex"
+                
+                # Obtener destinatarios - array del schema
+                recipients_raw = result.get("recipients", [])
+                if isinstance(recipients_raw, str):
+                    recipients_raw = [recipients_raw]
+                recipients = [r for r in recipients_raw if r in VALID_RECIPIENTS]
+                if not recipients:
+                    recipients = ["amigo"]  # Fallback
+                
+                # Obtener ocasiones - array del schema
+                occasions_raw = result.get("occasions", [])
+                if isinstance(occasions_raw, str):
+                    occasions_raw = [occasions_raw]
+                occasions = [o for o in occasions_raw if o in VALID_OCCASIONS]
+                if not occasions:
+                    occasions = ["cumpleanos", "navidad"]  # Fallback
+                
+                # Obtener marketing_hook - uno de los 5 ganchos psicológicos
+                VALID_HOOKS = ["core", "habitat", "style", "hedonism", "wildcard"]
+                marketing_hook = result.get("marketing_hook", "").lower()
+                if marketing_hook not in VALID_HOOKS:
+                    marketing_hook = "wildcard"  # Fallback
+                
+                # Obtener giftia_score (estrellas 1-5)
+                giftia_score = float(result.get("giftia_score", 0))
+                if giftia_score == 0:
+                    # Calcular desde gift_quality (1-10) → (1-5)
+                    giftia_score = round(int(result.get("q", 5)) / 2, 1)
+                giftia_score = max(1.0, min(5.0, giftia_score))  # Clamp 1-5
+                
+                classifications.append({
+                    # Evaluación
+                    "is_good_gift": result.get("ok", False),
+                    "gift_quality": int(result.get("q", 5)),
+                    "giftia_score": giftia_score,  # Estrellas 1-5 para Schema.org
                     
-                    # Obtener categoría - DEBE coincidir con giftia_schema.json
-                    category = result.get("category", "Tech")
-                    if category not in VALID_CATEGORIES:
-                        category = VALID_CATEGORIES[0] if VALID_CATEGORIES else "Tech"
+                    # Taxonomías según giftia_schema.json
+                    "category": category,        # Tech, Gamer, Gourmet, etc.
+                    "ages": ages,                # ninos, adolescentes, jovenes, adultos, seniors, abuelos
+                    "gender": gender,            # unisex, male, female, kids
+                    "recipients": recipients,    # pareja, padre, amigo, etc.
+                    "occasions": occasions,      # cumpleanos, navidad, etc.
+                    "marketing_hook": marketing_hook,  # core, habitat, style, hedonism, wildcard
                     
-                    # Obtener edad - array de valores del schema
-                    age_raw = result.get("age", [])
-                    if isinstance(age_raw, str):
-                        age_raw = [age_raw]
-                    ages = [a for a in age_raw if a in VALID_AGES]
-                    if not ages:
-                        ages = ["adultos"]  # Fallback
+                    # ═══════════════════════════════════════════════════════
+                    # FICHA SEO COMPLETA - GOLD MASTER v51
+                    # ═══════════════════════════════════════════════════════
                     
-                    # Obtener género
-                    gender = result.get("gender", "unisex")
-                    if gender not in VALID_GENDERS:
-                        gender = "unisex"
+                    # Metadatos SEO (Google SERP)
+                    "seo_title": result.get("seo_title", ""),                      # Meta title 50-60 chars
+                    "meta_description": result.get("meta_description", ""),        # Snippet 150-160 chars
                     
-                    # Obtener destinatarios - array del schema
-                    recipients_raw = result.get("recipients", [])
-                    if isinstance(recipients_raw, str):
-                        recipients_raw = [recipients_raw]
-                    recipients = [r for r in recipients_raw if r in VALID_RECIPIENTS]
-                    if not recipients:
-                        recipients = ["amigo"]  # Fallback
+                    # Títulos y gancho
+                    "h1_title": result.get("h1_title", opt_title),                 # H1 persuasivo 40-70 chars
+                    "short_description": result.get("short_description", ""),      # Above the fold 80-120 palabras
                     
-                    # Obtener ocasiones - array del schema
-                    occasions_raw = result.get("occasions", [])
-                    if isinstance(occasions_raw, str):
-                        occasions_raw = [occasions_raw]
-                    occasions = [o for o in occasions_raw if o in VALID_OCCASIONS]
-                    if not occasions:
-                        occasions = ["cumpleanos", "navidad"]  # Fallback
+                    # Opinión experto (E-E-A-T)
+                    "expert_opinion": result.get("expert_opinion", ""),            # 100-150 palabras
                     
-                    # Obtener marketing_hook - uno de los 5 ganchos psicológicos
-                    VALID_HOOKS = ["core", "habitat", "style", "hedonism", "wildcard"]
-                    marketing_hook = result.get("marketing_hook", "").lower()
-                    if marketing_hook not in VALID_HOOKS:
-                        marketing_hook = "wildcard"  # Fallback
+                    # Pros y Contras
+                    "pros": result.get("pros", []),                                # 5-6 bullets emocionales
+                    "cons": result.get("cons", []),                                # 2-3 bullets honestos
                     
-                    # Obtener giftia_score (estrellas 1-5)
-                    giftia_score = float(result.get("giftia_score", 0))
-                    if giftia_score == 0:
-                        # Calcular desde gift_quality (1-10) → (1-5)
-                        giftia_score = round(int(result.get("q", 5)) / 2, 1)
-                    giftia_score = max(1.0, min(5.0, giftia_score))  # Clamp 1-5
+                    # Descripción larga SEO (posiciona la URL)
+                    "full_description": result.get("full_description", ""),        # 600-800 palabras con H2s
                     
-                    classifications.append({
-                        # Evaluación
-                        "is_good_gift": result.get("ok", False),
-                        "gift_quality": int(result.get("q", 5)),
-                        "giftia_score": giftia_score,  # Estrellas 1-5 para Schema.org
-                        
-                        # Taxonomías según giftia_schema.json
-                        "category": category,        # Tech, Gamer, Gourmet, etc.
-                        "ages": ages,                # ninos, adolescentes, jovenes, adultos, seniors, abuelos
-                        "gender": gender,            # unisex, male, female, kids
-                        "recipients": recipients,    # pareja, padre, amigo, etc.
-                        "occasions": occasions,      # cumpleanos, navidad, etc.
-                        "marketing_hook": marketing_hook,  # core, habitat, style, hedonism, wildcard
-                        
-                        # ═══════════════════════════════════════════════════════
-                        # FICHA SEO COMPLETA - GOLD MASTER v51
-                        # ═══════════════════════════════════════════════════════
-                        
-                        # Metadatos SEO (Google SERP)
-                        "seo_title": result.get("seo_title", ""),                      # Meta title 50-60 chars
-                        "meta_description": result.get("meta_description", ""),        # Snippet 150-160 chars
-                        
-                        # Títulos y gancho
-                        "h1_title": result.get("h1_title", opt_title),                 # H1 persuasivo 40-70 chars
-                        "short_description": result.get("short_description", ""),      # Above the fold 80-120 palabras
-                        
-                        # Opinión experto (E-E-A-T)
-                        "expert_opinion": result.get("expert_opinion", ""),            # 100-150 palabras
-                        
-                        # Pros y Contras
-                        "pros": result.get("pros", []),                                # 5-6 bullets emocionales
-                        "cons": result.get("cons", []),                                # 2-3 bullets honestos
-                        
-                        # Descripción larga SEO (posiciona la URL)
-                        "full_description": result.get("full_description", ""),        # 600-800 palabras con H2s
-                        
-                        # Buyer persona
-                        "who_is_for": result.get("who_is_for", ""),                    # 80-100 palabras
-                        
-                        # FAQs (Featured Snippets)
-                        "faqs": result.get("faqs", []),                                # 4-5 Q&A
-                        
-                        # Veredicto final
-                        "verdict": result.get("verdict", ""),                          # 50-80 palabras
-                        
-                        # URL slug
-                        "seo_slug": result.get("slug", seo_slug),                      # max 5 palabras
-                        
-                        # Legacy compatibility (mantener para código existente)
-                        "marketing_title": result.get("h1_title", opt_title),
-                        "optimized_title": result.get("h1_title", opt_title),
-                        "seo_content": result.get("full_description", ""),             # Alias para compatibilidad
-                        "why_selected": result.get("expert_opinion", ""),              # Alias
-                        "gift_headline": result.get("short_description", ""),
-                        "gift_pros": result.get("pros", []),
-                        "source": "gemini"
-                    })
-                else:
-                    classifications.append(None)
-            
-            return classifications
+                    # Buyer persona
+                    "who_is_for": result.get("who_is_for", ""),                    # 80-100 palabras
+                    
+                    # FAQs (Featured Snippets)
+                    "faqs": result.get("faqs", []),                                # 4-5 Q&A
+                    
+                    # Veredicto final
+                    "verdict": result.get("verdict", ""),                          # 50-80 palabras
+                    
+                    # URL slug
+                    "seo_slug": result.get("slug", seo_slug),                      # max 5 palabras
+                    
+                    # Legacy compatibility (mantener para código existente)
+                    "marketing_title": result.get("h1_title", opt_title),
+                    "optimized_title": result.get("h1_title", opt_title),
+                    "seo_content": result.get("full_description", ""),             # Alias para compatibilidad
+                    "why_selected": result.get("expert_opinion", ""),              # Alias
+                    "gift_headline": result.get("short_description", ""),
+                    "gift_pros": result.get("pros", []),
+                    "source": "gemini"
+                })
+            else:
+                classifications.append(None)
+        
+        return classifications
     except Exception as e:
         logger.warning(f"Error parseando batch Gemini: {e}")
         logger.debug(f"Respuesta: {response[:300] if response else 'None'}")
     
     return [None] * len(products)
 
-def add_back_to_queue(product):
-    """Devuelve un producto a la cola para procesarlo después."""
-    queue = load_pending_queue()
-    # Añadir al final de la cola
-    product['retry_count'] = product.get('retry_count', 0) + 1
-    queue.append(product)
-    save_pending_queue(queue)
-    logger.info(f"🔄 Devuelto a cola (intento {product['retry_count']}): {product.get('title', '')[:40]}...")
+def add_back_to_queue(product, reason="sin respuesta de Gemini"):
+    """Aparta un producto fallido a la cola de reintentos (backoff exponencial).
+
+    Quien lo reservó debe confirmarlo después con ack_batch: ya no está en la
+    cola principal. Al agotar los reintentos pasa a dead-letter.
+    """
+    if retry_queue.schedule(product, reason):
+        wait = product['not_before'] - time.time()
+        logger.info(f"⏳ Reintento {product['retry_count']} en {wait:.0f}s: {product.get('title', '')[:40]}...")
+    else:
+        log_processed_product(product, {"status": "max_retries", "reason": reason})
 
 def process_product(product):
+    """Clasifica y publica un producto suelto. Retorna True si quedó publicado.
+
+    Mismo camino que el procesador por bloques (filtros, outbox, ack): si
+    WordPress no contesta, el producto sigue en el outbox y se republica.
+    """
     title = product.get("title", "")
-    asin = product.get("asin", "")
     price = float(product.get("price", "0").replace(",", ".").replace("€", "").strip() or 0)
     
-    # Máximo 3 reintentos
-    if product.get('retry_count', 0) >= 3:
-        logger.warning(f"⚠️ Máximo reintentos alcanzado, descartando: {title[:40]}...")
-        log_processed_product(product, {"status": "max_retries", "reason": "3 intentos fallidos"})
-        return False
-    
-    # Llamar a Gemini - SIN FALLBACK
+    # Llamar a Gemini - SIN FALLBACK (sin respuesta: reintento diferido)
     classification = classify_with_gemini(title, price, product.get("description", ""))
+    return publish_classified(product, classification) == "published"
+
+def publish_classified(product, classification):
+    """Aplica la clasificación de Gemini a un producto y lo publica si se aprueba.
+
+    Retorna "retry" (sin clasificación: a la cola de reintentos), "rejected",
+    "published", "error" (WordPress lo rechazó, queda en el log de procesados)
+    o "unsent" (WordPress no contestó: sigue en el outbox y se republica).
+    """
+    return publish_many([(product, classification)])[0]
+
+def publish_many(classified):
+    """publish_classified para muchos productos: los aprobados van a WordPress en bloque (wp_ingest).
+
+    Los aprobados se apuntan en el outbox antes de enviarlos (publish_outbox.py).
+    """
+    statuses = [prepare_publication(product, classification) for product, classification in classified]
+    ready = [n for n, status in enumerate(statuses) if status == "ready"]
+    prepared = [classified[n] for n in ready]
+    for n, status in zip(ready, publish_prepared(prepared, publish_outbox.put(prepared))):
+        statuses[n] = status
+    return statuses
+
+def publish_prepared(prepared, ids):
+    """Envía a WordPress productos ya preparados y apuntados en el outbox con esos ids.
+
+    Cada entrada sale del outbox cuando WordPress contesta; si no contesta
+    queda pendiente con backoff. Retorna "published", "error" o "unsent".
+    """
+    if not prepared:
+        return []
+    results = wp_ingest.ingest_many([product for product, _ in prepared])
+    statuses = [finish_publication(product, classification, result)
+                for (product, classification), result in zip(prepared, results)]
+    publish_outbox.done([entry_id for entry_id, status in zip(ids, statuses) if status != "unsent"])
+    publish_outbox.fail([entry_id for entry_id, status in zip(ids, statuses) if status == "unsent"],
+                        "WordPress sin respuesta")
+    return statuses
+
+def prepare_publication(product, classification):
+    """Filtros y enriquecimiento con la ficha de Gemini. Retorna "retry", "rejected" o "ready"."""
+    title = product.get("title", "")[:40]
     
-    # Si Gemini no responde, devolver a cola
     if classification is None:
+        # Gemini no respondió - reintento diferido
         add_back_to_queue(product)
-        return False  # No publicado, pero volverá a intentarse
+        logger.warning(f"   🔄 Sin respuesta AI: {title}...")
+        return "retry"
+    
+    # Rechazar duplicados detectados por Gemini
+    if classification.get("is_duplicate", False):
+        logger.info(f"   🔄 DUPLICADO (hay mejor alternativa): {title}...")
+        log_processed_product(product, {"status": "rejected", "reason": "duplicado inferior"})
+        return "rejected"
     
     if not classification["is_good_gift"]:
-        reason = classification.get("reject_reason", "no es buen regalo")
-        logger.info(f"🧠 RECHAZADO: {reason} - {title[:40]}...")
-        log_processed_product(product, {"status": "rejected", "reason": reason})
-        return False
+        logger.info(f"   ❌ NO ES BUEN REGALO - {title}...")
+        log_processed_product(product, {"status": "rejected"})
+        return "rejected"
     
-    if classification["gift_quality"] < 5:
-        logger.info(f"🧠 CALIDAD BAJA ({classification['gift_quality']}/10): {title[:40]}...")
+    if classification["gift_quality"] < MIN_GIFT_QUALITY:
+        logger.info(f"   ⚠️ BAJA CALIDAD ({classification['gift_quality']}/10): {title}...")
         log_processed_product(product, {"status": "rejected", "reason": f"calidad {classification['gift_quality']}"})
-        return False
+        return "rejected"
+    
+    # Producto aprobado - enriquecer con datos optimizados de Gemini
+    original_title = product.get("title", "")
     
-    # Enriquecer producto - TODOS LOS DATOS DE GEMINI v51
-    # Datos básicos de clasificación
-    product["gemini_category"] = classification["category"]
-    product["target_gender"] = classification.get("gender", "unisex")
+    # Usar marketing_title de Gemini como título principal
+    marketing_title = classification.get("marketing_title", "")
+    product["title"] = marketing_title if marketing_title else original_title
+    product["original_title"] = original_title  # Guardar original por si acaso
+    
+    # Datos de clasificación según giftia_schema.json
+    product["category"] = classification["category"]     # Tech, Gamer, Gourmet, etc.
+    product["gemini_category"] = classification["category"]  # Compatibilidad legacy
+    product["target_gender"] = classification["gender"]  # unisex, male, female, kids
     product["gift_quality"] = classification["gift_quality"]
-    product["giftia_score"] = classification.get("giftia_score", 4.0)
+    product["giftia_score"] = classification.get("giftia_score", 4.0)  # Estrellas 1-5
     product["classification_source"] = "gemini"
-    product["vibes"] = [classification["category"]]
-    product["gift_score"] = classification["gift_quality"] * 10
-    product["processed_at"] = datetime.now().isoformat()
     
-    # Taxonomías enriquecidas
-    product["ages"] = classification.get("ages", ["adultos"])
-    product["recipients"] = classification.get("recipients", [])
-    product["occasions"] = classification.get("occasions", ["cumpleanos", "navidad"])
-    product["marketing_hook"] = classification.get("marketing_hook", "wildcard")
+    # ==========================================
+    # FICHA DE PRODUCTO COMPLETA (Gold Master v51)
+    # ==========================================
     
-    # ═══════════════════════════════════════════════════════
-    # FICHA SEO COMPLETA - GOLD MASTER v51
-    # ═══════════════════════════════════════════════════════
-    
-    # Metadatos SEO (Google SERP)
-    product["seo_title"] = classification.get("seo_title", "")
-    product["meta_description"] = classification.get("meta_description", "")
+    # Metadatos SEO (para Google SERP)
+    product["seo_title"] = classification.get("seo_title", "")                     # Meta title 50-60 chars
+    product["meta_description"] = classification.get("meta_description", "")       # Snippet 150-160 chars
     
     # Títulos y gancho
-    product["h1_title"] = classification.get("h1_title", product.get("title", ""))
+    product["h1_title"] = classification.get("h1_title", product.get("title", "")) # H1 persuasivo
     product["optimized_title"] = classification.get("h1_title", product.get("title", ""))
     product["marketing_title"] = classification.get("h1_title", product.get("title", ""))
-    product["short_description"] = classification.get("short_description", "")
-    product["gift_headline"] = classification.get("short_description", "")
+    product["short_description"] = classification.get("short_description", "")     # Above the fold 80-120 palabras
+    product["gift_headline"] = classification.get("short_description", "")         # Alias
     
-    # Opinión experto (E-E-A-T)
-    product["expert_opinion"] = classification.get("expert_opinion", "")
-    product["why_selected"] = classification.get("expert_opinion", "")
+    # Opinión del experto (E-E-A-T)
+    product["expert_opinion"] = classification.get("expert_opinion", "")           # 100-150 palabras
+    product["why_selected"] = classification.get("expert_opinion", "")             # Alias
     
     # Pros y Contras
-    product["pros"] = classification.get("pros", [])
-    product["cons"] = classification.get("cons", [])
-    product["gift_pros"] = classification.get("pros", [])
+    product["pros"] = classification.get("pros", [])                               # 5-6 bullets emocionales
+    product["cons"] = classification.get("cons", [])                               # 2-3 bullets honestos
+    product["gift_pros"] = classification.get("pros", [])                          # Alias
     
-    # Descripción larga SEO
-    product["full_description"] = classification.get("full_description", "")
-    product["seo_content"] = classification.get("full_description", "")
+    # Descripción larga SEO (posiciona la URL)
+    product["full_description"] = classification.get("full_description", "")       # 600-800 palabras con H2s
+    product["seo_content"] = classification.get("full_description", "")            # Alias
     
     # Buyer persona
-    product["who_is_for"] = classification.get("who_is_for", "")
-    product["perfect_for"] = classification.get("who_is_for", "")
+    product["who_is_for"] = classification.get("who_is_for", "")                   # 80-100 palabras
+    product["perfect_for"] = classification.get("who_is_for", "")                  # Alias
     
     # FAQs (Featured Snippets)
-    product["faqs"] = classification.get("faqs", [])
+    product["faqs"] = classification.get("faqs", [])                               # 4-5 Q&A
     
     # Veredicto final
-    product["verdict"] = classification.get("verdict", "")
+    product["verdict"] = classification.get("verdict", "")                         # 50-80 palabras
     
     # URL slug
     product["seo_slug"] = classification.get("seo_slug", "")
     
-    # Rating de Amazon (asegurar que se envía)
-    if "rating_value" not in product or not product["rating_value"]:
-        product["rating_value"] = product.get("rating", 0)
-    if "review_count" not in product or not product["review_count"]:
-        product["review_count"] = product.get("reviews_count", 0)
+    # ==========================================
+    # TAXONOMÍAS SEGÚN giftia_schema.json
+    # ==========================================
+    product["ages"] = classification.get("ages", ["adultos"])           # ninos, adolescentes, jovenes, adultos, seniors, abuelos
+    product["recipients"] = classification.get("recipients", ["amigo"]) # pareja, padre, amigo, hermano, etc.
+    product["occasions"] = classification.get("occasions", ["cumpleanos", "navidad"])  # cumpleanos, navidad, etc.
+    product["marketing_hook"] = classification.get("marketing_hook", "wildcard")  # core, habitat, style, hedonism, wildcard
     
-    # Enviar a WordPress
-    logger.info(f"🧠 ENVIANDO [Q:{classification['gift_quality']}] [{classification['category']}] {title[:40]}...")
+    # Campos legacy para compatibilidad
+    product["gift_score"] = classification["gift_quality"] * 10
+    product["processed_at"] = datetime.now().isoformat()
     
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-            'X-GIFTIA-TOKEN': WP_TOKEN,
-            'User-Agent': 'GiftiaQueueProcessor/1.0'
-        }
-        
-        response = requests.post(
-            WP_API_URL,
-            data=json.dumps(product, ensure_ascii=False).encode('utf-8'),
-            headers=headers,
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            logger.info(f"✅ WordPress OK: {title[:40]}")
-            log_processed_product(product, {"status": "published", "quality": classification["gift_quality"]})
-            time.sleep(WP_PACING_SECONDS)  # Evitar rate limiting
-            return True
-        else:
-            logger.error(f"❌ Error API {response.status_code}: {response.text[:100]}")
-            log_processed_product(product, {"status": "error", "http_code": response.status_code})
-            time.sleep(WP_PACING_SECONDS)  # Esperar aunque falle
-            return False
-    except Exception as e:
-        logger.error(f"❌ Excepción: {e}")
-        log_processed_product(product, {"status": "error", "exception": str(e)})
-        return False
+    return "ready"
+
+def finish_publication(product, classification, result):
+    """Registra el resultado de WordPress de un producto. Retorna "published", "error" o "unsent"."""
+    category = classification.get("category", "Tech")
+    ages_str = ','.join(classification.get("ages", [])[:2])
+    recipients_str = ','.join(classification.get("recipients", [])[:2])
+    display_title = product["title"][:30]
+    
+    if result["ok"]:
+        # Añadir al inventario para futura deduplicación
+        add_to_inventory(product, classification)
+        logger.info(f"   ✅ [Q:{classification['gift_quality']}] [{category}] 👥{recipients_str} 🎂{ages_str}: {display_title}...")
+        log_processed_product(product, {"status": "published", "quality": classification["gift_quality"]})
+        return "published"
+    if result.get("retryable"):
+        # Sin respuesta definitiva: sigue en el outbox, no va al log de procesados
+        logger.warning(f"   📮 WP sin respuesta ({result['http_code']}): {display_title}... queda en el outbox")
+        return "unsent"
+    logger.error(f"   ❌ Error WP {result['http_code']}: {display_title}... {result.get('error', '')[:80]}")
+    log_processed_product(product, {"status": "error", "http_code": result["http_code"], "attempts": result["attempts"]})
+    return "error"
+
+# ============================================================================
+# ETAPA DE PUBLICACIÓN (hilos aparte: Gemini no espera a WordPress)
+# ============================================================================
+
+def start_publishers(channel, totals):
+    """Arranca PUBLISH_CONCURRENCY hilos que publican los bloques del canal.
+
+    Cada bloque es (ids del outbox, [(producto preparado, clasificación)]).
+    Un None en el canal para un hilo. Los resultados se suman en totals.
+    """
+    lock = threading.Lock()
+
+    def publisher():
+        while True:
+            block = channel.get()
+            if block is None:
+                return
+            ids, classified = block
+            try:  # El ritmo frente a WordPress lo marca wp_limiter (dentro de wp_ingest)
+                statuses = publish_prepared(classified, ids)
+            except Exception as e:
+                # Sigue en el outbox: se vuelve a publicar en una pasada posterior
+                logger.error(f"❌ Error publicando bloque de {len(classified)}: {e}")
+                publish_outbox.fail(ids, e)
+                continue
+            with lock:
+                totals["processed"] += len(statuses)
+                totals["published"] += statuses.count("published")
+
+    threads = [threading.Thread(target=publisher, name=f"publisher-{n+1}", daemon=True)
+               for n in range(PUBLISH_CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    return threads
 
 def run_processor():
+    retry_queue.promote_due()
+    # Clasificados que no llegaron a WordPress (proceso anterior muerto)
+    replay = publish_outbox.claim_stale()
     queue_size = get_pending_count()
-    if queue_size == 0:
+    if queue_size == 0 and not replay:
         print("📭 Cola vacía, nada que procesar")
         return 0
     
-    batches_needed = (queue_size + BATCH_SIZE - 1) // BATCH_SIZE
+    batch_size = adaptive_batch.size()
+    batches_needed = (queue_size + batch_size - 1) // batch_size
     
     print(f"")
     print(f"═══════════════════════════════════════════")
     print(f"🚀 PROCESADOR TURBO - BATCH MODE")
     print(f"═══════════════════════════════════════════")
     print(f"📦 Productos en cola: {queue_size}")
-    print(f"📦 Batch size: {BATCH_SIZE} productos por petición")
-    print(f"📊 Peticiones Gemini: ~{batches_needed}")
-    print(f"⏱️ Pacing: {GEMINI_PACING_SECONDS}s entre batches")
-    print(f"⏰ Tiempo estimado: {batches_needed * GEMINI_PACING_SECONDS / 60:.1f} minutos")
-    print(f"🔑 API Key de PAGO activa")
+    for shard, stats in sorted(queue_store.shard_stats().items()):
+        age = f"{stats['oldest_age'] / 3600:.1f}h" if stats['oldest_age'] is not None else "?"
+        print(f"   └ {shard}: {stats['depth']} (más antiguo {age}, peso {stats['weight']:g})")
+    print(f"📦 Batch size: {batch_size} productos por petición (adaptativo, máx {adaptive_batch.BATCH_MAX})")
+    print(f"📊 Peticiones Gemini: ~{batches_needed} ({GEMINI_CONCURRENCY} en vuelo)")
+    print(f"⏱️ Límite por key: {gemini_client.GEMINI_RPM:.0f} RPM / {gemini_client.GEMINI_TPM:.0f} TPM")
+    print(f"🔑 API Keys: {len(gemini_client.GEMINI_API_KEYS)} (cada petición a la key con más margen)")
+    print(f"📮 Publicación: {PUBLISH_CONCURRENCY} hilos, canal de {PUBLISH_CHANNEL_SIZE} bloques"
+          + (f", {len(replay)} pendientes del outbox" if replay else ""))
     print(f"")
     
-    total_processed = 0
-    total_published = 0
+    totals = {"processed": 0, "published": 0}
+    rejected = 0
+    channel = Queue(maxsize=PUBLISH_CHANNEL_SIZE)
+    publishers = start_publishers(channel, totals)
+    for start in range(0, len(replay), wp_ingest.INGEST_BULK_SIZE):
+        chunk = replay[start:start + wp_ingest.INGEST_BULK_SIZE]
+        channel.put(([entry_id for entry_id, _, _ in chunk], [(p, c) for _, p, c in chunk]))
+    
     batch_num = 0
     
     while True:
-        batch = get_batch_from_queue()
-        if not batch:
+        retry_queue.promote_due()
+        # Reservar varios batches de golpe: una petición Gemini por batch, todas en vuelo
+        claimed = get_batch_from_queue(adaptive_batch.size() * GEMINI_CONCURRENCY)
+        if not claimed:
             break
         
         batch_num += 1
         remaining = get_pending_count()
         logger.info(f"═══════════════════════════════════════════")
-        logger.info(f"📦 BATCH {batch_num}: {len(batch)} productos (quedan {remaining})")
+        logger.info(f"📦 BLOQUE {batch_num}: {len(claimed)} productos (quedan {remaining})")
         
-        # Clasificar batch completo con UNA petición
-        classifications = classify_batch_with_gemini(batch)
+        # Caché primero; el resto con UNA petición por batch, en paralelo
+        classified = list(zip(claimed, classify_products_with_gemini(claimed)))
         
-        # Procesar resultados
-        for i, (product, classification) in enumerate(zip(batch, classifications)):
-            title = product.get("title", "")[:40]
-            
-            if classification is None:
-                # Gemini no respondió - devolver a cola
-                add_back_to_queue(product)
-                logger.warning(f"   🔄 Sin respuesta AI: {title}...")
-                continue
-            
-            total_processed += 1
-            
-            # Rechazar duplicados detectados por Gemini
-            if classification.get("is_duplicate", False):
-                logger.info(f"   🔄 DUPLICADO (hay mejor alternativa): {title}...")
-                log_processed_product(product, {"status": "rejected", "reason": "duplicado inferior"})
-                continue
-            
-            if not classification["is_good_gift"]:
-                logger.info(f"   ❌ NO ES BUEN REGALO - {title}...")
-                log_processed_product(product, {"status": "rejected"})
-                continue
-            
-            if classification["gift_quality"] < 5:
-                logger.info(f"   ⚠️ BAJA CALIDAD ({classification['gift_quality']}/10): {title}...")
-                log_processed_product(product, {"status": "rejected", "reason": f"calidad {classification['gift_quality']}"})
-                continue
-            
-            # Producto aprobado - enriquecer con datos optimizados de Gemini
-            original_title = product.get("title", "")
-            
-            # Usar marketing_title de Gemini como título principal
-            marketing_title = classification.get("marketing_title", "")
-            product["title"] = marketing_title if marketing_title else original_title
-            product["original_title"] = original_title  # Guardar original por si acaso
-            
-            # Datos de clasificación según giftia_schema.json
-            product["category"] = classification["category"]     # Tech, Gamer, Gourmet, etc.
-            product["gemini_category"] = classification["category"]  # Compatibilidad legacy
-            product["target_gender"] = classification["gender"]  # unisex, male, female, kids
-            product["gift_quality"] = classification["gift_quality"]
-            product["giftia_score"] = classification.get("giftia_score", 4.0)  # Estrellas 1-5
-            product["classification_source"] = "gemini"
-            
-            # ==========================================
-            # FICHA DE PRODUCTO COMPLETA (Gold Master v51)
-            # ==========================================
-            
-            # Metadatos SEO (para Google SERP)
-            product["seo_title"] = classification.get("seo_title", "")                     # Meta title 50-60 chars
-            product["meta_description"] = classification.get("meta_description", "")       # Snippet 150-160 chars
-            
-            # Títulos y gancho
-            product["h1_title"] = classification.get("h1_title", product.get("title", "")) # H1 persuasivo
-            product["optimized_title"] = classification.get("h1_title", product.get("title", ""))
-            product["marketing_title"] = classification.get("h1_title", product.get("title", ""))
-            product["short_description"] = classification.get("short_description", "")     # Above the fold 80-120 palabras
-            product["gift_headline"] = classification.get("short_description", "")         # Alias
-            
-            # Opinión del experto (E-E-A-T)
-            product["expert_opinion"] = classification.get("expert_opinion", "")           # 100-150 palabras
-            product["why_selected"] = classification.get("expert_opinion", "")             # Alias
-            
-            # Pros y Contras
-            product["pros"] = classification.get("pros", [])                               # 5-6 bullets emocionales
-            product["cons"] = classification.get("cons", [])                               # 2-3 bullets honestos
-            product["gift_pros"] = classification.get("pros", [])                          # Alias
-            
-            # Descripción larga SEO (posiciona la URL)
-            product["full_description"] = classification.get("full_description", "")       # 600-800 palabras con H2s
-            product["seo_content"] = classification.get("full_description", "")            # Alias
-            
-            # Buyer persona
-            product["who_is_for"] = classification.get("who_is_for", "")                   # 80-100 palabras
-            product["perfect_for"] = classification.get("who_is_for", "")                  # Alias
-            
-            # FAQs (Featured Snippets)
-            product["faqs"] = classification.get("faqs", [])                               # 4-5 Q&A
-            
-            # Veredicto final
-            product["verdict"] = classification.get("verdict", "")                         # 50-80 palabras
-            
-            # URL slug
-            product["seo_slug"] = classification.get("seo_slug", "")
-            
-            # ==========================================
-            # TAXONOMÍAS SEGÚN giftia_schema.json
-            # ==========================================
-            product["ages"] = classification.get("ages", ["adultos"])           # ninos, adolescentes, jovenes, adultos, seniors, abuelos
-            product["recipients"] = classification.get("recipients", ["amigo"]) # pareja, padre, amigo, hermano, etc.
-            product["occasions"] = classification.get("occasions", ["cumpleanos", "navidad"])  # cumpleanos, navidad, etc.
-            product["marketing_hook"] = classification.get("marketing_hook", "wildcard")  # core, habitat, style, hedonism, wildcard
-            
-            # Campos legacy para compatibilidad
-            product["gift_score"] = classification["gift_quality"] * 10
-            product["processed_at"] = datetime.now().isoformat()
-            
-            # Log con las nuevas dimensiones
-            category = classification.get("category", "Tech")
-            ages_str = ','.join(classification.get("ages", [])[:2])
-            recipients_str = ','.join(classification.get("recipients", [])[:2])
-            display_title = product["title"][:30]
-            
-            # Enviar a WordPress
-            try:
-                headers = {
-                    'Content-Type': 'application/json',
-                    'X-GIFTIA-TOKEN': WP_TOKEN,
-                    'User-Agent': 'GiftiaQueueProcessor/2.0'
-                }
-                
-                response = requests.post(
-                    WP_API_URL,
-                    data=json.dumps(product, ensure_ascii=False).encode('utf-8'),
-                    headers=headers,
-                    timeout=15
-                )
-                
-                # Verificar éxito: status 200 O respuesta contiene "success":true
-                # (WordPress a veces devuelve 500 pero el producto sí se guarda)
-                is_success = response.status_code == 200 or '"success":true' in response.text
-                
-                if is_success:
-                    total_published += 1
-                    # Añadir al inventario para futura deduplicación
-                    add_to_inventory(product, classification)
-                    logger.info(f"   ✅ [Q:{classification['gift_quality']}] [{category}] 👥{recipients_str} 🎂{ages_str}: {display_title}...")
-                    log_processed_product(product, {"status": "published", "quality": classification["gift_quality"]})
-                else:
-                    logger.error(f"   ❌ Error WP {response.status_code}: {display_title}...")
-                    log_processed_product(product, {"status": "error", "http_code": response.status_code})
-            except Exception as e:
-                logger.error(f"   ❌ Excepción WP: {e}")
-                log_processed_product(product, {"status": "error", "exception": str(e)})
+        # Filtros y ficha aquí: sin clasificación van a la cola de reintentos
+        # y los rechazados al log; solo los listos pasan a WordPress
+        statuses = [prepare_publication(p, c) for p, c in classified]
+        ready = [pc for pc, status in zip(classified, statuses) if status == "ready"]
+        rejected += statuses.count("rejected")
         
-        # Pacing entre batches
-        if get_pending_count() > 0:
-            time.sleep(GEMINI_PACING_SECONDS)
+        # Primero al outbox (en disco) y después fuera de la cola: los que
+        # fallaron ya están en retry_queue. Si el worker muere antes del ack,
+        # el lease caduca y otro worker los recoge.
+        ids = publish_outbox.put(ready)
+        ack_batch(claimed)
+        if ready:
+            channel.put((ids, ready))  # Se bloquea si WordPress va por detrás (canal lleno)
+    
+    # Esperar a que la etapa de publicación vacíe el canal
+    for _ in publishers:
+        channel.put(None)
+    for thread in publishers:
+        thread.join()
+    outbox_left = publish_outbox.compact()
+    total_processed = totals["processed"] + rejected
+    total_published = totals["published"]
+    
+    # Volcar el journal al snapshot para que las herramientas de estado vean la cola real
+    queue_store.compact()
     
     print(f"")
     print(f"═══════════════════════════════════════════")
@@ -1242,23 +1306,154 @@ def run_processor():
     print(f"🔢 Procesados: {total_processed}")
     print(f"✅ Publicados: {total_published}")
     print(f"📭 Quedan en cola: {get_pending_count()}")
-    print(f"🔑 Llamadas Gemini: {gemini_call_count} (batches de {BATCH_SIZE})")
+    retries, dead = retry_queue.counts()
+    print(f"⏳ Reintentos programados: {retries} | ☠️ Dead-letter: {dead}")
+    if outbox_left:
+        print(f"📮 Outbox: {publish_outbox.count()} sin confirmar por WordPress, "
+              f"{len(publish_outbox.parked())} aparcados (python publish_outbox.py)")
+    gemini_calls = gemini_client.stats["calls"]
+    print(f"🔑 Llamadas Gemini: {gemini_calls} (batch actual {adaptive_batch.size()}, {gemini_client.stats['rate_limited']} 429s)")
+    for k in gemini_client.pool_status():
+        print(f"   └ Key {k['key']}: uso {k['utilization']:.0%}, {k['calls']} llamadas, {k['rate_limited']} 429s"
+              + (f", enfriando {k['cooldown_for']:.0f}s" if k["cooldown_for"] else ""))
+    print(f"📐 Clasificados por llamada Gemini: {total_processed / max(1, gemini_calls):.2f}")
+    print(f"🎯 Publicados por llamada Gemini: {total_published / max(1, gemini_calls):.2f}")
+    if token_stats["triaged"]:
+        print(f"🔍 Criba: {token_stats['triage_rejected']}/{token_stats['triaged']} rechazados sin ficha SEO "
+              f"({token_stats['triage']:,} tokens criba, {token_stats['seo']:,} tokens SEO)")
+    if wp_ingest.stats["requests"]:
+        print(f"📮 WordPress: {wp_ingest.stats['published']} publicados en {wp_ingest.stats['requests']} peticiones "
+              f"({wp_ingest.stats['retried']} reintentos, {wp_ingest.stats['rate_limited']} 429s)")
+        print(f"🚦 Ritmo WordPress: {wp_limiter.status()['rate']:.2f} pet/s "
+              f"({wp_limiter.stats['waited']:.0f}s esperando hueco)")
+    print(f"🧮 Tokens Gemini por producto publicado: {gemini_client.stats['tokens'] / max(1, total_published):,.0f}")
+    if gemini_client.stats["cached_tokens"]:
+        print(f"🧊 Tokens servidos desde el prefijo cacheado: {gemini_client.stats['cached_tokens']:,}")
+    print(classification_cache.report())
     return total_published
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Procesa la cola de Giftia Hunter.')
-    parser.add_argument('--daemon', action='store_true', help='Ejecuta en modo continuo esperando nuevos productos')
-    args = parser.parse_args()
+# ============================================================================
+# MODO BULK: Batch API de Gemini para colas enormes (ver bulk_jobs.py)
+# ============================================================================
+
+def bulk_request(products):
+    """GenerateContentRequest de un batch del curador (prompt completo, sin context caching)."""
+    generation_config = {"temperature": 0.4, "maxOutputTokens": 8192}
+    schema = gemini_schema.generation_options(gemini_schema.CURATOR_SCHEMA).get("response_schema")
+    if schema:
+        generation_config["responseMimeType"] = "application/json"
+        generation_config["responseSchema"] = schema
+    return {"contents": [{"parts": [{"text": build_batch_prompt(products)}]}],
+            "generationConfig": generation_config}
+
+def bulk_submit(limit=None, executor=None):
+    """Saca hasta limit productos de la cola y los envía como un trabajo batch.
+
+    Los que ya están en la caché de clasificaciones se publican al momento.
+    Retorna el job_id (None si no hubo nada que enviar).
+    """
+    retry_queue.promote_due()
+    claimed = get_batch_from_queue(limit or BULK_SUBMIT_LIMIT)
+    if not claimed:
+        print("📭 Cola vacía, nada que enviar")
+        return None
+
+    cached = [classification_cache.get(p.get("title", ""), p.get("price", ""), PROMPT_VERSION) for p in claimed]
+    pending = [p for p, c in zip(claimed, cached) if c is None]
+    job_id = None
+    try:
+        publish_many([(p, c) for p, c in zip(claimed, cached) if c is not None])
+        if pending:
+            batch_size = adaptive_batch.size()
+            batches = {f"b{n}": list(range(start, min(start + batch_size, len(pending))))
+                       for n, start in enumerate(range(0, len(pending), batch_size))}
+            job_id = bulk_jobs.create_job([(key, bulk_request([pending[i] for i in positions]))
+                                           for key, positions in batches.items()],
+                                          pending, meta={"batches": batches, "prompt_version": PROMPT_VERSION},
+                                          executor=executor)
+    except Exception:
+        # Sin trabajo en disco: los pendientes vuelven a la cola ya (sin esperar al lease).
+        # Los de caché ya están en el outbox.
+        logger.error(f"❌ No se pudo crear el trabajo batch: {len(pending)} productos devueltos a la cola")
+        ack_batch([p for p, c in zip(claimed, cached) if c is not None])
+        nack_batch(pending)
+        raise
+    # Los productos ya están en el trabajo (en disco): fuera de la cola
+    ack_batch(claimed)
+    print(f"📦 {len(claimed)} productos: {len(claimed) - len(pending)} de caché, {len(pending)} al trabajo batch")
+    if job_id is None:
+        return None
+
+    try:
+        bulk_jobs.advance(job_id)
+    except Exception as e:
+        # El trabajo queda "prepared": --bulk-resume lo vuelve a enviar
+        logger.error(f"❌ Error enviando trabajo {job_id}: {e}")
+    print(f"🆔 Trabajo {job_id}. Retomar con: python process_queue.py --bulk-resume {job_id}")
+    return job_id
+
+def bulk_resume(job_id, poll_seconds=None):
+    """Espera a que termine un trabajo batch e integra sus resultados. Retorna los publicados.
+
+    Cada batch integrado se apunta en merged_keys: si el proceso muere a
+    mitad, al retomarlo no se republica lo ya integrado. Los productos sin
+    clasificación (o todos, si el trabajo falló) van a la cola de reintentos.
+    """
+    job = bulk_jobs.load_job(job_id)
+    if job is None:
+        print(f"❌ Trabajo {job_id} no encontrado en {bulk_jobs.BULK_DIR}")
+        return 0
+    if job["state"] == "merged":
+        print(f"✅ Trabajo {job_id} ya integrado")
+        return 0
 
+    state = bulk_jobs.wait(job_id, poll_seconds)
+    items = bulk_jobs.job_items(job_id)
+    results = bulk_jobs.job_results(job_id) if state == "succeeded" else {}
+    merged = set(bulk_jobs.load_job(job_id).get("merged_keys", []))
+    prompt_version = job["meta"].get("prompt_version", PROMPT_VERSION)
+    counts = {"published": 0, "rejected": 0, "retry": 0, "error": 0, "unsent": 0}
+
+    for key, positions in job["meta"]["batches"].items():
+        if key in merged:
+            continue
+        products = [items[i] for i in positions]
+        classified = list(zip(products, parse_batch_response(results.get(key), products)))
+        for product, classification in classified:
+            if classification is not None:
+                classification_cache.put(product.get("title", ""), product.get("price", ""),
+                                         prompt_version, classification)
+        for status in publish_many(classified):
+            counts[status] += 1
+        merged.add(key)
+        bulk_jobs.update_job(job_id, merged_keys=sorted(merged))
+
+    bulk_jobs.update_job(job_id, state="merged", result=state, counts=counts)
+    print(f"📊 Trabajo {job_id} ({state}): {counts['published']} publicados, {counts['rejected']} rechazados, "
+          f"{counts['retry']} a reintentos, {counts['error']} errores WP, {counts['unsent']} en el outbox")
+    return counts["published"]
+
+def bulk_status():
+    jobs = bulk_jobs.list_jobs()
+    if not jobs:
+        print("📭 No hay trabajos batch")
+    for job in jobs:
+        print(f"📦 {job['job_id']}: {job['state']} ({job['executor']}) | {job['items']} productos, "
+              f"{job['requests']} peticiones, {len(job.get('merged_keys', []))} integradas")
+
+def run_worker(daemon=False):
+    """Bucle de un worker: una pasada o modo daemon."""
     try:
-        if args.daemon:
+        if daemon:
             print(f"🟢 MODO DAEMON ACTIVADO: Esperando nuevos productos...")
             while True:
                 processed = run_processor()
                 if processed == 0:
-                    # Si no hubo nada, esperar 60s
-                    print(f"😴 Zzz... Esperando 60s... (Cola vacía)")
-                    time.sleep(60)
+                    # Si no hubo nada, esperar 60s (o menos si vence antes un reintento o el outbox)
+                    due = [w for w in (retry_queue.next_due_in(), publish_outbox.next_due_in()) if w is not None]
+                    wait = max(5, min([60] + due))
+                    print(f"😴 Zzz... Esperando {wait:.0f}s... (Cola vacía)")
+                    time.sleep(wait)
                 else:
                     # Si hubo trabajo, seguir rápido
                     print(f"⚡ Trabajo terminado. Buscando más...")
@@ -1267,4 +1462,43 @@ if __name__ == "__main__":
             run_processor()
             
     except KeyboardInterrupt:
+        queue_store.compact()
         print(f"\n🛑 Interrumpido. Quedan {get_pending_count()} en cola.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Procesa la cola de Giftia Hunter.')
+    parser.add_argument('--daemon', action='store_true', help='Ejecuta en modo continuo esperando nuevos productos')
+    parser.add_argument('--workers', type=int, default=1, help='Workers en paralelo (requiere QUEUE_BACKEND=sqlite)')
+    parser.add_argument('--bulk-submit', action='store_true', help='Envía la cola como trabajo batch de Gemini (colas enormes)')
+    parser.add_argument('--bulk-limit', type=int, default=None, help=f'Máximo de productos por trabajo batch (por defecto {BULK_SUBMIT_LIMIT})')
+    parser.add_argument('--bulk-executor', default=None, help='Ejecutor del trabajo batch (gemini, local)')
+    parser.add_argument('--bulk-resume', metavar='JOB_ID', help='Espera un trabajo batch e integra sus resultados')
+    parser.add_argument('--bulk-status', action='store_true', help='Lista los trabajos batch')
+    args = parser.parse_args()
+
+    if args.bulk_status:
+        bulk_status()
+    elif args.bulk_submit:
+        bulk_submit(args.bulk_limit, args.bulk_executor)
+        queue_store.compact()
+    elif args.bulk_resume:
+        bulk_resume(args.bulk_resume)
+        queue_store.compact()
+    elif args.workers > 1:
+        if not queue_store.supports_leases():
+            print("❌ --workers > 1 requiere QUEUE_BACKEND=sqlite (el journal es de un solo consumidor)")
+            sys.exit(1)
+        import multiprocessing
+        print(f"🚀 Lanzando {args.workers} workers sobre {queue_store.QUEUE_BACKEND}...")
+        workers = [multiprocessing.Process(target=run_worker, args=(args.daemon,), name=f"worker-{n+1}")
+                   for n in range(args.workers)]
+        for w in workers:
+            w.start()
+        try:
+            for w in workers:
+                w.join()
+        except KeyboardInterrupt:
+            for w in workers:
+                w.join()
+    else:
+        run_worker(args.daemon)
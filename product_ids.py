@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Identificadores de producto para deduplicación.
+
+Cada fuente guarda sus IDs en un sitio distinto:
+- Amazon / hunter_awin: "asin"
+- awin_feed_importer: "ean", "merchant_product_id"
+- hunter_awin_smart: "identifiers": {"ean", "merchant_product_id"}
+
+product_keys() los normaliza a claves "tipo:valor" para usarlas en sets y
+en el índice de la cola.
+"""
+
+
+def product_keys(product):
+    """Claves de identidad de un producto: asin:..., ean:..., mpid:<merchant>:..."""
+    identifiers = product.get("identifiers") or {}
+    keys = []
+
+    asin = str(product.get("asin") or "").strip()
+    if asin:
+        keys.append(f"asin:{asin}")
+
+    ean = str(product.get("ean") or identifiers.get("ean") or "").strip()
+    if ean:
+        keys.append(f"ean:{ean}")
+
+    mpid = str(product.get("merchant_product_id") or identifiers.get("merchant_product_id") or "").strip()
+    if mpid:
+        merchant = str(product.get("merchant_id") or "").strip()
+        keys.append(f"mpid:{merchant}:{mpid}")
+
+    return keys
@@ -7,19 +7,17 @@ import json
 import os
 from datetime import datetime
 
+import state_store
+
 TRACKING_FILE = "productos_procesados_tracking.json"
 
 def load_tracking():
     """Carga el registro de productos ya procesados"""
-    if os.path.exists(TRACKING_FILE):
-        with open(TRACKING_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"productos": {}, "categorias_rechazadas": {}}
+    return state_store.read_json(TRACKING_FILE, {"productos": {}, "categorias_rechazadas": {}})
 
 def save_tracking(tracking):
-    """Guarda el registro"""
-    with open(TRACKING_FILE, "w", encoding="utf-8") as f:
-        json.dump(tracking, f, indent=2, ensure_ascii=False)
+    """Guarda el registro (atómico)"""
+    state_store.write_json(TRACKING_FILE, tracking)
 
 def mark_processed(ean, status, title="", category=""):
     """Marca un producto como procesado
@@ -30,22 +28,23 @@ def mark_processed(ean, status, title="", category=""):
         title: Título del producto
         category: Categoría del producto
     """
-    tracking = load_tracking()
-    
-    tracking["productos"][ean] = {
-        "status": status,
-        "title": title[:50],
-        "category": category,
-        "timestamp": datetime.now().isoformat()
-    }
+    def _mark(tracking):
+        tracking["productos"][ean] = {
+            "status": status,
+            "title": title[:50],
+            "category": category,
+            "timestamp": datetime.now().isoformat()
+        }
     
-    # Si fue rechazado, contar categoría
-    if status == "rejected" and category:
-        if category not in tracking["categorias_rechazadas"]:
-            tracking["categorias_rechazadas"][category] = 0
-        tracking["categorias_rechazadas"][category] += 1
+        # Si fue rechazado, contar categoría
+        if status == "rejected" and category:
+            if category not in tracking["categorias_rechazadas"]:
+                tracking["categorias_rechazadas"][category] = 0
+            tracking["categorias_rechazadas"][category] += 1
+        return tracking
     
-    save_tracking(tracking)
+    # Leer-modificar-escribir bajo lock (varios procesos marcan a la vez)
+    state_store.update(TRACKING_FILE, _mark, {"productos": {}, "categorias_rechazadas": {}})
 
 def is_already_processed(ean):
     """Verifica si un producto ya fue procesado"""
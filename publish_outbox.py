@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outbox de publicación: productos ya clasificados pendientes de WordPress.
+
+Write-ahead de todo lo que va a WordPress con una clasificación de Gemini
+(ya pagada): el procesador (etapa de publicación, modo bulk) y el hunter
+apuntan aquí el producto ya preparado ANTES de enviarlo, y solo lo marcan
+hecho cuando WordPress contesta. Si el proceso muere entre Gemini y el POST,
+el siguiente arranque de process_queue.py (o la siguiente pasada del
+daemon) lo vuelve a publicar sin pagar otra clasificación.
+
+- put(prepared): apunta [(producto, clasificación)] con fsync. Cada
+  entrada lleva el pid que la publica y un lease (OUTBOX_LEASE_SECONDS).
+- done(ids): WordPress ya respondió (publicado o rechazado para siempre,
+  p. ej. un 400): la entrada sale del outbox.
+- fail(ids): WordPress no contestó (timeouts, 429/5xx tras los reintentos
+  de wp_ingest): la entrada vuelve a estar disponible tras un backoff
+  (OUTBOX_RETRY_BACKOFF, se dobla). Tras OUTBOX_MAX_ATTEMPTS se aparca y
+  ya no se republica sola (unpark() / --unpark).
+- claim_stale(): entradas cuyo dueño murió, cuyo lease caducó o cuyo
+  backoff venció; se renuevan a nombre de este proceso para republicarlas.
+- compact(): reescribe el fichero solo con las pendientes y aparcadas.
+
+La publicación es al menos una vez: api-ingest.php es idempotente por ASIN.
+
+Fichero JSONL (records.py) append-only bajo el lock de state_store: líneas
+{"id", "product", "classification", "pid", "lease_until"} y marcas
+{"done": id} / {"lease": id, "pid", "lease_until"} /
+{"fail": id, "attempts", "retry_at", "parked", "error"} / {"unpark": id}.
+
+Uso:
+    python publish_outbox.py          # Estado del outbox
+    python publish_outbox.py --unpark # Volver a publicar las aparcadas
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+
+import records
+import state_store
+
+logger = logging.getLogger("PublishOutbox")
+
+# Configuración
+OUTBOX_FILE = "publish_outbox.json"  # JSONL
+OUTBOX_LEASE_SECONDS = int(os.getenv("PUBLISH_OUTBOX_LEASE_SECONDS", "600"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("PUBLISH_OUTBOX_MAX_ATTEMPTS", "8"))  # Envíos sin respuesta antes de aparcar
+OUTBOX_RETRY_BACKOFF = 60        # Segundos tras el primer fallo (se dobla)
+OUTBOX_RETRY_BACKOFF_MAX = 3600
+
+
+def _owner_alive(pid):
+    """True si el proceso pid sigue vivo (o no se puede saber)."""
+    if pid == os.getpid():
+        return True
+    if not pid or sys.platform == 'win32':  # En Windows os.kill mata el proceso: solo lease
+        return bool(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _read():
+    """{id: entrada} con las pendientes y aparcadas, en orden de llegada (llamar con el lock cogido)."""
+    entries = {}
+    for line in records.iter_records(OUTBOX_FILE):
+        if "done" in line:
+            entries.pop(line["done"], None)
+        elif "lease" in line:
+            if line["lease"] in entries:
+                entries[line["lease"]].update(pid=line.get("pid"), lease_until=line.get("lease_until", 0))
+        elif "fail" in line:
+            if line["fail"] in entries:
+                entries[line["fail"]].update(pid=None, lease_until=0, attempts=line.get("attempts", 1),
+                                             retry_at=line.get("retry_at", 0), parked=line.get("parked", False),
+                                             error=line.get("error", ""))
+        elif "unpark" in line:
+            if line["unpark"] in entries:
+                entries[line["unpark"]].update(attempts=0, retry_at=0, parked=False)
+        elif "id" in line:
+            entries[line["id"]] = line
+    return entries
+
+def _backoff(attempts):
+    return min(OUTBOX_RETRY_BACKOFF_MAX, OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def put(prepared):
+    """Apunta [(producto preparado, clasificación)] antes de publicarlos. Retorna sus ids."""
+    now = time.time()
+    entries = [{"id": uuid.uuid4().hex, "product": product, "classification": classification,
+                "pid": os.getpid(), "lease_until": now + OUTBOX_LEASE_SECONDS, "at": now}
+               for product, classification in prepared]
+    records.append_records(OUTBOX_FILE, entries, fsync=True)
+    return [entry["id"] for entry in entries]
+
+def done(ids):
+    """Quita del outbox las entradas que WordPress ya respondió."""
+    # Sin fsync: si se pierde la marca, el producto se republica (el ingest es idempotente por ASIN)
+    records.append_records(OUTBOX_FILE, [{"done": entry_id} for entry_id in ids])
+
+def fail(ids, error=""):
+    """WordPress no confirmó estas entradas: backoff y, tras OUTBOX_MAX_ATTEMPTS, aparcadas.
+
+    Retorna cuántas se aparcaron.
+    """
+    now = time.time()
+    with state_store.file_lock(OUTBOX_FILE):
+        entries = _read()
+        marks = []
+        for entry_id in ids:
+            if entry_id not in entries:
+                continue
+            attempts = entries[entry_id].get("attempts", 0) + 1
+            marks.append({"fail": entry_id, "attempts": attempts, "retry_at": now + _backoff(attempts),
+                          "parked": attempts >= OUTBOX_MAX_ATTEMPTS, "error": str(error)[:200]})
+        records.append_records(OUTBOX_FILE, marks, fsync=True)
+    parked = sum(1 for mark in marks if mark["parked"])
+    if parked:
+        logger.error(f"🅿️ {parked} productos aparcados en el outbox tras {OUTBOX_MAX_ATTEMPTS} envíos sin respuesta")
+    return parked
+
+def unpark(ids=None):
+    """Devuelve a la cola de publicación las aparcadas (todas o las de ids). Retorna cuántas."""
+    with state_store.file_lock(OUTBOX_FILE):
+        parked_ids = [entry["id"] for entry in _read().values()
+                      if entry.get("parked") and (ids is None or entry["id"] in ids)]
+        records.append_records(OUTBOX_FILE, [{"unpark": entry_id} for entry_id in parked_ids], fsync=True)
+    return len(parked_ids)
+
+def pending():
+    """Entradas pendientes de publicar (de cualquier proceso), sin las aparcadas."""
+    with state_store.file_lock(OUTBOX_FILE):
+        return [entry for entry in _read().values() if not entry.get("parked")]
+
+def parked():
+    """Entradas aparcadas tras OUTBOX_MAX_ATTEMPTS envíos sin respuesta."""
+    with state_store.file_lock(OUTBOX_FILE):
+        return [entry for entry in _read().values() if entry.get("parked")]
+
+def count():
+    return len(pending())
+
+def next_due_in(now=None):
+    """Segundos hasta que venza el backoff de alguna entrada fallida (None si no hay)."""
+    now = now or time.time()
+    due = [entry["retry_at"] - now for entry in pending() if entry.get("attempts")]
+    return max(0.0, min(due)) if due else None
+
+def claim_stale(now=None):
+    """Reclama las entradas huérfanas (dueño muerto, lease caducado o backoff vencido).
+
+    Retorna [(id, producto, clasificación)].
+    """
+    now = now or time.time()
+    with state_store.file_lock(OUTBOX_FILE):
+        stale = [entry for entry in _read().values()
+                 if not entry.get("parked") and entry.get("retry_at", 0) <= now
+                 and (entry.get("lease_until", 0) <= now or not _owner_alive(entry.get("pid")))]
+        records.append_records(OUTBOX_FILE, [{"lease": entry["id"], "pid": os.getpid(),
+                                              "lease_until": now + OUTBOX_LEASE_SECONDS} for entry in stale])
+    if stale:
+        logger.info(f"📮 {len(stale)} productos clasificados del outbox vuelven a publicarse")
+    return [(entry["id"], entry["product"], entry["classification"]) for entry in stale]
+
+def compact():
+    """Reescribe el outbox solo con las pendientes y aparcadas. Retorna cuántas quedan."""
+    with state_store.file_lock(OUTBOX_FILE):
+        if not os.path.exists(OUTBOX_FILE):
+            return 0
+        entries = list(_read().values())
+        records.write_records(OUTBOX_FILE, entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    if "--unpark" in sys.argv:
+        print(f"🔄 {unpark()} productos aparcados vuelven a publicarse en la próxima pasada de process_queue.py")
+    entries = pending()
+    print(f"📮 Outbox: {len(entries)} productos clasificados pendientes de publicar")
+    for entry in entries[:10]:
+        if entry.get("attempts"):
+            wait = max(0.0, entry["retry_at"] - time.time())
+            state = f"{entry['attempts']} envíos fallidos, reintento en {wait:.0f}s"
+        else:
+            state = f"pid {entry.get('pid')} {'vivo' if _owner_alive(entry.get('pid')) else 'muerto'}"
+        print(f"   └ {entry['product'].get('title', '')[:50]} ({state})")
+    stuck = parked()
+    if stuck:
+        print(f"🅿️ Aparcados: {len(stuck)} (python publish_outbox.py --unpark para reintentarlos)")
+        for entry in stuck[:10]:
+            print(f"   └ {entry['product'].get('title', '')[:50]}: {entry.get('error', '')[:60]}")
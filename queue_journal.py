@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend "journal" de la cola de productos pendientes (ver queue_store.py).
+
+Sustituye el patrón "cargar pending_products.json entero -> tocar un item ->
+reescribir todo" por:
+
+- pending_products.json    -> snapshot (JSONL, ver records.py; lee también el array antiguo)
+- pending_products.journal -> operaciones JSONL añadidas al final (add / pop)
+- pending_products.meta.json -> profundidad y antigüedad por shard, reescrito
+  bajo el lock tras cada operación: monitorizar no cuesta cargar la cola
+
+Encolar y desencolar solo escriben una línea en el journal: O(1).
+Cada COMPACT_MIN_OPS operaciones (o cuando el journal dobla el tamaño de la
+cola) se reescribe el snapshot de forma atómica y se vacía el journal.
+
+Varios procesos (hunters encolando + procesador) pueden compartir la cola:
+cada operación toma el lock de state_store y antes incorpora lo que hayan
+escrito los demás. Así no se pisan ids ni se pierden líneas al compactar.
+
+Recuperación tras crash: al arrancar se carga el snapshot y se reaplica el
+journal. Una línea final a medio escribir se ignora. Reaplicar el journal
+sobre un snapshot más nuevo es idempotente (cada item tiene su _queue_id).
+
+Orden de salida: primero el shard (fuente/merchant) por round-robin
+ponderado (queue_shards.py); dentro del shard por prioridad (heap, O(log n))
+según queue_priority, con un producto por antigüedad cada STARVATION_EVERY
+para evitar inanición.
+"""
+
+import os
+import json
+import time
+import heapq
+import logging
+import functools
+from itertools import islice
+from collections import OrderedDict
+from datetime import datetime
+
+import records
+import state_store
+from product_ids import product_keys
+import queue_shards
+from queue_priority import priority_score, serve_oldest
+from queue_shards import shard_of
+
+logger = logging.getLogger("QueueJournal")
+
+# Configuración
+QUEUE_SNAPSHOT_FILE = "pending_products.json"
+QUEUE_JOURNAL_FILE = "pending_products.journal"
+QUEUE_META_FILE = "pending_products.meta.json"  # Profundidad/antigüedad por shard (O(1))
+COMPACT_MIN_OPS = 5000  # Nunca compactar por debajo de estas operaciones
+JOURNAL_FSYNC = True    # fsync tras cada escritura (crash-safe)
+ADD_MANY_CHUNK = 500    # Productos por escritura en add_many()
+
+# Estado en memoria (se carga una vez y se sincroniza con el journal)
+_items = OrderedDict()   # _queue_id -> producto
+_keys = {}               # asin:/ean:/mpid: -> _queue_id (índice de pertenencia)
+_shards = {}             # shard -> OrderedDict(_queue_id -> None), en orden de llegada
+_heaps = {}              # shard -> [(-prioridad, _queue_id)]; entradas obsoletas se saltan al sacar
+_served = 0              # Productos servidos (para el turno anti-inanición)
+_next_id = 1
+_journal_ops = 0         # Operaciones en el journal desde la última compactación
+_journal_offset = 0      # Bytes del journal ya aplicados
+_journal_inode = None
+_snapshot_mtime = None
+_loaded = False
+
+
+# ============================================================================
+# CARGA Y SINCRONIZACIÓN
+# ============================================================================
+
+def _locked(fn):
+    """Ejecuta fn con el lock entre procesos de la cola (hunters + procesador)."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with state_store.file_lock(QUEUE_SNAPSHOT_FILE):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _file_inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _index(qid, item):
+    for key in product_keys(item):
+        _keys[key] = qid
+    if "_priority" not in item:
+        item["_priority"] = priority_score(item)
+    shard = shard_of(item)
+    _shards.setdefault(shard, OrderedDict())[qid] = None
+    heapq.heappush(_heaps.setdefault(shard, []), (-item["_priority"], qid))
+
+def _unindex(qid, item):
+    for key in product_keys(item):
+        if _keys.get(key) == qid:
+            del _keys[key]
+    shard = shard_of(item)
+    members = _shards.get(shard)
+    if members is not None:
+        members.pop(qid, None)
+        if not members:
+            del _shards[shard]
+            _heaps.pop(shard, None)
+
+def _clear_state():
+    _items.clear()
+    _keys.clear()
+    _shards.clear()
+    _heaps.clear()
+
+def _apply_op(op):
+    """Aplica una operación del journal al estado en memoria."""
+    global _next_id
+    kind = op.get("op")
+    qid = op.get("id")
+    if kind == "add" and qid is not None:
+        item = op.get("item", {})
+        item["_queue_id"] = qid
+        _items[qid] = item
+        _index(qid, item)
+        _next_id = max(_next_id, qid + 1)
+    elif kind == "pop" and qid is not None:
+        item = _items.pop(qid, None)
+        if item is not None:
+            _unindex(qid, item)
+    elif kind == "clear":
+        _clear_state()
+
+def _read_journal_from(offset):
+    """Lee operaciones completas del journal desde un offset. Retorna (ops, nuevo_offset)."""
+    ops = []
+    if not os.path.exists(QUEUE_JOURNAL_FILE):
+        return ops, 0
+    with open(QUEUE_JOURNAL_FILE, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    pos = 0
+    while True:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            break  # Línea final incompleta (crash a mitad de escritura): se ignora
+        line = data[pos:nl].strip()
+        pos = nl + 1
+        if not line:
+            continue
+        try:
+            ops.append(json.loads(line.decode('utf-8')))
+        except (ValueError, UnicodeDecodeError):
+            logger.warning(f"Línea corrupta en journal ignorada (offset {offset + pos})")
+    return ops, offset + pos
+
+def _load():
+    """Carga snapshot + journal desde disco (reconstrucción completa)."""
+    global _next_id, _journal_ops, _journal_offset, _journal_inode, _snapshot_mtime, _loaded
+    _clear_state()
+    _next_id = 1
+    without_id = []
+
+    if os.path.exists(QUEUE_SNAPSHOT_FILE):
+        try:
+            snapshot = records.iter_records(QUEUE_SNAPSHOT_FILE)
+            for item in snapshot:
+                qid = item.get("_queue_id")
+                if isinstance(qid, int) and qid not in _items:
+                    _items[qid] = item
+                    _next_id = max(_next_id, qid + 1)
+                else:
+                    without_id.append(item)
+        except Exception as e:
+            logger.warning(f"Error cargando cola: {e}")
+        # Snapshot antiguo (sin _queue_id): asignar ids y persistirlos
+        for item in without_id:
+            item["_queue_id"] = _next_id
+            _items[_next_id] = item
+            _next_id += 1
+    needs_ids = bool(without_id)
+    for qid, item in _items.items():
+        _index(qid, item)
+
+    _snapshot_mtime = _file_mtime(QUEUE_SNAPSHOT_FILE)
+    _journal_inode = _file_inode(QUEUE_JOURNAL_FILE)
+    ops, _journal_offset = _read_journal_from(0)
+    for op in ops:
+        _apply_op(op)
+    _journal_ops = len(ops)
+    _loaded = True
+
+    if needs_ids:
+        compact()
+    elif _read_meta() is None:
+        _write_meta()
+
+def _sync():
+    """Incorpora operaciones escritas por otros procesos desde la última lectura."""
+    global _journal_offset, _journal_ops
+    if not _loaded:
+        _load()
+        return
+    # Otro proceso compactó (snapshot nuevo o journal rotado) -> recarga completa
+    if (_file_mtime(QUEUE_SNAPSHOT_FILE) != _snapshot_mtime
+            or _file_inode(QUEUE_JOURNAL_FILE) != _journal_inode):
+        _load()
+        return
+    try:
+        size = os.path.getsize(QUEUE_JOURNAL_FILE)
+    except OSError:
+        size = 0
+    if size < _journal_offset:
+        _load()
+        return
+    if size > _journal_offset:
+        ops, _journal_offset = _read_journal_from(_journal_offset)
+        for op in ops:
+            _apply_op(op)
+        _journal_ops += len(ops)
+
+@_locked
+def reload():
+    """Fuerza la recarga completa desde disco."""
+    _load()
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+def _append_ops(ops):
+    """Añade operaciones al journal con una única escritura (y fsync)."""
+    global _journal_offset, _journal_ops, _journal_inode
+    if not ops:
+        return
+    data = "".join(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + "\n" for op in ops)
+    data = data.encode('utf-8')
+    with open(QUEUE_JOURNAL_FILE, 'ab') as f:
+        f.write(data)
+        f.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(f.fileno())
+    if _journal_inode is None:
+        _journal_inode = _file_inode(QUEUE_JOURNAL_FILE)
+    _journal_offset += len(data)
+    _journal_ops += len(ops)
+    _maybe_compact()
+    _write_meta()
+
+def _write_snapshot(items):
+    """Escribe el snapshot JSONL en un temporal y lo renombra (atómico)."""
+    records.write_records(QUEUE_SNAPSHOT_FILE, items)
+
+@_locked
+def compact():
+    """Vuelca el estado actual al snapshot y vacía el journal."""
+    global _journal_ops, _journal_offset, _journal_inode, _snapshot_mtime
+    if not _loaded:
+        _load()
+    try:
+        _write_snapshot(list(_items.values()))
+        # Si morimos aquí, el journal viejo se reaplica sobre el snapshot nuevo sin efectos
+        # (add/pop por id son idempotentes; replace_all deja su clear en el journal)
+        with open(QUEUE_JOURNAL_FILE, 'wb') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        _journal_ops = 0
+        _journal_offset = 0
+        _journal_inode = _file_inode(QUEUE_JOURNAL_FILE)
+        _snapshot_mtime = _file_mtime(QUEUE_SNAPSHOT_FILE)
+        _rebuild_heap()
+        _write_meta()
+        logger.debug(f"Cola compactada: {len(_items)} productos")
+    except Exception as e:
+        logger.error(f"Error compactando cola: {e}")
+
+def _rebuild_heap():
+    """Reconstruye los heaps de cada shard sin entradas obsoletas. O(n)."""
+    for shard, members in _shards.items():
+        heap = [(-_items[qid]["_priority"], qid) for qid in members]
+        heapq.heapify(heap)
+        _heaps[shard] = heap
+
+def _maybe_compact():
+    if _journal_ops >= COMPACT_MIN_OPS and _journal_ops >= 2 * len(_items):
+        compact()
+
+
+# ============================================================================
+# API PÚBLICA
+# ============================================================================
+
+@_locked
+def add(product):
+    """Encola un producto. O(1): una línea en el journal."""
+    _sync()
+    qid = _next_id
+    item = {k: v for k, v in product.items() if k != "_queue_id"}
+    item["_priority"] = priority_score(item)
+    item.setdefault("_enqueued_at", round(time.time(), 3))
+    op = {"op": "add", "id": qid, "item": item}
+    _apply_op(op)
+    _append_ops([op])
+    product["_queue_id"] = qid
+    return qid
+
+@_locked
+def pop():
+    """Desencola el producto más prioritario. None si la cola está vacía."""
+    batch = pop_batch(1)
+    return batch[0] if batch else None
+
+def _next_qid():
+    """Siguiente _queue_id a servir.
+
+    Primero el shard (round-robin ponderado, queue_shards); dentro del shard,
+    heap de prioridad o, por turno, el más antiguo.
+    """
+    global _served
+    shard = queue_shards.pick(_shards)
+    members = _shards[shard]
+    _served += 1
+    if serve_oldest(_served):
+        return next(iter(members))
+    heap = _heaps[shard]
+    while heap:
+        neg_priority, qid = heapq.heappop(heap)
+        item = _items.get(qid)
+        if item is not None and -neg_priority == item["_priority"] and qid in members:
+            return qid
+    return next(iter(members))
+
+@_locked
+def pop_batch(batch_size):
+    """Desencola hasta batch_size productos con una sola escritura."""
+    _sync()
+    batch = []
+    ops = []
+    while _items and len(batch) < batch_size:
+        qid = _next_qid()
+        item = _items.pop(qid)
+        _unindex(qid, item)
+        batch.append(item)
+        ops.append({"op": "pop", "id": qid})
+    _append_ops(ops)
+    return batch
+
+@_locked
+def reprioritize(score_fn=None):
+    """Recalcula la prioridad de toda la cola (p.ej. tras cambiar pesos)."""
+    score_fn = score_fn or priority_score
+    _sync()
+    for item in _items.values():
+        item["_priority"] = score_fn(item)
+    compact()  # Persiste las nuevas prioridades y reconstruye el heap
+    return len(_items)
+
+@_locked
+def add_unique(product):
+    """Encola solo si ninguno de sus IDs (ASIN/EAN/MPID) está ya en cola. None si duplicado."""
+    if contains(product):
+        return None
+    return add(product)
+
+@_locked
+def add_many(products, chunk_size=None):
+    """Encola en streaming un iterable de productos, saltando los que ya están en cola.
+
+    Lee el iterable por bloques de chunk_size: memoria proporcional al bloque,
+    no al feed. Una escritura del journal por bloque. Retorna (añadidos, duplicados).
+    """
+    global _next_id
+    chunk_size = chunk_size or ADD_MANY_CHUNK
+    products = iter(products)
+    added = skipped = 0
+    _sync()
+    while True:
+        chunk = list(islice(products, chunk_size))
+        if not chunk:
+            break
+        ops = []
+        for product in chunk:
+            # _keys se actualiza en _apply_op: también deduplica dentro del propio feed
+            if any(key in _keys for key in product_keys(product)):
+                skipped += 1
+                continue
+            item = {k: v for k, v in product.items() if k != "_queue_id"}
+            item["_priority"] = priority_score(item)
+            item.setdefault("_enqueued_at", round(time.time(), 3))
+            op = {"op": "add", "id": _next_id, "item": item}
+            _apply_op(op)
+            ops.append(op)
+        _append_ops(ops)
+        added += len(ops)
+    return added, skipped
+
+@_locked
+def contains(product):
+    """¿Está ya en cola? Búsqueda en el índice en memoria, sin leer la cola."""
+    _sync()
+    return any(key in _keys for key in product_keys(product))
+
+@_locked
+def claim_batch(batch_size, lease_seconds=None):
+    """Reserva un batch. El journal es de un solo proceso: reservar = desencolar."""
+    return pop_batch(batch_size)
+
+@_locked
+def ack(products):
+    """Confirma productos procesados. Ya salieron de la cola al reservarlos."""
+    return len(products)
+
+@_locked
+def nack(product):
+    """Devuelve un producto reservado al final de la cola."""
+    return add(product)
+
+@_locked
+def remove_where(predicate):
+    """Elimina de la cola los productos que cumplan predicate. Retorna cuántos."""
+    _sync()
+    ops = [{"op": "pop", "id": qid} for qid, item in _items.items() if predicate(item)]
+    for op in ops:
+        _apply_op(op)
+    _append_ops(ops)
+    return len(ops)
+
+@_locked
+def count():
+    """Productos en cola (sin leer el fichero completo)."""
+    _sync()
+    return len(_items)
+
+def _enqueued_time(item):
+    """Momento de entrada en cola (epoch). Items antiguos: queued_at/captured_at."""
+    if item.get("_enqueued_at"):
+        return item["_enqueued_at"]
+    for field in ("queued_at", "captured_at"):
+        try:
+            return datetime.fromisoformat(item[field]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+def _meta():
+    """Metadatos de la cola en memoria: profundidad y más antiguo por shard."""
+    shards = {}
+    for shard, members in _shards.items():
+        shards[shard] = {
+            "depth": len(members),
+            "oldest_enqueued_at": _enqueued_time(_items[next(iter(members))]),
+        }
+    return {
+        "depth": len(_items),
+        "shards": shards,
+        # Para validar el sidecar: debe coincidir con el estado de los ficheros
+        "journal_size": _journal_offset,
+        "snapshot_mtime": _snapshot_mtime,
+    }
+
+def _write_meta():
+    """Reescribe el sidecar. Se llama bajo el lock tras cada escritura de la cola."""
+    try:
+        state_store.write_json(QUEUE_META_FILE, _meta(), indent=None, fsync=False)
+    except OSError as e:
+        logger.warning(f"Error guardando metadatos de cola: {e}")
+
+def _read_meta():
+    """Sidecar si refleja el estado actual de snapshot + journal; None si no."""
+    meta = state_store.read_json(QUEUE_META_FILE)
+    if not meta:
+        return None
+    try:
+        journal_size = os.path.getsize(QUEUE_JOURNAL_FILE)
+    except OSError:
+        journal_size = 0
+    if meta.get("journal_size") != journal_size or meta.get("snapshot_mtime") != _file_mtime(QUEUE_SNAPSHOT_FILE):
+        return None  # Alguien escribió sin actualizar el sidecar (crash): no fiarse
+    return meta
+
+def _current_meta():
+    """Metadatos sin cargar la cola: O(1) leyendo el sidecar.
+
+    Si el sidecar no es válido (crash entre journal y sidecar) se recarga
+    la cola y se regenera.
+    """
+    data = _read_meta()
+    if data is None:
+        with state_store.file_lock(QUEUE_SNAPSHOT_FILE):
+            _sync()
+            _write_meta()
+            data = _meta()
+    return data
+
+def shard_stats():
+    """Profundidad, antigüedad del más viejo y peso por shard (desde el sidecar)."""
+    now = time.time()
+    stats = {}
+    for shard, info in _current_meta()["shards"].items():
+        oldest = info.get("oldest_enqueued_at")
+        stats[shard] = {
+            "depth": info["depth"],
+            "oldest_age": round(now - oldest, 1) if oldest else None,
+            "weight": queue_shards.weight(shard),
+        }
+    return stats
+
+def _scan_journal():
+    """Lectura ligera del journal para herramientas de estado.
+
+    Solo se parsean las líneas pop; las add se guardan en bruto. Retorna
+    (ids_sacados, lineas_add, hubo_clear) desde el último clear.
+    """
+    popped = set()
+    adds = []
+    cleared = False
+    if not os.path.exists(QUEUE_JOURNAL_FILE):
+        return popped, adds, cleared
+    with open(QUEUE_JOURNAL_FILE, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            if line.startswith(b'{"op":"pop"'):
+                try:
+                    popped.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    pass
+            elif line.startswith(b'{"op":"add"'):
+                adds.append(line)
+            elif line.startswith(b'{"op":"clear"'):
+                popped.clear()
+                adds.clear()
+                cleared = True
+    return popped, adds, cleared
+
+@_locked
+def quick_count():
+    """Productos en cola sin parsear el snapshot (para herramientas de estado).
+
+    Lee el sidecar de metadatos. Si no es válido cuenta líneas del snapshot
+    + add - pop del journal: exacto en operación normal; tras un crash a
+    mitad de compactación puede desviarse hasta la siguiente compactación.
+    """
+    data = _read_meta()
+    if data is not None:
+        return data["depth"]
+    popped, adds, cleared = _scan_journal()
+    base = 0 if cleared else records.count_records(QUEUE_SNAPSHOT_FILE)
+    return max(0, base + len(adds) - len(popped))
+
+@_locked
+def peek(n=3, newest=False):
+    """Primeros (o últimos) n productos por orden de llegada, sin cargar la cola."""
+    popped, adds, cleared = _scan_journal()
+    journal_items = []
+    for line in adds:
+        try:
+            op = json.loads(line)
+        except ValueError:
+            continue
+        op["item"]["_queue_id"] = op["id"]
+        journal_items.append(op["item"])
+
+    if newest:
+        result = [item for item in reversed(journal_items) if item["_queue_id"] not in popped][:n]
+        if len(result) < n and not cleared:
+            tail = records.tail_records(QUEUE_SNAPSHOT_FILE, n + len(popped))
+            result += [item for item in reversed(tail) if item.get("_queue_id") not in popped][:n - len(result)]
+        return result
+
+    result = []
+    if not cleared:
+        for item in records.iter_records(QUEUE_SNAPSHOT_FILE):
+            if len(result) >= n:
+                return result
+            if item.get("_queue_id") not in popped:
+                result.append(item)
+    result += [item for item in journal_items if item["_queue_id"] not in popped]
+    return result[:n]
+
+@_locked
+def items():
+    """Copia de la cola en orden (lista de productos)."""
+    _sync()
+    return list(_items.values())
+
+@_locked
+def replace_all(products):
+    """Sustituye la cola completa (herramientas de limpieza). Compacta al momento.
+
+    El clear y los add van al journal antes de compactar: si el proceso muere
+    entre el snapshot nuevo y el truncado del journal, la recarga no resucita
+    lo borrado.
+    """
+    _sync()
+    ops = [{"op": "clear"}]
+    _apply_op(ops[0])
+    for product in products:
+        item = {k: v for k, v in product.items() if k != "_queue_id"}
+        op = {"op": "add", "id": _next_id, "item": item}
+        _apply_op(op)
+        ops.append(op)
+        product["_queue_id"] = op["id"]
+    _append_ops(ops)
+    compact()
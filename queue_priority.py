@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prioridad de la cola: qué productos merecen antes una llamada a Gemini.
+
+Pre-score barato (sin IA) combinando:
+- pre_score: calculate_gift_score() de hunter_amazon, guardado al encolar
+- rating / review_count (Amazon; Awin no tiene reviews)
+- banda de precio (rango ideal de regalo)
+- fuente (Amazon validado por reviews > feed Awin masivo)
+- reintentos (cada fallo baja un poco la prioridad)
+
+Mayor número = antes. Anti-inanición: cada STARVATION_EVERY productos
+servidos, uno sale por antigüedad en vez de por prioridad.
+"""
+
+import math
+
+STARVATION_EVERY = 5          # 1 de cada 5 productos sale por antigüedad
+NEUTRAL_PRE_SCORE = 50        # Productos sin calculate_gift_score (Awin)
+IDEAL_PRICE_RANGE = (20, 150)
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(",", ".").replace("€", "").strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def priority_score(product):
+    """Pre-score 0-~150 para ordenar la cola. No llama a Gemini."""
+    score = _to_float(product.get("pre_score", NEUTRAL_PRE_SCORE))
+
+    # Rating y volumen de reviews (solo fuentes con reviews reales)
+    rating = _to_float(product.get("rating_value") or product.get("rating") or 0)
+    reviews = _to_float(product.get("review_count") or product.get("reviews_count") or 0)
+    if rating > 0:
+        score += (rating - 4.0) * 20             # 4.5⭐ -> +10, 4.8⭐ -> +16
+        score += min(math.log10(reviews + 1), 4) * 5  # hasta +20 con 10k reviews
+
+    # Banda de precio
+    price = _to_float(product.get("price", 0))
+    if IDEAL_PRICE_RANGE[0] <= price <= IDEAL_PRICE_RANGE[1]:
+        score += 10
+    elif price and (price < 12 or price > 300):
+        score -= 10
+
+    # Fuente
+    source = str(product.get("source") or product.get("source_vibe") or "").lower()
+    if "awin" not in source and not product.get("merchant_id"):
+        score += 10  # Amazon
+
+    score -= 5 * int(product.get("retry_count", 0) or 0)
+    return round(score, 2)
+
+
+def serve_oldest(served_count):
+    """True si el producto número served_count debe salir por antigüedad."""
+    return STARVATION_EVERY > 0 and served_count % STARVATION_EVERY == 0
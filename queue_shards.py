@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shards de la cola por fuente y merchant + scheduler ponderado.
+
+Amazon (con rating y reviews, pocos productos) y Awin (sin reviews, feeds
+de miles) comparten cola. Sin shards una importación grande de Awin deja
+a Amazon esperando horas aunque tenga mejor prioridad media.
+
+- shard_of(producto): "amazon", "awin:<merchant_id>" o "awin"
+- pick(): round-robin ponderado suave (smooth weighted round-robin, como
+  nginx). Con amazon=3 y awin=1 salen 3 de Amazon por cada 1 de Awin
+  mientras haya de ambos; un shard vacío no consume turno.
+
+Pesos con QUEUE_SHARD_WEIGHTS="amazon=3,awin=1,awin:13075=2". Un shard
+"awin:<id>" sin peso propio usa el de "awin". Dentro de cada shard se
+mantiene el orden por prioridad + anti-inanición de queue_priority.
+"""
+
+import os
+
+DEFAULT_WEIGHT = 1.0
+
+
+def _parse_weights(spec):
+    weights = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, value = part.split("=", 1)
+        try:
+            weights[name.strip().lower()] = max(0.0, float(value))
+        except ValueError:
+            pass
+    return weights
+
+SHARD_WEIGHTS = _parse_weights(os.getenv("QUEUE_SHARD_WEIGHTS", "amazon=3,awin=1"))
+
+_current = {}  # shard -> peso acumulado (estado del round-robin suave)
+
+
+def shard_of(product):
+    """Shard de un producto según su fuente y merchant."""
+    merchant = str(product.get("merchant_id") or "").strip()
+    if merchant:
+        return f"awin:{merchant}"
+    source = str(product.get("source") or product.get("source_vibe") or "").lower()
+    if "awin" in source:
+        return "awin"
+    return "amazon"
+
+def weight(shard):
+    """Peso configurado del shard (exacto, o el de su fuente)."""
+    if shard in SHARD_WEIGHTS:
+        return SHARD_WEIGHTS[shard]
+    return SHARD_WEIGHTS.get(shard.split(":", 1)[0], DEFAULT_WEIGHT)
+
+def pick(shards):
+    """Elige el siguiente shard entre los que tienen productos. None si no hay."""
+    shards = [s for s in shards if weight(s) > 0] or list(shards)
+    if not shards:
+        return None
+    total = 0.0
+    best = None
+    for shard in sorted(shards):
+        w = weight(shard) or DEFAULT_WEIGHT
+        _current[shard] = _current.get(shard, 0.0) + w
+        total += w
+        if best is None or _current[shard] > _current[best]:
+            best = shard
+    _current[best] -= total
+    return best
+
+def plan(available, batch_size):
+    """Reparte batch_size huecos entre shards. available: {shard: disponibles}."""
+    left = {s: n for s, n in available.items() if n > 0}
+    slots = {}
+    for _ in range(batch_size):
+        shard = pick(left)
+        if shard is None:
+            break
+        slots[shard] = slots.get(shard, 0) + 1
+        left[shard] -= 1
+        if not left[shard]:
+            del left[shard]
+    return slots
+
+def reset():
+    """Reinicia el estado del round-robin (tests)."""
+    _current.clear()
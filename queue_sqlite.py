@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend "sqlite" de la cola de productos pendientes (ver queue_store.py).
+
+SQLite de la stdlib en modo WAL. Pensado para varios process_queue.py a la vez:
+
+- claim_batch(n): reserva atómica de n filas con un lease (visibility timeout)
+- ack(productos): borra las filas reservadas por este worker
+- nack(producto): libera la fila para que la coja otro worker
+
+Si un worker muere, sus filas vuelven a estar disponibles cuando caduca el
+lease (QUEUE_LEASE_SECONDS). No hace falta limpieza manual.
+
+Orden: los huecos de cada batch se reparten entre shards (fuente/merchant)
+por round-robin ponderado (queue_shards.py); dentro del shard priority DESC
+(índice), con un producto por antigüedad cada STARVATION_EVERY (ver
+queue_priority.py).
+
+Uso:
+    QUEUE_BACKEND=sqlite python process_queue.py --workers 4
+    python queue_sqlite.py --import-journal   # Migrar pending_products.json
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from itertools import islice
+
+from product_ids import product_keys
+import queue_shards
+from queue_priority import priority_score, serve_oldest
+from queue_shards import shard_of
+
+logger = logging.getLogger("QueueSqlite")
+
+# Configuración
+QUEUE_DB_FILE = os.getenv("QUEUE_DB_FILE", "pending_products.db")
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "900"))  # > 10 min de espera máxima de call_gemini
+BUSY_TIMEOUT_SECONDS = 30
+ADD_MANY_CHUNK = 500  # Productos por transacción en add_many()
+
+_conn = None
+_conn_path = None
+_conn_pid = None
+_lock = threading.Lock()
+_served = 0  # Productos servidos por este proceso (turno anti-inanición)
+
+# Profundidad por shard mantenida por triggers en la misma transacción
+STATS_DDL = (
+    """CREATE TABLE IF NOT EXISTS queue_stats (
+    shard TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL DEFAULT 0
+)""",
+    """CREATE TRIGGER IF NOT EXISTS queue_stats_insert AFTER INSERT ON queue BEGIN
+    INSERT INTO queue_stats (shard, depth) VALUES (NEW.shard, 1)
+    ON CONFLICT(shard) DO UPDATE SET depth = depth + 1;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS queue_stats_delete AFTER DELETE ON queue BEGIN
+    UPDATE queue_stats SET depth = depth - 1 WHERE shard = OLD.shard;
+END""",
+)
+
+# Sentencias sueltas (no executescript): van dentro del BEGIN IMMEDIATE de _setup
+SCHEMA_DDL = (
+    """CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 0,
+    shard TEXT NOT NULL DEFAULT ''
+)""",
+    "CREATE INDEX IF NOT EXISTS idx_queue_priority ON queue(priority DESC, id)",
+    "CREATE INDEX IF NOT EXISTS idx_queue_shard ON queue(shard, priority DESC, id)",
+    "CREATE INDEX IF NOT EXISTS idx_queue_shard_age ON queue(shard, id)",
+    # Índice de pertenencia: ASIN/EAN/MPID -> fila de la cola
+    """CREATE TABLE IF NOT EXISTS queue_keys (
+    key TEXT PRIMARY KEY,
+    queue_id INTEGER NOT NULL
+)""",
+    "CREATE INDEX IF NOT EXISTS idx_queue_keys_queue_id ON queue_keys(queue_id)",
+    """CREATE TRIGGER IF NOT EXISTS queue_keys_cleanup AFTER DELETE ON queue BEGIN
+    DELETE FROM queue_keys WHERE queue_id = OLD.id;
+END""",
+) + STATS_DDL
+
+# ============================================================================
+# CONEXIÓN
+# ============================================================================
+
+def worker_id():
+    """Identificador del worker dueño de los leases (host:pid, válido tras fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _connect():
+    """Conexión perezosa por proceso (se reabre si cambia QUEUE_DB_FILE o tras fork)."""
+    global _conn, _conn_path, _conn_pid
+    if _conn is not None and _conn_path == QUEUE_DB_FILE and _conn_pid == os.getpid():
+        return _conn
+    if _conn is not None and _conn_pid == os.getpid():
+        _conn.close()
+    _conn = sqlite3.connect(QUEUE_DB_FILE, timeout=BUSY_TIMEOUT_SECONDS,
+                            isolation_level=None, check_same_thread=False)
+    _enable_wal(_conn)
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _setup(_conn)
+    _conn_path = QUEUE_DB_FILE
+    _conn_pid = os.getpid()
+    return _conn
+
+def _enable_wal(conn):
+    """Pasa la base a WAL (una vez por fichero).
+
+    El cambio necesita la base en exclusiva y no siempre respeta el busy
+    timeout: si otro worker la tiene abierta, se reintenta.
+    """
+    deadline = time.monotonic() + BUSY_TIMEOUT_SECONDS
+    while True:
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                return
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            if ("locked" not in str(e) and "busy" not in str(e)) or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+def _pending_migrations(conn):
+    """Qué le falta a una base creada por una versión anterior (vacío si nada)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(queue)")}
+    if not columns:
+        return set()  # Base nueva: SCHEMA_DDL la crea entera
+    pending = {"priority", "shard"} - columns
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'queue_stats'").fetchone():
+        pending.add("queue_stats")
+    return pending
+
+def _setup(conn):
+    """Esquema, migraciones de bases antiguas y relleno de queue_keys.
+
+    Varios workers arrancan a la vez contra la misma base: todo va en un solo
+    BEGIN IMMEDIATE y el estado se mira dentro (otro proceso puede haberlo
+    hecho ya).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _migrate(conn, _pending_migrations(conn))
+        for statement in SCHEMA_DDL:
+            conn.execute(statement)
+        _backfill_keys(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _migrate(conn, pending):
+    """Columnas y tablas añadidas después de crear la base (antes de SCHEMA_DDL)."""
+    if "priority" in pending:
+        conn.execute("ALTER TABLE queue ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+    if "shard" in pending:
+        conn.execute("ALTER TABLE queue ADD COLUMN shard TEXT NOT NULL DEFAULT ''")
+        rows = conn.execute("SELECT id, payload FROM queue").fetchall()
+        conn.executemany("UPDATE queue SET shard = ? WHERE id = ?",
+                         [(shard_of(json.loads(payload)), row_id) for row_id, payload in rows])
+    if "queue_stats" in pending:
+        # Tabla, recuento inicial y triggers juntos: ningún INSERT se queda sin contar
+        for statement in STATS_DDL:
+            conn.execute(statement)
+        conn.execute("INSERT INTO queue_stats (shard, depth) SELECT shard, COUNT(*) FROM queue GROUP BY shard")
+
+def _backfill_keys(conn):
+    """Rellena queue_keys en bases creadas antes de existir el índice (dentro de _setup)."""
+    if conn.execute("SELECT 1 FROM queue_keys LIMIT 1").fetchone():
+        return
+    rows = conn.execute("SELECT id, payload FROM queue").fetchall()
+    conn.executemany("INSERT OR REPLACE INTO queue_keys (key, queue_id) VALUES (?, ?)",
+                     [(key, row_id) for row_id, payload in rows
+                      for key in product_keys(json.loads(payload))])
+
+def _transaction(fn):
+    """Ejecuta fn(conn) dentro de BEGIN IMMEDIATE (lock de escritura desde el inicio)."""
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _decode(row_id, payload):
+    item = json.loads(payload)
+    item["_queue_id"] = row_id
+    return item
+
+def _encode(product):
+    return json.dumps({k: v for k, v in product.items() if k != "_queue_id"},
+                      ensure_ascii=False, separators=(',', ':'))
+
+def _insert(conn, product, now):
+    """INSERT de un producto + sus claves en el índice (misma transacción)."""
+    cur = conn.execute("INSERT INTO queue (payload, enqueued_at, priority, shard) VALUES (?, ?, ?, ?)",
+                       (_encode(product), now, priority_score(product), shard_of(product)))
+    conn.executemany("INSERT OR REPLACE INTO queue_keys (key, queue_id) VALUES (?, ?)",
+                     [(key, cur.lastrowid) for key in product_keys(product)])
+    return cur.lastrowid
+
+def _contains(conn, keys):
+    return any(conn.execute("SELECT 1 FROM queue_keys WHERE key = ?", (key,)).fetchone()
+               for key in keys)
+
+def reload():
+    """Cierra la conexión; la siguiente operación reabre QUEUE_DB_FILE."""
+    global _conn, _conn_path, _conn_pid
+    with _lock:
+        if _conn is not None and _conn_pid == os.getpid():
+            _conn.close()
+        _conn = None
+        _conn_path = None
+        _conn_pid = None
+
+
+# ============================================================================
+# LEASES
+# ============================================================================
+
+def _select_shard(conn, shard, slots, now):
+    """Filas libres de un shard: por prioridad, más las que tocan por antigüedad."""
+    global _served
+    oldest_slots = 0
+    for _ in range(slots):
+        _served += 1
+        if serve_oldest(_served):
+            oldest_slots += 1
+    rows = conn.execute(
+        "SELECT id, payload FROM queue WHERE shard = ? AND (lease_until IS NULL OR lease_until < ?) "
+        "ORDER BY id LIMIT ?", (shard, now, oldest_slots)).fetchall() if oldest_slots else []
+    taken = [row_id for row_id, _ in rows]
+    rows += conn.execute(
+        "SELECT id, payload FROM queue WHERE shard = ? AND (lease_until IS NULL OR lease_until < ?) "
+        f"AND id NOT IN ({','.join('?' * len(taken))}) "
+        "ORDER BY priority DESC, id LIMIT ?", (shard, now, *taken, slots - len(rows))).fetchall()
+    return rows
+
+def _select_available(conn, batch_size, now):
+    """Filas libres a servir, repartidas entre shards por round-robin ponderado."""
+    available = dict(conn.execute(
+        "SELECT shard, COUNT(*) FROM queue WHERE lease_until IS NULL OR lease_until < ? "
+        "GROUP BY shard", (now,)).fetchall())
+    rows = []
+    for shard, slots in queue_shards.plan(available, batch_size).items():
+        rows += _select_shard(conn, shard, slots, now)
+    return rows
+
+def claim_batch(batch_size, lease_seconds=None):
+    """Reserva hasta batch_size productos para este worker (atómico)."""
+    lease_seconds = lease_seconds or QUEUE_LEASE_SECONDS
+
+    def _claim(conn):
+        now = time.time()
+        rows = _select_available(conn, batch_size, now)
+        if rows:
+            conn.executemany(
+                "UPDATE queue SET lease_owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker_id(), now + lease_seconds, row_id) for row_id, _ in rows])
+        return [_decode(row_id, payload) for row_id, payload in rows]
+
+    return _transaction(_claim)
+
+def ack(products):
+    """Confirma productos reservados por este worker: salen de la cola."""
+    ids = [p["_queue_id"] for p in products if p.get("_queue_id") is not None]
+    if not ids:
+        return 0
+
+    def _ack(conn):
+        cur = conn.executemany("DELETE FROM queue WHERE id = ? AND lease_owner = ?",
+                               [(row_id, worker_id()) for row_id in ids])
+        return cur.rowcount
+
+    return _transaction(_ack)
+
+def nack(product):
+    """Libera un producto reservado (guarda cambios como retry_count)."""
+    row_id = product.get("_queue_id")
+    if row_id is None:
+        return add(product)
+
+    def _nack(conn):
+        cur = conn.execute(
+            "UPDATE queue SET payload = ?, priority = ?, lease_owner = NULL, lease_until = NULL "
+            "WHERE id = ? AND lease_owner = ?",
+            (_encode(product), priority_score(product), row_id, worker_id()))
+        if cur.rowcount:
+            return row_id
+        if conn.execute("SELECT 1 FROM queue WHERE id = ?", (row_id,)).fetchone():
+            # El lease caducó y otro worker lo tiene: no duplicar
+            logger.warning(f"Lease perdido para {row_id}, nack ignorado")
+            return row_id
+        # Ya no está en cola (vino de pop): volver a encolar
+        return _insert(conn, product, time.time())
+
+    return _transaction(_nack)
+
+def extend_lease(products, lease_seconds=None):
+    """Renueva el lease de productos que siguen en proceso."""
+    lease_seconds = lease_seconds or QUEUE_LEASE_SECONDS
+    until = time.time() + lease_seconds
+    ids = [p["_queue_id"] for p in products if p.get("_queue_id") is not None]
+
+    def _extend(conn):
+        conn.executemany("UPDATE queue SET lease_until = ? WHERE id = ? AND lease_owner = ?",
+                         [(until, row_id, worker_id()) for row_id in ids])
+
+    _transaction(_extend)
+
+
+# ============================================================================
+# API COMÚN CON queue_journal
+# ============================================================================
+
+def add(product):
+    """Encola un producto."""
+    row_id = _transaction(lambda conn: _insert(conn, product, time.time()))
+    product["_queue_id"] = row_id
+    return row_id
+
+def add_unique(product):
+    """Encola solo si ninguno de sus IDs (ASIN/EAN/MPID) está ya en cola. None si duplicado."""
+    keys = product_keys(product)
+
+    def _add(conn):
+        if _contains(conn, keys):
+            return None
+        return _insert(conn, product, time.time())
+
+    row_id = _transaction(_add)
+    if row_id is not None:
+        product["_queue_id"] = row_id
+    return row_id
+
+def add_many(products, chunk_size=None):
+    """Encola en streaming un iterable de productos, saltando los que ya están en cola.
+
+    Una transacción por bloque de chunk_size. Retorna (añadidos, duplicados).
+    """
+    chunk_size = chunk_size or ADD_MANY_CHUNK
+    products = iter(products)
+    added = skipped = 0
+    while True:
+        chunk = list(islice(products, chunk_size))
+        if not chunk:
+            break
+
+        def _add(conn):
+            now = time.time()
+            inserted = 0
+            for product in chunk:
+                if _contains(conn, product_keys(product)):
+                    continue
+                _insert(conn, product, now)
+                inserted += 1
+            return inserted
+
+        inserted = _transaction(_add)
+        added += inserted
+        skipped += len(chunk) - inserted
+    return added, skipped
+
+def contains(product):
+    """¿Está ya en cola? Consulta por clave primaria en queue_keys."""
+    with _lock:
+        return _contains(_connect(), product_keys(product))
+
+def pop():
+    """Desencola el producto más prioritario disponible."""
+    batch = pop_batch(1)
+    return batch[0] if batch else None
+
+def pop_batch(batch_size):
+    """Desencola hasta batch_size productos (reserva + ack en una transacción)."""
+    def _pop(conn):
+        rows = _select_available(conn, batch_size, time.time())
+        conn.executemany("DELETE FROM queue WHERE id = ?", [(row_id,) for row_id, _ in rows])
+        return [_decode(row_id, payload) for row_id, payload in rows]
+
+    return _transaction(_pop)
+
+def reprioritize(score_fn=None):
+    """Recalcula la prioridad de toda la cola en una transacción."""
+    score_fn = score_fn or priority_score
+
+    def _reprioritize(conn):
+        rows = conn.execute("SELECT id, payload FROM queue").fetchall()
+        conn.executemany("UPDATE queue SET priority = ? WHERE id = ?",
+                         [(score_fn(json.loads(payload)), row_id) for row_id, payload in rows])
+        return len(rows)
+
+    return _transaction(_reprioritize)
+
+def remove_where(predicate):
+    """Elimina de la cola los productos que cumplan predicate. Retorna cuántos."""
+    def _remove(conn):
+        rows = conn.execute("SELECT id, payload FROM queue").fetchall()
+        ids = [(row_id,) for row_id, payload in rows if predicate(json.loads(payload))]
+        conn.executemany("DELETE FROM queue WHERE id = ?", ids)
+        return len(ids)
+
+    return _transaction(_remove)
+
+def count():
+    """Productos en cola (incluye los reservados por workers). O(shards) vía queue_stats."""
+    with _lock:
+        return _connect().execute("SELECT COALESCE(SUM(depth), 0) FROM queue_stats").fetchone()[0]
+
+def shard_stats():
+    """Profundidad, antigüedad del más viejo y peso por shard."""
+    now = time.time()
+    with _lock:
+        # queue_stats + el primero de cada shard por índice: sin recorrer la cola
+        rows = _connect().execute(
+            "SELECT shard, depth, (SELECT enqueued_at FROM queue q WHERE q.shard = s.shard ORDER BY id LIMIT 1) "
+            "FROM queue_stats s WHERE depth > 0").fetchall()
+    return {shard: {"depth": depth, "oldest_age": round(now - oldest, 1) if oldest else None,
+                    "weight": queue_shards.weight(shard)}
+            for shard, depth, oldest in rows}
+
+def quick_count():
+    """Igual que count(): en SQLite ya es barato."""
+    return count()
+
+def peek(n=3, newest=False):
+    """Primeros (o últimos) n productos por orden de llegada, sin reservarlos."""
+    order = "DESC" if newest else "ASC"
+    with _lock:
+        rows = _connect().execute(f"SELECT id, payload FROM queue ORDER BY id {order} LIMIT ?",
+                                  (n,)).fetchall()
+    return [_decode(row_id, payload) for row_id, payload in rows]
+
+def items():
+    """Copia de la cola en orden."""
+    with _lock:
+        rows = _connect().execute("SELECT id, payload FROM queue ORDER BY id").fetchall()
+    return [_decode(row_id, payload) for row_id, payload in rows]
+
+def replace_all(products):
+    """Sustituye la cola completa."""
+    def _replace(conn):
+        conn.execute("DELETE FROM queue")
+        now = time.time()
+        for product in products:
+            _insert(conn, product, now)
+
+    _transaction(_replace)
+
+def compact():
+    """Checkpoint del WAL (el equivalente a compactar el journal)."""
+    with _lock:
+        _connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def import_from_journal():
+    """Mueve la cola del backend journal (pending_products.json) a SQLite."""
+    import queue_journal
+    products = queue_journal.items()
+    if not products:
+        return 0
+
+    def _import(conn):
+        now = time.time()
+        for product in products:
+            _insert(conn, product, now)
+
+    _transaction(_import)
+    queue_journal.replace_all([])
+    return len(products)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Cola SQLite de Giftia')
+    parser.add_argument('--import-journal', action='store_true',
+                        help='Importa pending_products.json (+journal) a la base SQLite')
+    args = parser.parse_args()
+
+    if args.import_journal:
+        moved = import_from_journal()
+        print(f"✅ Importados {moved} productos a {QUEUE_DB_FILE}")
+    print(f"📦 En cola: {count()}")
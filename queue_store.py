@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cola de productos pendientes - punto de entrada único.
+
+Delegamos en uno de dos backends con la misma API:
+
+- journal (por defecto): pending_products.json + journal append-only.
+  Un solo proceso consumidor. Ver queue_journal.py
+- sqlite: pending_products.db en modo WAL con leases, ack y nack.
+  Varios workers de process_queue.py a la vez. Ver queue_sqlite.py
+
+Se elige con la variable de entorno QUEUE_BACKEND=journal|sqlite.
+"""
+
+import os
+
+import queue_journal
+import queue_sqlite
+
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "journal").lower()
+QUEUE_SNAPSHOT_FILE = queue_journal.QUEUE_SNAPSHOT_FILE
+
+
+def backend():
+    """Módulo del backend activo."""
+    return queue_sqlite if QUEUE_BACKEND == "sqlite" else queue_journal
+
+def supports_leases():
+    """True si varios workers pueden compartir la cola sin pisarse."""
+    return QUEUE_BACKEND == "sqlite"
+
+
+def add(product):
+    return backend().add(product)
+
+def add_unique(product):
+    return backend().add_unique(product)
+
+def add_many(products, chunk_size=None):
+    return backend().add_many(products, chunk_size)
+
+def contains(product):
+    return backend().contains(product)
+
+def pop():
+    return backend().pop()
+
+def pop_batch(batch_size):
+    return backend().pop_batch(batch_size)
+
+def claim_batch(batch_size, lease_seconds=None):
+    return backend().claim_batch(batch_size, lease_seconds)
+
+def ack(products):
+    return backend().ack(products)
+
+def nack(product):
+    return backend().nack(product)
+
+def reprioritize(score_fn=None):
+    return backend().reprioritize(score_fn)
+
+def remove_where(predicate):
+    return backend().remove_where(predicate)
+
+def count():
+    return backend().count()
+
+def shard_stats():
+    return backend().shard_stats()
+
+def quick_count():
+    return backend().quick_count()
+
+def peek(n=3, newest=False):
+    return backend().peek(n, newest)
+
+def items():
+    return backend().items()
+
+def replace_all(products):
+    return backend().replace_all(products)
+
+def compact():
+    return backend().compact()
+
+def reload():
+    return backend().reload()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Cola de productos pendientes')
+    parser.add_argument('--reprioritize', action='store_true',
+                        help='Recalcula la prioridad de toda la cola (queue_priority.py)')
+    parser.add_argument('--shards', action='store_true',
+                        help='Profundidad y antigüedad por shard (fuente/merchant)')
+    args = parser.parse_args()
+
+    if args.reprioritize:
+        total = reprioritize()
+        print(f"✅ Prioridad recalculada para {total} productos")
+    print(f"📦 Backend: {QUEUE_BACKEND} | En cola: {quick_count()}")
+    if args.shards:
+        for shard, stats in sorted(shard_stats().items()):
+            age = f"{stats['oldest_age'] / 3600:.1f}h" if stats['oldest_age'] is not None else "?"
+            print(f"   {shard:<16} {stats['depth']:>6} productos | más antiguo: {age} | peso {stats['weight']:g}")
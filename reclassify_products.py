@@ -14,17 +14,19 @@ Uso:
 import os
 import sys
 import json
-import time
 import argparse
-import requests
-import google.generativeai as genai
 from datetime import datetime
 
+import classification_cache
+import gemini_client
+import gemini_schema
+import payload_hashes
+import wp_limiter
+
 # Configuración
 WP_API_URL = "https://giftia.es/wp-json/wp/v2/gf_gift"
 WP_INGEST_URL = "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php"
 WP_TOKEN = os.getenv("WP_TOKEN", "nu27OrX2t5VZQmrGXfoZk3pbcS97yiP5")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
 # Cargar keys de .env si existe
 ENV_PATH = os.path.join(os.path.dirname(__file__), '.env')
@@ -34,7 +36,8 @@ if os.path.exists(ENV_PATH):
             if '=' in line and not line.startswith('#'):
                 key, value = line.strip().split('=', 1)
                 os.environ[key] = value.strip('"').strip("'")
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", GEMINI_API_KEY)
+
+PROMPT_VERSION = "reclassify-v1"  # Subir al cambiar el prompt (invalida la caché)
 
 # Categorías válidas
 VALID_CATEGORIES = [
@@ -82,7 +85,7 @@ def get_all_products():
     page = 1
     
     while True:
-        resp = requests.get(f'{WP_API_URL}?per_page=100&page={page}', headers=headers, timeout=30)
+        resp = wp_limiter.request("GET", f'{WP_API_URL}?per_page=100&page={page}', headers=headers, timeout=30)
         if resp.status_code != 200:
             break
         products = resp.json()
@@ -99,20 +102,18 @@ def get_all_products():
 
 def get_categories_map():
     """Obtiene mapeo ID → nombre de categorías."""
-    resp = requests.get('https://giftia.es/wp-json/wp/v2/gf_category?per_page=100', timeout=30)
+    resp = wp_limiter.request("GET", 'https://giftia.es/wp-json/wp/v2/gf_category?per_page=100', timeout=30)
     if resp.status_code != 200:
         return {}
     return {c['id']: c['name'] for c in resp.json()}
 
 def classify_with_gemini(products_batch):
     """Clasifica batch de productos con Gemini."""
-    if not GEMINI_API_KEY:
-        print("❌ GEMINI_API_KEY no configurada")
-        return {}
-    
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    
+    return parse_classification(gemini_client.generate(
+        build_prompt(products_batch), **gemini_schema.generation_options(gemini_schema.RECLASSIFY_SCHEMA)))
+
+def build_prompt(products_batch):
+    """Prompt de reclasificación para un batch."""
     products_text = ""
     for i, p in enumerate(products_batch):
         products_text += f"\n{i+1}. {p['title']}"
@@ -144,21 +145,14 @@ REGLAS CRÍTICAS:
 
 Responde SOLO con JSON array:
 [{{"id": 1, "category": "Categoría"}}, ...]"""
+    return prompt
 
-    try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        # Extraer JSON
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0]
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0]
-        
-        results = json.loads(text)
-        return {r['id']: validate_category(r['category']) for r in results}
-    except Exception as e:
-        print(f"❌ Error Gemini: {e}")
-        return {}
+def parse_classification(text):
+    """{id: categoría} a partir de la respuesta de Gemini ({} si falla)."""
+    results = gemini_schema.parse(text, gemini_schema.RECLASSIFY_SCHEMA)
+    if text and not results:
+        print(f"❌ Error Gemini: respuesta sin clasificaciones: {text[:100]}")
+    return {r['id']: validate_category(r['category']) for r in results if 'id' in r and 'category' in r}
 
 def update_product_category(post_id, new_category, dry_run=True):
     """Actualiza categoría de producto en WordPress."""
@@ -174,14 +168,19 @@ def update_product_category(post_id, new_category, dry_run=True):
         'post_id': post_id,
         'category': new_category
     }
+    if payload_hashes.unchanged("category", payload):
+        return True  # Ya enviado en una pasada anterior
     
     try:
         # Usar action como query param
         url = f"{WP_INGEST_URL}?action=update_category"
-        resp = requests.post(url, json=payload, headers=headers, timeout=30)
+        resp = wp_limiter.request("POST", url, json=payload, headers=headers, timeout=30)
         if resp.status_code == 200:
             data = resp.json()
-            return data.get('success', False)
+            if data.get('success', False):
+                payload_hashes.remember("category", payload)
+                return True
+            return False
         else:
             print(f"   ❌ Error HTTP {resp.status_code}: {resp.text[:100]}")
             return False
@@ -243,36 +242,52 @@ def main():
             'current_category': current_cat
         })
     
+    if not gemini_client.GEMINI_API_KEYS:
+        print("❌ GEMINI_API_KEY no configurada")
+        return
+    
     print(f"\n🎯 Procesando {len(to_classify)} productos en batches de {args.batch_size}...")
     
-    # Procesar en batches
-    changes = []
-    for i in range(0, len(to_classify), args.batch_size):
-        batch = to_classify[i:i+args.batch_size]
-        print(f"\n📦 Batch {i//args.batch_size + 1}/{(len(to_classify)-1)//args.batch_size + 1}...")
-        
-        # Clasificar con Gemini
-        results = classify_with_gemini(batch)
-        
+    # Los ya clasificados con este prompt salen de la caché sin llamar a Gemini
+    new_categories = {}
+    for product in to_classify:
+        cached = classification_cache.get(product['title'], None, PROMPT_VERSION)
+        if cached:
+            new_categories[product['id']] = cached['category']
+    pending = [p for p in to_classify if p['id'] not in new_categories]
+    print(f"💾 En caché: {len(new_categories)} | A Gemini: {len(pending)}")
+    
+    # Clasificar todos los batches con Gemini (varias peticiones en vuelo, token bucket compartido)
+    batches = [pending[i:i+args.batch_size] for i in range(0, len(pending), args.batch_size)]
+    responses = gemini_client.generate_many([build_prompt(batch) for batch in batches],
+                                            **gemini_schema.generation_options(gemini_schema.RECLASSIFY_SCHEMA))
+    
+    for n, (batch, response) in enumerate(zip(batches, responses)):
+        print(f"\n📦 Batch {n + 1}/{len(batches)}...")
+        results = parse_classification(response)
         for j, product in enumerate(batch):
-            idx = j + 1  # Gemini usa 1-indexed
-            new_cat = results.get(idx)
-            
-            if new_cat and new_cat != product['current_category']:
-                changes.append({
-                    'id': product['id'],
-                    'title': product['title'],
-                    'old': product['current_category'],
-                    'new': new_cat
-                })
-                print(f"   🔄 {product['title'][:50]}...")
-                print(f"      {product['current_category']} → {new_cat}")
-        
-        time.sleep(1)  # Rate limiting
+            new_cat = results.get(j + 1)  # Gemini usa 1-indexed
+            if new_cat:
+                new_categories[product['id']] = new_cat
+                classification_cache.put(product['title'], None, PROMPT_VERSION, {'category': new_cat})
+    
+    changes = []
+    for product in to_classify:
+        new_cat = new_categories.get(product['id'])
+        if new_cat and new_cat != product['current_category']:
+            changes.append({
+                'id': product['id'],
+                'title': product['title'],
+                'old': product['current_category'],
+                'new': new_cat
+            })
+            print(f"   🔄 {product['title'][:50]}...")
+            print(f"      {product['current_category']} → {new_cat}")
     
     # Resumen
     print("\n" + "=" * 70)
     print(f"📊 RESUMEN: {len(changes)} cambios detectados")
+    print(classification_cache.report())
     print("=" * 70)
     
     if not changes:
@@ -301,8 +316,8 @@ def main():
         for c in changes:
             if update_product_category(c['id'], c['new'], dry_run=False):
                 success += 1
-            time.sleep(0.5)  # Rate limiting
         print(f"✅ {success}/{len(changes)} productos actualizados")
+        print(payload_hashes.report())
     else:
         print(f"\n💡 Ejecuta con --apply para aplicar los {len(changes)} cambios")
     
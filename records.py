@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formato compacto en disco para la cola y los logs de procesados.
+
+JSON Lines: un producto por línea, sin indentación. Frente al array JSON con
+indent=2 ocupa ~la mitad y se puede leer, contar y añadir sin parsear el
+fichero entero.
+
+Los nombres de fichero no cambian (pending_products.json,
+processed_products.json): el formato se detecta por el primer byte. Un
+array JSON antiguo ('[') se sigue leyendo; se migra con:
+
+    python records.py convert pending_products.json processed_products.json
+    python records.py count processed_products.json
+    python records.py peek pending_products.json -n 5
+"""
+
+import os
+import json
+import logging
+from collections import deque
+
+import state_store
+
+logger = logging.getLogger("Records")
+
+READ_CHUNK = 1 << 20  # 1 MB por lectura al contar / leer desde el final
+
+
+def _first_byte(path):
+    """Primer byte no blanco del fichero (b'' si vacío o no existe)."""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(4096)
+                if not chunk:
+                    return b''
+                stripped = chunk.lstrip()
+                if stripped:
+                    return stripped[:1]
+    except OSError:
+        return b''
+
+def is_legacy(path):
+    """True si el fichero es un array JSON antiguo (indent=2)."""
+    return _first_byte(path) == b'['
+
+def dumps(record):
+    """Una línea JSONL (sin salto final)."""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+def iter_records(path):
+    """Recorre los registros uno a uno. Soporta JSONL y array JSON antiguo.
+
+    En JSONL, una línea final a medio escribir (crash) o corrupta se ignora.
+    """
+    if not os.path.exists(path):
+        return
+    if is_legacy(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Línea final incompleta
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                logger.warning(f"Línea corrupta ignorada en {path}")
+
+def read_records(path):
+    """Lista completa de registros (para ficheros pequeños)."""
+    return list(iter_records(path))
+
+def count_records(path):
+    """Número de registros. En JSONL cuenta saltos de línea, sin parsear.
+
+    write_records/append_records nunca escriben líneas vacías.
+    """
+    if not os.path.exists(path):
+        return 0
+    if is_legacy(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return len(json.load(f))
+    total = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            total += chunk.count(b"\n")
+    return total
+
+def peek_records(path, n=3):
+    """Primeros n registros, leyendo solo el principio del fichero."""
+    result = []
+    for record in iter_records(path):
+        if len(result) >= n:
+            break
+        result.append(record)
+    return result
+
+def tail_records(path, n=3):
+    """Últimos n registros, leyendo desde el final del fichero."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    if is_legacy(path):
+        return read_records(path)[-n:]
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        # Leer bloques hacia atrás hasta tener n líneas completas
+        while end > 0 and data.count(b"\n") <= n:
+            start = max(0, end - READ_CHUNK)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    lines = data.split(b"\n")
+    lines = lines[:-1]          # Lo que va tras el último \n está incompleto (o vacío)
+    if end > 0:
+        lines = lines[1:]       # La primera línea del bloque puede estar cortada
+    result = deque(maxlen=n)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            result.append(json.loads(line.decode('utf-8')))
+        except (ValueError, UnicodeDecodeError):
+            pass
+    return list(result)
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+def write_records(path, records, fsync=True):
+    """Escribe todos los registros en JSONL de forma atómica (temporal + rename)."""
+    tmp_file = path + ".tmp"
+    count = 0
+    with open(tmp_file, 'w', encoding='utf-8', newline='\n') as f:
+        for record in records:
+            f.write(dumps(record) + "\n")
+            count += 1
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+    return count
+
+def append_records(path, records, fsync=False):
+    """Añade registros al final con una sola escritura. Migra antes un array antiguo."""
+    data = "".join(dumps(record) + "\n" for record in records).encode('utf-8')
+    if not data:
+        return 0
+    with state_store.file_lock(path):
+        if is_legacy(path):
+            convert(path)
+        with open(path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+    return data.count(b"\n")
+
+def trim_records(path, keep):
+    """Deja solo los últimos keep registros (reescritura atómica bajo lock)."""
+    with state_store.file_lock(path):
+        return write_records(path, tail_records(path, keep))
+
+def convert(path):
+    """Convierte un array JSON antiguo a JSONL en el sitio. Retorna nº de registros."""
+    with state_store.file_lock(path):
+        if not is_legacy(path):
+            return count_records(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        return write_records(path, records)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Ficheros de registros JSONL (cola y logs)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_convert = sub.add_parser('convert', help='Convierte arrays JSON antiguos a JSONL')
+    p_convert.add_argument('files', nargs='+')
+    p_count = sub.add_parser('count', help='Cuenta registros sin parsear')
+    p_count.add_argument('files', nargs='+')
+    p_peek = sub.add_parser('peek', help='Muestra los primeros registros')
+    p_peek.add_argument('file')
+    p_peek.add_argument('-n', type=int, default=3)
+    p_peek.add_argument('--tail', action='store_true', help='Los últimos en vez de los primeros')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for path in args.files:
+            if not os.path.exists(path):
+                print(f"⚠️ {path}: no existe")
+                continue
+            before = os.path.getsize(path)
+            legacy = is_legacy(path)
+            total = convert(path)
+            after = os.path.getsize(path)
+            status = "convertido" if legacy else "ya era JSONL"
+            print(f"✅ {path}: {total} registros, {status} ({before/1024:.0f} KB -> {after/1024:.0f} KB)")
+    elif args.command == 'count':
+        for path in args.files:
+            print(f"📦 {path}: {count_records(path)}")
+    elif args.command == 'peek':
+        records = tail_records(args.file, args.n) if args.tail else peek_records(args.file, args.n)
+        for record in records:
+            print(dumps(record)[:300])
@@ -15,6 +15,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from dotenv import load_dotenv
 
+import wp_limiter
+
 load_dotenv()
 
 AMAZON_TAG = os.getenv('AMAZON_TAG', 'GIFTIA-21')
@@ -81,7 +83,7 @@ def update_product_with_asin(post_id, asin, title):
     affiliate_url = f"https://www.amazon.es/dp/{asin}?tag={AMAZON_TAG}"
     
     # Obtener datos actuales
-    response = requests.get(f"https://giftia.es/wp-json/wp/v2/gf_gift/{post_id}", timeout=30)
+    response = wp_limiter.request("GET", f"https://giftia.es/wp-json/wp/v2/gf_gift/{post_id}", timeout=30)
     if response.status_code != 200:
         print(f"    Error obteniendo datos: {response.status_code}")
         return False
@@ -93,7 +95,7 @@ def update_product_with_asin(post_id, asin, title):
     featured_id = details.get('featured_media', 0)
     image_url = ""
     if featured_id:
-        media_response = requests.get(f"https://giftia.es/wp-json/wp/v2/media/{featured_id}", timeout=30)
+        media_response = wp_limiter.request("GET", f"https://giftia.es/wp-json/wp/v2/media/{featured_id}", timeout=30)
         if media_response.status_code == 200:
             image_url = media_response.json().get('source_url', '')
     
@@ -123,8 +125,8 @@ def update_product_with_asin(post_id, asin, title):
     }
     
     try:
-        response = requests.post(
-            WP_API_URL,
+        response = wp_limiter.request(
+            "POST", WP_API_URL,
             data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
             headers=headers,
             timeout=30
@@ -180,7 +182,7 @@ try:
             print(f"    ❌ ASIN no encontrado en Amazon")
             failed += 1
         
-        time.sleep(2)  # Evitar rate limiting
+        time.sleep(2)  # Ritmo de búsquedas en Amazon (WordPress lo marca wp_limiter)
     
     print("\n" + "=" * 70)
     print(f"RESUMEN: {success} actualizados, {failed} fallidos")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reintentos diferidos y dead-letter para la cola de productos.
+
+Antes un fallo de Gemini devolvía el producto al final de la cola principal
+y el procesador lo volvía a pedir enseguida: durante una caída de Gemini
+giraba a toda velocidad sobre los mismos productos.
+
+Ahora:
+- schedule(producto): lo aparta a retry_products.json con un not_before
+  (backoff exponencial con jitter: RETRY_BASE_SECONDS * 2^(intento-1),
+  máximo RETRY_MAX_SECONDS).
+- promote_due(): mueve a la cola principal los que ya han cumplido su espera.
+  process_queue.py lo llama antes de cada batch.
+- Al superar MAX_RETRIES el producto va a dead_letter_products.json.
+- redrive(): devuelve en bloque los dead-letter a la cola principal.
+
+Ambos ficheros son JSONL (records.py) protegidos con el lock de state_store,
+así que sirven para cualquier backend de cola y para varios workers.
+
+Uso:
+    python retry_queue.py                      # Estado
+    python retry_queue.py --redrive            # Todos los dead-letter a la cola
+    python retry_queue.py --redrive --reason 429 --limit 100
+    python retry_queue.py --promote            # Forzar paso de vencidos
+"""
+
+import os
+import time
+import random
+import logging
+from datetime import datetime
+
+import queue_store
+import records
+import state_store
+
+logger = logging.getLogger("RetryQueue")
+
+# Configuración
+RETRY_FILE = "retry_products.json"             # JSONL
+DEAD_LETTER_FILE = "dead_letter_products.json" # JSONL
+MAX_RETRIES = int(os.getenv("QUEUE_MAX_RETRIES", "5"))
+RETRY_BASE_SECONDS = int(os.getenv("QUEUE_RETRY_BASE_SECONDS", "60"))
+RETRY_MAX_SECONDS = int(os.getenv("QUEUE_RETRY_MAX_SECONDS", "3600"))
+RETRY_JITTER = 0.2  # ±20% para que no vuelvan todos a la vez
+
+
+def backoff_seconds(retry_count):
+    """Espera antes del intento número retry_count (1, 2, 3...)."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, retry_count - 1))
+    return delay * random.uniform(1 - RETRY_JITTER, 1 + RETRY_JITTER)
+
+
+def schedule(product, reason=""):
+    """Aparta un producto fallido para reintentarlo más tarde.
+
+    Retorna True si queda programado, False si agotó los reintentos y pasó
+    a dead-letter.
+    """
+    product['retry_count'] = product.get('retry_count', 0) + 1
+    product['last_error'] = reason
+    if product['retry_count'] > MAX_RETRIES:
+        dead_letter(product, reason)
+        return False
+
+    product['not_before'] = time.time() + backoff_seconds(product['retry_count'])
+    records.append_records(RETRY_FILE, [_without_queue_id(product)], fsync=True)
+    return True
+
+
+def dead_letter(product, reason=""):
+    """Guarda un producto que agotó sus reintentos."""
+    item = _without_queue_id(product)
+    item.pop('not_before', None)
+    item['dead_at'] = datetime.now().isoformat()
+    item['last_error'] = reason
+    records.append_records(DEAD_LETTER_FILE, [item], fsync=True)
+    logger.warning(f"☠️ Dead-letter tras {product.get('retry_count', 0)} intentos: {product.get('title', '')[:40]}...")
+
+
+def promote_due(now=None):
+    """Mueve a la cola principal los reintentos vencidos. Retorna cuántos."""
+    now = now or time.time()
+    with state_store.file_lock(RETRY_FILE):
+        if not os.path.exists(RETRY_FILE):
+            return 0
+        due = []
+        waiting = []
+        for item in records.iter_records(RETRY_FILE):
+            (due if item.get('not_before', 0) <= now else waiting).append(item)
+        if not due:
+            return 0
+        # Primero encolar y después reescribir: si morimos en medio, add_many
+        # deduplica contra el índice de la cola en el siguiente intento
+        for item in due:
+            item.pop('not_before', None)
+        queue_store.add_many(due)
+        records.write_records(RETRY_FILE, waiting)
+    logger.info(f"⏰ {len(due)} reintentos vuelven a la cola ({len(waiting)} esperando)")
+    return len(due)
+
+
+def next_due_in(now=None):
+    """Segundos hasta el próximo reintento (None si no hay ninguno)."""
+    now = now or time.time()
+    times = [item.get('not_before', 0) for item in records.iter_records(RETRY_FILE)]
+    return max(0, min(times) - now) if times else None
+
+
+def redrive(predicate=None, limit=None):
+    """Devuelve dead-letters a la cola principal con los reintentos a cero. Retorna cuántos."""
+    with state_store.file_lock(DEAD_LETTER_FILE):
+        moved = []
+        kept = []
+        for item in records.iter_records(DEAD_LETTER_FILE):
+            if (limit is None or len(moved) < limit) and (predicate is None or predicate(item)):
+                for key in ('dead_at', 'last_error', 'not_before'):
+                    item.pop(key, None)
+                item['retry_count'] = 0
+                moved.append(item)
+            else:
+                kept.append(item)
+        if not moved:
+            return 0
+        queue_store.add_many(moved)
+        records.write_records(DEAD_LETTER_FILE, kept)
+    return len(moved)
+
+
+def counts():
+    """(reintentos programados, dead-letters) sin parsear los ficheros."""
+    return records.count_records(RETRY_FILE), records.count_records(DEAD_LETTER_FILE)
+
+
+def _without_queue_id(product):
+    """Copia sin los campos internos de la cola (al volver cuenta como recién llegado)."""
+    return {k: v for k, v in product.items() if k not in ("_queue_id", "_enqueued_at")}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Reintentos diferidos y dead-letter')
+    parser.add_argument('--promote', action='store_true', help='Pasa a la cola los reintentos vencidos')
+    parser.add_argument('--redrive', action='store_true', help='Devuelve los dead-letter a la cola principal')
+    parser.add_argument('--reason', help='Solo dead-letters cuyo último error contenga este texto')
+    parser.add_argument('--limit', type=int, default=None, help='Máximo de productos a devolver')
+    args = parser.parse_args()
+
+    if args.promote:
+        print(f"⏰ Promovidos: {promote_due()}")
+    if args.redrive:
+        predicate = (lambda item: args.reason in str(item.get('last_error', ''))) if args.reason else None
+        print(f"♻️ Devueltos a la cola: {redrive(predicate, args.limit)}")
+
+    retries, dead = counts()
+    wait = next_due_in()
+    print(f"🔄 Reintentos programados: {retries}" + (f" (próximo en {wait:.0f}s)" if wait is not None else ""))
+    print(f"☠️ Dead-letter: {dead}")
+    print(f"📦 En cola: {queue_store.quick_count()}")
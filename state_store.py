@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estado compartido en disco entre procesos (hunters + procesadores a la vez).
+
+Todos los JSON que tocan varios scripts pasan por aquí:
+
+- file_lock(path): lock advisory exclusivo sobre path + ".lock". Reentrante
+  dentro del mismo proceso. fcntl en Linux/Mac, msvcrt en Windows.
+- write_json(path, data): temporal + fsync + os.replace. Un lector nunca ve
+  un fichero a medio escribir.
+- update(path, fn, default): leer-modificar-escribir bajo lock.
+- load(path) -> (data, version) + save(path, data, version): escritura
+  optimista para procesos largos que no deben bloquear a los demás. save()
+  retorna False si otro proceso escribió entretanto (hay que releer y fusionar).
+
+La versión es (inode, mtime, tamaño): cada os.replace crea un inode nuevo.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("StateStore")
+
+# Configuración
+LOCK_TIMEOUT_SECONDS = float(os.getenv("STATE_LOCK_TIMEOUT", "60"))
+LOCK_POLL_SECONDS = 0.05
+
+_held = {}                       # (pid, lock_path) -> [fd, profundidad]
+_thread_locks = {}               # lock_path -> RLock (hilos del mismo proceso)
+_thread_locks_guard = threading.Lock()
+
+
+# ============================================================================
+# LOCKS
+# ============================================================================
+
+def _thread_lock(lock_path):
+    with _thread_locks_guard:
+        if lock_path not in _thread_locks:
+            _thread_locks[lock_path] = threading.RLock()
+        return _thread_locks[lock_path]
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def file_lock(path, timeout=None):
+    """Lock exclusivo entre procesos sobre path. TimeoutError si no se consigue."""
+    timeout = LOCK_TIMEOUT_SECONDS if timeout is None else timeout
+    lock_path = os.path.abspath(path) + ".lock"
+    key = (os.getpid(), lock_path)
+    with _thread_lock(lock_path):
+        held = _held.get(key)
+        if held is not None:
+            held[1] += 1
+            try:
+                yield
+            finally:
+                held[1] -= 1
+            return
+
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                raise TimeoutError(f"Lock ocupado más de {timeout}s: {lock_path}")
+            time.sleep(LOCK_POLL_SECONDS)
+        _held[key] = [fd, 1]
+        try:
+            yield
+        finally:
+            del _held[key]
+            _unlock(fd)
+
+
+# ============================================================================
+# LECTURA / ESCRITURA
+# ============================================================================
+
+def version(path):
+    """Versión actual del fichero (None si no existe)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def read_json(path, default=None):
+    """Lee un JSON. default si no existe o está corrupto."""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Error leyendo {path}: {e}")
+        return default
+
+def write_json(path, data, indent=2, fsync=True):
+    """Escribe un JSON de forma atómica (temporal + rename)."""
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def update(path, fn, default=None):
+    """Leer-modificar-escribir bajo lock. fn(data) retorna el nuevo contenido."""
+    with file_lock(path):
+        data = read_json(path, default)
+        data = fn(data)
+        write_json(path, data)
+        return data
+
+def load(path, default=None):
+    """Lee un JSON junto con su versión, para save() optimista."""
+    with file_lock(path):
+        return read_json(path, default), version(path)
+
+def save(path, data, expected_version):
+    """Escribe solo si nadie ha escrito desde load(). False si hubo conflicto."""
+    with file_lock(path):
+        if version(path) != expected_version:
+            return False
+        write_json(path, data)
+        return True
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fixtures compartidas de los tests offline.
+
+runtime_dir apunta todo el estado de ejecución (colas, reintentos, cachés,
+límites de ritmo, outbox, trabajos bulk) a un directorio temporal y deja el cwd
+en él (parse_batch_response y published_inventory.json escriben en el cwd).
+Todo se hace con monkeypatch, así que al acabar cada test se restauran el cwd
+y los globals de los módulos y el orden de los tests no importa.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import adaptive_batch
+import bulk_jobs
+import classification_cache
+import gemini_client
+import payload_hashes
+import process_queue
+import publish_outbox
+import queue_journal
+import queue_shards
+import queue_sqlite
+import queue_store
+import retry_queue
+import wp_ingest
+import wp_limiter
+
+# (módulo, global, fichero dentro de runtime_dir)
+RUNTIME_FILES = (
+    (queue_journal, "QUEUE_SNAPSHOT_FILE", "pending_products.json"),
+    (queue_journal, "QUEUE_JOURNAL_FILE", "pending_products.journal"),
+    (queue_journal, "QUEUE_META_FILE", "pending_products.meta.json"),
+    (queue_store, "QUEUE_SNAPSHOT_FILE", "pending_products.json"),
+    (process_queue, "PENDING_QUEUE_FILE", "pending_products.json"),
+    (queue_sqlite, "QUEUE_DB_FILE", "pending_products.db"),
+    (retry_queue, "RETRY_FILE", "retry_products.json"),
+    (retry_queue, "DEAD_LETTER_FILE", "dead_letter_products.json"),
+    (process_queue, "PROCESSED_LOG_FILE", "processed_products.json"),
+    (classification_cache, "CACHE_DB_FILE", "classification_cache.db"),
+    (gemini_client, "GEMINI_RATE_FILE", "gemini_rate_state.json"),
+    (gemini_client, "GEMINI_CONTEXT_FILE", "gemini_context_cache.json"),
+    (adaptive_batch, "BATCH_STATE_FILE", "batch_size_state.json"),
+    (bulk_jobs, "BULK_DIR", "bulk_jobs"),
+    (publish_outbox, "OUTBOX_FILE", "publish_outbox.json"),
+    (wp_limiter, "WP_RATE_FILE", "wp_rate_state.json"),
+    (payload_hashes, "HASH_DB_FILE", "payload_hashes.db"),
+)
+
+# Contadores en memoria que los tests comprueban
+STATS = (
+    (classification_cache, "stats"),
+    (gemini_client, "stats"),
+    (payload_hashes, "stats"),
+    (wp_ingest, "stats"),
+    (wp_limiter, "stats"),
+    (process_queue, "token_stats"),
+)
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    """Estado de ejecución vacío en tmp_path; se restaura todo al acabar."""
+    monkeypatch.chdir(tmp_path)
+    for module, name, filename in RUNTIME_FILES:
+        monkeypatch.setattr(module, name, str(tmp_path / filename))
+    for module, name in STATS:
+        monkeypatch.setattr(module, name, dict.fromkeys(getattr(module, name), 0))
+    monkeypatch.setattr(queue_store, "QUEUE_BACKEND", "journal")
+    monkeypatch.setattr(queue_journal, "_served", 0)
+    monkeypatch.setattr(queue_sqlite, "_served", 0)
+    monkeypatch.setattr(queue_shards, "_current", {})
+    monkeypatch.setattr(adaptive_batch, "_state", None)
+    monkeypatch.setattr(wp_ingest, "_bulk_supported", None)
+    monkeypatch.setattr(bulk_jobs, "EXECUTORS", dict(bulk_jobs.EXECUTORS))  # register_executor de los tests
+    queue_journal.reload()
+    queue_sqlite.reload()
+    yield tmp_path
+    queue_sqlite.reload()
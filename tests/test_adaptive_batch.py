@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test de adaptive_batch.py - tamaño de batch según tokens de salida y bisección
+Sin red: generate_many se sustituye por respuestas simuladas
+"""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import adaptive_batch
+import gemini_client
+import process_queue
+
+
+def _answer(products):
+    items = [{"i": n + 1, "ok": True, "title": p["title"], "category": "Tech", "gift_quality": 7}
+             for n, p in enumerate(products)]
+    return json.dumps(items)
+
+
+def test_crece_con_salida_sobrante_y_baja_con_cortes(runtime_dir):
+    assert adaptive_batch.size() == adaptive_batch.BATCH_INITIAL
+    for _ in range(30):
+        adaptive_batch.observe(3, 900, truncated=False)  # 300 tokens por producto
+    grown = adaptive_batch.size()
+    assert grown > adaptive_batch.BATCH_INITIAL
+
+    for _ in range(5):
+        adaptive_batch.observe(grown, 8192, truncated=True)
+    assert adaptive_batch.size() < grown
+
+    # Persistido: otro proceso arranca con lo aprendido
+    learned = adaptive_batch.size()
+    adaptive_batch._state = None
+    assert adaptive_batch.size() == learned
+
+
+def test_batch_fallido_se_parte_en_mitades(runtime_dir, monkeypatch):
+    products = [{"title": f"Regalo {n}", "price": "25"} for n in range(4)]
+    sizes = []
+
+    def fake_generate_many(prompts, **kwargs):
+        responses = []
+        for prompt in prompts:
+            batch = [p for p in products if f"{p['title']}\n" in prompt]
+            sizes.append(len(batch))
+            if len(batch) > 2:
+                # Respuesta cortada: JSON sin cerrar
+                responses.append({"text": '[{"i": 1, "ok": true', "finish_reason": "MAX_TOKENS",
+                                  "output_tokens": 8192})
+            elif batch == products[2:]:
+                responses.append({"text": "Lo siento, no puedo", "finish_reason": "STOP", "output_tokens": 10})
+            elif batch == products[3:]:
+                responses.append(None)  # Fallo de API: no se parte, va a reintentos
+            else:
+                responses.append({"text": _answer(batch), "finish_reason": "STOP", "output_tokens": 400})
+        return responses
+
+    monkeypatch.setattr(gemini_client, "generate_many", fake_generate_many)
+    [results] = process_queue.classify_batches_with_gemini([products])
+
+    assert sizes == [4, 2, 2, 1, 1]
+    assert [r is not None for r in results] == [True, True, True, False]
+    assert adaptive_batch._state["truncation_rate"] > 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
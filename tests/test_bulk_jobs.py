@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test de bulk_jobs.py y del modo bulk de process_queue.py
+Sin red: ejecutores simulados y la cola en un directorio temporal
+"""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bulk_jobs
+import classification_cache
+import gemini_client
+import process_queue
+import queue_journal
+import queue_sqlite
+import queue_store
+import records
+import retry_queue
+
+
+def _answer(prompt, skip=()):
+    """Respuesta del curador para los productos "Producto N" del prompt (menos los de skip)."""
+    lines = [l for l in prompt.split("\n") if l[:1].isdigit() and ". Producto " in l]
+    return json.dumps([{"i": n + 1, "ok": True, "q": 8, "category": "Tech"}
+                       for n, line in enumerate(lines) if line.split(". ", 1)[1] not in skip])
+
+
+def _fake_executor(calls, skip=()):
+    """Ejecutor que tarda un poll en terminar y responde sin red."""
+    def submit(job):
+        calls.append("submit")
+        return {"remote_batch": "batches/fake"}
+
+    def poll(job):
+        calls.append("poll")
+        return ("succeeded" if calls.count("poll") > 1 else "running"), {}
+
+    def fetch(job):
+        lines = records.read_records(bulk_jobs.job_path(job["job_id"], ".requests.jsonl"))
+        records.write_records(bulk_jobs.job_path(job["job_id"], ".results.jsonl"), (
+            {"key": l["key"], "response": {"candidates": [{"content": {"parts": [
+                {"text": _answer(l["request"]["contents"][0]["parts"][0]["text"], skip)}]}}]}}
+            for l in lines))
+    return submit, poll, fetch
+
+
+def _capture_publish():
+    published = []
+    def fake_publish(product, classification):
+        published.append(product["title"])
+        if classification is None:
+            process_queue.add_back_to_queue(product)
+            return "retry"
+        return "published"
+    return published, fake_publish
+
+
+def _publish_many(fake_publish):
+    return lambda classified: [fake_publish(p, c) for p, c in classified]
+
+
+def test_envio_espera_e_integra_en_la_ruta_de_publicacion(runtime_dir, monkeypatch):
+    calls = []
+    bulk_jobs.register_executor("fake", *_fake_executor(calls, skip={"Producto 4"}))
+    queue_journal.add_many([{"asin": f"B0000000{n:02d}", "title": f"Producto {n}", "price": "20"} for n in range(7)])
+    published, fake_publish = _capture_publish()
+    monkeypatch.setattr(process_queue, "publish_many", _publish_many(fake_publish))
+    job_id = process_queue.bulk_submit(executor="fake")
+    assert queue_journal.count() == 0  # Los productos viven en el trabajo, no en la cola
+    job = bulk_jobs.load_job(job_id)
+    assert job["state"] == "submitted" and job["items"] == 7 and job["requests"] == 3
+    assert process_queue.bulk_resume(job_id, poll_seconds=0.01) == 6
+
+    assert calls == ["submit", "poll", "poll"]
+    assert sorted(published) == sorted(f"Producto {n}" for n in range(7))
+    assert bulk_jobs.load_job(job_id)["state"] == "merged"
+    assert retry_queue.counts()[0] == 1  # Producto 4 no vino en la respuesta
+    assert classification_cache.get("Producto 0", "20", process_queue.PROMPT_VERSION)["category"] == "Tech"
+
+
+def test_retomar_tras_caida_no_republica_lo_integrado(runtime_dir, monkeypatch):
+    calls = []
+    bulk_jobs.register_executor("fake", *_fake_executor(calls))
+    queue_journal.add_many([{"asin": f"B0000000{n:02d}", "title": f"Producto {n}", "price": "20"} for n in range(6)])
+    published, fake_publish = _capture_publish()
+
+    def crashing_publish(product, classification):
+        if product["title"] == "Producto 4":
+            raise KeyboardInterrupt
+        return fake_publish(product, classification)
+
+    monkeypatch.setattr(process_queue, "publish_many", _publish_many(crashing_publish))
+    job_id = process_queue.bulk_submit(executor="fake")
+    with pytest.raises(KeyboardInterrupt):
+        process_queue.bulk_resume(job_id, poll_seconds=0.01)
+    assert bulk_jobs.load_job(job_id)["merged_keys"] == ["b0"]
+
+    monkeypatch.setattr(process_queue, "publish_many", _publish_many(fake_publish))
+    assert process_queue.bulk_resume(job_id, poll_seconds=0.01) == 3
+    assert process_queue.bulk_resume(job_id) == 0  # Ya integrado
+
+    # b0 (Producto 0-2) una vez; b1 se repite entero al retomar
+    assert published == ["Producto 0", "Producto 1", "Producto 2", "Producto 3",
+                         "Producto 3", "Producto 4", "Producto 5"]
+
+
+def test_trabajo_fallido_manda_todo_a_reintentos(runtime_dir, monkeypatch):
+    bulk_jobs.register_executor("roto", lambda job: {}, lambda job: ("failed", {"remote_state": "BATCH_STATE_EXPIRED"}),
+                                lambda job: None)
+    queue_journal.add_many([{"asin": f"B0000000{n:02d}", "title": f"Producto {n}", "price": "20"} for n in range(4)])
+    published, fake_publish = _capture_publish()
+    monkeypatch.setattr(process_queue, "publish_many", _publish_many(fake_publish))
+    job_id = process_queue.bulk_submit(executor="roto")
+    assert process_queue.bulk_resume(job_id, poll_seconds=0.01) == 0
+    assert len(published) == 4
+    assert retry_queue.counts()[0] == 4
+    assert bulk_jobs.load_job(job_id)["result"] == "failed"
+
+
+def test_fallo_al_crear_el_trabajo_devuelve_la_cola(runtime_dir, monkeypatch):
+    monkeypatch.setattr(queue_store, "QUEUE_BACKEND", "sqlite")  # Con leases: sin nack quedarían reservados hasta caducar
+
+    def broken_create_job(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(bulk_jobs, "create_job", broken_create_job)
+    queue_sqlite.add_many([{"asin": f"B0NACK00{n:02d}", "title": f"Producto {n}", "price": "20"} for n in range(4)])
+    with pytest.raises(OSError):
+        process_queue.bulk_submit(executor="fake")
+    assert len(queue_sqlite.claim_batch(10)) == 4  # Libres ya, sin esperar al lease
+
+
+def test_ejecutor_local_usa_gemini_client_con_el_schema(runtime_dir, monkeypatch):
+    seen = {}
+
+    def fake_generate_many(prompts, **kwargs):
+        seen.update(kwargs)
+        return [_answer(p) for p in prompts]
+
+    products = [{"title": f"Producto {n}", "price": "20"} for n in range(2)]
+    job_id = bulk_jobs.create_job([("b0", process_queue.bulk_request(products))], products, executor="local")
+    monkeypatch.setattr(gemini_client, "generate_many", fake_generate_many)
+    assert bulk_jobs.wait(job_id, poll_seconds=0.01) == "succeeded"
+    assert seen["max_output_tokens"] == 8192
+    assert json.loads(bulk_jobs.job_results(job_id)["b0"])[1]["i"] == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test de classification_cache.py - fingerprint, TTL, expulsión y aciertos
+Sin red: base de datos en un directorio temporal
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import classification_cache
+import process_queue
+
+
+@pytest.fixture
+def cache(runtime_dir, monkeypatch):
+    monkeypatch.setattr(classification_cache, "CACHE_TTL_DAYS", 30)
+    monkeypatch.setattr(classification_cache, "CACHE_MAX_ENTRIES", 50000)
+    monkeypatch.setattr(process_queue, "TRIAGE_ENABLED", False)  # La criba tiene su propio test (test_triage.py)
+
+
+def test_fingerprint_normaliza_titulo_y_precio():
+    fp = classification_cache.fingerprint
+    assert classification_cache.normalize_title("  Cafetera ITALIANA, acero (6 tazas)! ") == "cafetera italiana acero 6 tazas"
+    assert fp("Cámara Instantánea Fujifilm", "24,99 €", "v1") == fp("camara instantanea  FUJIFILM", 26, "v1")
+    assert fp("Cámara Instantánea Fujifilm", "24,99", "v1") != fp("Cámara Instantánea Fujifilm", "34,99", "v1")
+    assert fp("Cámara Instantánea Fujifilm", "24,99", "v1") != fp("Cámara Instantánea Fujifilm", "24,99", "v2")
+    assert classification_cache.price_band("sin precio") == "?"
+    assert classification_cache.price_band(2500) == "1000+"
+
+
+def test_acierto_fallo_y_caducidad(cache):
+    result = {"is_good_gift": True, "category": "Tech", "gift_quality": 8}
+    assert classification_cache.get("Auriculares Sony WH-1000XM5", "299", "curador-v51") is None
+    classification_cache.put("Auriculares Sony WH-1000XM5", "299", "curador-v51", result)
+    assert classification_cache.get("auriculares sony wh 1000xm5", "289,00", "curador-v51") == result
+    assert classification_cache.stats == {"hits": 1, "misses": 1, "stores": 1}
+    assert classification_cache.hit_rate() == 0.5
+
+    # Caducada: cuenta como fallo y se borra
+    later = time.time() + 31 * 86400
+    assert classification_cache.get("Auriculares Sony WH-1000XM5", "299", "curador-v51", now=later) is None
+    assert classification_cache.count() == 0
+
+
+def test_expulsion_por_tamano_lru(cache, monkeypatch):
+    monkeypatch.setattr(classification_cache, "CACHE_MAX_ENTRIES", 3)
+    now = time.time()
+    for n in range(4):
+        classification_cache.put(f"Producto {n}", "10", "v1", {"n": n}, now=now + n)
+    classification_cache.get("Producto 0", "10", "v1", now=now + 10)  # El 0 se usó hace poco
+    assert classification_cache.evict(now=now + 11) == 1
+    assert classification_cache.get("Producto 1", "10", "v1") is None
+    assert classification_cache.get("Producto 0", "10", "v1") == {"n": 0}
+
+
+def test_procesador_no_llama_a_gemini_con_acierto(cache, monkeypatch):
+    products = [{"title": f"Regalo {n}", "price": "25"} for n in range(4)]
+    sent = []
+
+    def fake_batches(batches):
+        sent.extend(p["title"] for batch in batches for p in batch)
+        return [[{"is_good_gift": True, "gift_quality": 7, "category": "Tech"} for _ in batch] for batch in batches]
+
+    monkeypatch.setattr(process_queue, "classify_batches_with_gemini", fake_batches)
+    first = process_queue.classify_products_with_gemini(products)
+    second = process_queue.classify_products_with_gemini(products + [{"title": "Regalo nuevo", "price": "25"}])
+
+    assert first == second[:4]
+    assert sent == ["Regalo 0", "Regalo 1", "Regalo 2", "Regalo 3", "Regalo nuevo"]
+    assert classification_cache.stats["hits"] == 4
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test de gemini_client.py - pool de keys RPM/TPM, concurrencia, 429 por key y context caching
+Sin red: la petición HTTP se sustituye por una respuesta simulada
+"""
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import state_store
+
+
+@pytest.fixture
+def pool(runtime_dir, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEYS", ["key-a", "key-b"])
+    monkeypatch.setattr(gemini_client, "GEMINI_RPM", 1000)
+    monkeypatch.setattr(gemini_client, "GEMINI_TPM", 1000000)
+    monkeypatch.setattr(gemini_client, "RATE_LIMIT_BACKOFF", 0.01)
+
+
+def _response(text, status=200, tokens=None):
+    data = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    if tokens is not None:
+        data["usageMetadata"] = {"totalTokenCount": tokens}
+    return SimpleNamespace(status_code=status, text=text, json=lambda: data)
+
+
+def test_bucket_limita_peticiones_por_minuto_por_key(pool, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_RPM", 2)
+    now = time.time()
+    # 2 keys x 2 RPM; cada petición a la key con más margen (alternan)
+    assert [gemini_client.try_acquire(10, now)[0] for _ in range(4)] == [0, 1, 0, 1]
+    index, wait = gemini_client.try_acquire(10, now)
+    assert index is None and 29 < wait <= 30  # 1 petición cada 30s con 2 RPM
+    assert gemini_client.try_acquire(10, now + 30) == (0, 0)
+
+
+def test_bucket_limita_tokens_por_minuto(pool, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_TPM", 1000)
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEYS", ["key-a"])
+    now = time.time()
+    assert gemini_client.try_acquire(600, now) == (0, 0)
+    index, wait = gemini_client.try_acquire(600, now)
+    assert index is None and 11 < wait <= 12  # Faltan 200 tokens a 1000/min
+
+    # El consumo real corrige la reserva (aquí la respuesta gastó más)
+    gemini_client.settle(0, reserved=100, used=300)
+    assert gemini_client.bucket_status()["tokens"] < 250
+
+
+def test_generate_many_mantiene_n_en_vuelo_y_orden(pool, monkeypatch):
+    in_flight = [0, 0]  # actual, máximo
+    lock = threading.Lock()
+
+    def fake_post(url, payload, timeout):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return _response(payload["contents"][0]["parts"][0]["text"].upper(), tokens=5)
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    prompts = [f"prompt {n}" for n in range(9)]
+    results = gemini_client.generate_many(prompts, concurrency=3)
+
+    assert results == [p.upper() for p in prompts]
+    assert in_flight[1] == 3
+    assert gemini_client.stats["calls"] == 9
+
+
+def test_429_enfria_solo_esa_key_y_respeta_retry_after(pool, monkeypatch):
+    calls = []
+
+    def fake_post(url, payload, timeout):
+        calls.append(url.rsplit("key=", 1)[1])
+        if len(calls) == 1:
+            response = _response("", status=429)
+            response.headers = {"Retry-After": "120"}
+            return response
+        return _response('{"ok": true}')
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    assert gemini_client.generate("hola") == '{"ok": true}'
+    assert gemini_client.generate("hola") == '{"ok": true}'
+    assert calls == ["key-a", "key-b", "key-b"]  # key-a enfriándose: todo a key-b sin esperar
+    assert gemini_client.stats["rate_limited"] == 1
+    status = gemini_client.pool_status()
+    assert 119 < status[0]["cooldown_for"] <= 120 and status[0]["rate_limited"] == 1
+    assert status[1]["cooldown_for"] == 0 and status[1]["calls"] == 2
+
+    # Sin Retry-After: retryDelay del cuerpo, y si no, backoff que se dobla
+    body = SimpleNamespace(text='{"error": {"details": [{"retryDelay": "37s"}]}}')
+    assert gemini_client._retry_after(body) == 37
+    assert gemini_client.cooldown(1) == gemini_client.RATE_LIMIT_BACKOFF
+    assert gemini_client.cooldown(1) == gemini_client.RATE_LIMIT_BACKOFF * 2
+
+    # Un error 4xx no se reintenta
+    monkeypatch.setattr(gemini_client, "_post", lambda url, payload, timeout: _response("bad request", status=400))
+    assert gemini_client.generate("hola") is None
+    assert gemini_client.stats["failed"] == 1
+
+
+def test_max_attempts_se_rinde_sin_backoff(pool, monkeypatch):
+    monkeypatch.setattr(gemini_client, "RATE_LIMIT_BACKOFF", 30)  # Si esperase, el test se notaría
+    calls = []
+
+    def fake_post(url, payload, timeout):
+        calls.append(url.rsplit("key=", 1)[1])
+        return _response("", status=503)
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    start = time.monotonic()
+    assert gemini_client.generate("hola", max_attempts=1) is None
+    assert time.monotonic() - start < 5
+    assert len(calls) == 1 and gemini_client.stats["failed"] == 1
+
+    # Un 429 en el último intento también enfría la key
+    monkeypatch.setattr(gemini_client, "_post", lambda url, payload, timeout: _response("", status=429))
+    assert gemini_client.generate("hola", max_attempts=1) is None
+    assert sum(k["rate_limited"] for k in gemini_client.pool_status()) == 1
+
+
+def test_prefijo_por_context_caching_con_fallback_inline(pool, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEYS", ["key-a"])
+    created, sent = [], []
+    expired = [False]
+
+    def fake_post(url, payload, timeout):
+        if "cachedContents" in url:
+            created.append(payload["contents"][0]["parts"][0]["text"])
+            data = {"name": f"cachedContents/c{len(created)}"}
+            return SimpleNamespace(status_code=200, text="", json=lambda: data)
+        sent.append((payload.get("cachedContent"), payload["contents"][0]["parts"][0]["text"]))
+        if payload.get("cachedContent") and expired[0]:
+            return _response("not found", status=404)
+        return _response("[]", tokens=5)
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    for n in range(2):
+        gemini_client.generate(f"batch {n}", prefix="INSTRUCCIONES LARGAS", prefix_version="v1")
+    assert created == ["INSTRUCCIONES LARGAS"]  # Registrado una sola vez
+    assert sent == [("cachedContents/c1", "batch 0"), ("cachedContents/c1", "batch 1")]
+
+    # Contexto caducado en la API: se olvida y se repite con el prefijo inline
+    expired[0] = True
+    assert gemini_client.generate("batch 2", prefix="INSTRUCCIONES LARGAS", prefix_version="v1") == "[]"
+    assert sent[-1] == (None, "INSTRUCCIONES LARGAS\n\nbatch 2")
+
+    # Sin context caching (modelo no soportado, prefijo pequeño): inline sin reintentar la creación
+    monkeypatch.setattr(gemini_client, "_post", lambda url, payload, timeout: (
+        _response("too small", status=400) if "cachedContents" in url else _response(payload["contents"][0]["parts"][0]["text"])))
+    assert gemini_client.generate("batch 3", prefix="OTRO PREFIJO", prefix_version="v2") == "OTRO PREFIJO\n\nbatch 3"
+    assert gemini_client.context_for("key-a", "OTRO PREFIJO", "v2") is None
+
+
+def test_contexto_se_crea_fuera_del_lock_y_gana_el_primero(pool, monkeypatch):
+    other = []
+
+    def register_other():
+        # Otro proceso registra el mismo prefijo mientras dura nuestra petición
+        with state_store.file_lock(gemini_client.GEMINI_CONTEXT_FILE, timeout=1):
+            context_id = gemini_client._context_id("key-a", "PREFIJO", "v1")
+            state_store.write_json(gemini_client.GEMINI_CONTEXT_FILE,
+                                   {context_id: {"name": "cachedContents/otro", "expires": time.time() + 3600}})
+            other.append(context_id)
+
+    def fake_post(url, payload, timeout):
+        thread = threading.Thread(target=register_other, daemon=True)
+        thread.start()
+        thread.join(timeout=2)  # Con el lock cogido se quedaría esperando
+        data = {"name": "cachedContents/nuestro"}
+        return SimpleNamespace(status_code=200, text="", json=lambda: data)
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    assert gemini_client.context_for("key-a", "PREFIJO", "v1") == "cachedContents/otro"
+    assert other  # El lock estaba libre durante la petición HTTP
+    assert gemini_client.context_for("key-a", "PREFIJO", "v1") == "cachedContents/otro"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
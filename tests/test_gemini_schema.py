@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test de gemini_schema.py - responseSchema desde giftia_schema.json y parseo tipado
+Sin red: la petición HTTP se sustituye por una respuesta simulada
+"""
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import gemini_schema
+import process_queue
+
+
+def test_enums_salen_de_giftia_schema():
+    with open(gemini_schema.SCHEMA_FILE, encoding="utf-8") as f:
+        schema = json.load(f)
+    props = gemini_schema.CURATOR_ITEM["properties"]
+    assert props["category"]["enum"] == list(schema["categories"])
+    assert props["age"]["items"]["enum"] == list(schema["ages"])
+    assert props["gender"]["enum"] == list(schema["genders"])
+    assert props["recipients"]["items"]["enum"] == list(schema["recipients"])
+    assert props["occasions"]["items"]["enum"] == list(schema["occasions"])
+    assert gemini_schema.RECLASSIFY_SCHEMA["items"]["properties"]["category"]["enum"] == list(schema["categories"])
+
+
+def test_peticion_lleva_response_schema(runtime_dir, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEYS", ["key-a"])
+    sent = []
+
+    def fake_post(url, payload, timeout):
+        sent.append(payload["generationConfig"])
+        data = {"candidates": [{"content": {"parts": [{"text": "[]"}]}}]}
+        return SimpleNamespace(status_code=200, text="[]", json=lambda: data)
+
+    monkeypatch.setattr(gemini_client, "_post", fake_post)
+    gemini_client.generate("hola", **gemini_schema.generation_options(gemini_schema.CURATOR_SCHEMA))
+    gemini_client.generate("hola")
+    assert sent[0]["responseMimeType"] == "application/json"
+    assert sent[0]["responseSchema"] == gemini_schema.CURATOR_SCHEMA
+    assert "responseSchema" not in sent[1]
+
+
+def test_parse_tipa_y_descarta_lo_que_no_encaja():
+    text = json.dumps([
+        {"i": "1", "ok": "true", "q": 8.0, "category": "Tech", "age": "adultos",
+         "recipients": ["amigo", "vecino"], "faqs": [{"q": "¿Pila?", "a": "No"}], "extra": 1},
+        {"i": 2, "ok": False, "q": 2, "category": "Fandom"},
+    ])
+    first, second = gemini_schema.parse(text, gemini_schema.CURATOR_SCHEMA)
+    assert first == {"i": 1, "ok": True, "q": 8, "category": "Tech", "age": ["adultos"],
+                     "recipients": ["amigo"], "faqs": [{"q": "¿Pila?", "a": "No"}]}
+    assert second == {"i": 2, "ok": False, "q": 2}  # Categoría fuera del enum: fallback del llamador
+
+    assert gemini_schema.parse('{"is_good_gift": true, "category": "Zen", "gift_quality": "7"}',
+                               gemini_schema.SIMPLE_SCHEMA) == {"is_good_gift": True, "category": "Zen", "gift_quality": 7}
+    assert gemini_schema.parse("", gemini_schema.SIMPLE_SCHEMA) is None
+
+
+def test_respuesta_estructurada_a_clasificacion(runtime_dir):
+    text = json.dumps([{"i": 1, "ok": True, "q": 9, "category": "Gourmet", "age": ["adultos", "seniors"],
+                        "gender": "unisex", "occasions": ["navidad"], "marketing_hook": "hedonism"}])
+    [classification] = process_queue.parse_batch_response(text, [{"title": "Jamón ibérico", "price": "90"}])
+    assert classification["is_good_gift"] is True
+    assert classification["category"] == "Gourmet"
+    assert classification["ages"] == ["adultos", "seniors"]
+    assert classification["recipients"] == ["amigo"]  # Fallback si falta
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test de gemini_stub.py - el cliente y el procesador contra el stub local
+Sin red externa: el stub escucha en 127.0.0.1 en un puerto libre
+"""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import gemini_schema
+import gemini_stub
+import process_queue
+
+@pytest.fixture
+def stub(runtime_dir, monkeypatch):
+    """Arranca el stub con la configuración dada y apunta gemini_client a él."""
+    monkeypatch.setattr(gemini_client, "GEMINI_API_KEYS", ["stub-key-a", "stub-key-b"])
+    monkeypatch.setattr(gemini_client, "GEMINI_RPM", 1000)
+    monkeypatch.setattr(gemini_client, "GEMINI_TPM", 1000000)
+    monkeypatch.setattr(gemini_client, "RATE_LIMIT_BACKOFF", 0.01)
+    servers = []
+
+    def start(**config):
+        server, url = gemini_stub.start(**dict({
+            "latency": "fixed:0", "rate_429": 0, "rate_5xx": 0, "rate_truncated": 0, "rate_malformed": 0,
+            "rpm": 0, "seed": 7}, **config))
+        servers.append(server)
+        monkeypatch.setattr(gemini_client, "GEMINI_BASE_URL", url)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _products(n):
+    return [{"title": f"Producto de prueba {i}", "price": "25", "rating": "4.5"} for i in range(n)]
+
+
+def test_fichas_del_curador_validas_contra_el_schema(stub):
+    stub()
+    results = process_queue.classify_batches_with_gemini([_products(3), _products(2)])
+    classifications = [c for batch in results for c in batch]
+    assert len(classifications) == 5 and all(c is not None for c in classifications)
+    for c in classifications:
+        assert c["category"] in process_queue.VALID_CATEGORIES
+        assert isinstance(c["is_good_gift"], bool)
+    # El prefijo del curador se registró como contexto y luego se sirvió cacheado
+    assert gemini_stub.stats["contexts"] >= 1
+    assert gemini_client.stats["cached_tokens"] > 0
+
+
+def test_429_inyectados_se_reintentan_con_retry_after(stub):
+    stub(rate_429=0.4, retry_after=0.05)
+    texts = gemini_client.generate_many([f"Prompt {n}" for n in range(8)],
+                                        **gemini_schema.generation_options(gemini_schema.SIMPLE_SCHEMA))
+    assert all(texts)
+    assert gemini_stub.stats["rate_limited"] > 0
+    assert gemini_client.stats["rate_limited"] == gemini_stub.stats["rate_limited"]
+    for text in texts:
+        assert gemini_schema.parse(text, gemini_schema.SIMPLE_SCHEMA)["category"] in gemini_schema.CATEGORIES
+
+
+def test_respuestas_cortadas_y_mal_formadas_se_salvan(stub):
+    prompt = "PRODUCTOS A EVALUAR:" + "".join(f"\n{n + 1}. Producto {n}" for n in range(6))
+    stub(rate_malformed=1.0, seed=3)
+    malformed = [gemini_client.generate(prompt, max_output_tokens=8192, full=True) for _ in range(6)]
+    gemini_stub.configure(rate_truncated=1.0, rate_malformed=0)
+    truncated = gemini_client.generate(prompt, max_output_tokens=8192, full=True)
+
+    assert gemini_stub.stats["truncated"] == 1
+    assert truncated["finish_reason"] == "MAX_TOKENS"
+    salvaged = gemini_schema.parse(truncated["text"], gemini_schema.CURATOR_SCHEMA)
+    assert [r["i"] for r in salvaged] == list(range(1, len(salvaged) + 1)) and len(salvaged) < 6
+    for response in malformed:
+        try:
+            json.loads(response["text"])
+            assert False, "El stub debía estropear el JSON"
+        except ValueError:
+            pass
+        assert len(gemini_schema.parse(response["text"], gemini_schema.CURATOR_SCHEMA)) == 6
+
+
+def test_latencia_y_semilla_reproducibles():
+    import random
+    assert gemini_stub.sample_latency("fixed:0.25", random.Random(1)) == 0.25
+    assert 0.1 <= gemini_stub.sample_latency("uniform:0.1,0.2", random.Random(1)) <= 0.2
+    assert gemini_stub.sample_latency("lognormal:0.5,0.3", random.Random(1)) > 0
+    one = gemini_stub.sample_answer("1. A\n2. B", {}, random.Random(5))
+    assert one == gemini_stub.sample_answer("1. A\n2. B", {}, random.Random(5))
+    assert gemini_schema.coerce(one, gemini_schema.SIMPLE_SCHEMA) == one
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test de json_salvage.py - corpus de respuestas de Gemini
+Los tests/gemini_responses/*.txt son muestras sintéticas escritas a mano con el
+formato de los volcados last_gemini_response*.txt (=== RAW RESPONSE ===) e
+imitando los fallos vistos en producción: no hay capturas reales guardadas.
+Cuando aparezca un volcado real, se copia tal cual en esa carpeta y se añade a
+EXPECTED con los i que deben recuperarse.
+"""
+import os
+import sys
+import glob
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import json_salvage
+import process_queue
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemini_responses")
+
+# i que deben recuperarse de cada volcado del corpus
+EXPECTED = {
+    "comas_finales_y_control.txt": [1, 2],
+    "comillas_sin_escapar.txt": [1, 2, 3],
+    "cortado_max_tokens.txt": [1, 2, 3],
+    "markdown_y_prosa.txt": [1, 2],
+    "objeto_roto_en_medio.txt": [1, 3],
+    "ok_completo.txt": [1, 2, 3],
+    "sin_json.txt": [],
+}
+
+
+def _corpus():
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            dump = f.read()
+        yield os.path.basename(path), json_salvage.raw_response(dump)
+
+
+def test_corpus_recupera_los_objetos_completos():
+    cases = dict(_corpus())
+    assert sorted(cases) == sorted(EXPECTED)
+    for name, raw in cases.items():
+        objects = json_salvage.salvage_array(raw)
+        assert [obj["i"] for obj in objects] == EXPECTED[name], name
+
+
+def test_corpus_repara_contenido():
+    raw = dict(_corpus())
+    quoted = json_salvage.salvage_array(raw["comillas_sin_escapar.txt"])
+    assert quoted[0]["title"] == 'Taza "Mejor Papá del Mundo"'
+    assert quoted[2]["title"] == 'Perfume "Light Blue"'
+    trailing = json_salvage.salvage_array(raw["comas_finales_y_control.txt"])
+    assert trailing[0]["pros"] == ["Resistente", "Icónica"]
+    truncated = json_salvage.salvage_array(raw["cortado_max_tokens.txt"])
+    assert truncated[0]["faqs"] == [{"q": "¿Edad?", "a": "18+"}]
+
+
+def test_hueco_no_desplaza_el_mapeo(runtime_dir):
+    raw = dict(_corpus())
+    products = [{"title": t, "price": "20"} for t in ("Echo Dot", "Vinilo", "Funda")]
+    parsed = process_queue.parse_batch_response(raw["objeto_roto_en_medio.txt"], products)
+    assert [p is not None for p in parsed] == [True, False, True]
+    assert parsed[2]["is_good_gift"] is False
+
+
+def test_respuesta_cortada_solo_reintenta_los_que_faltan(runtime_dir, monkeypatch):
+    products = [{"title": f"Regalo {n}", "price": "25"} for n in range(4)]
+    sent = []
+
+    def fake_generate_many(prompts, **kwargs):
+        responses = []
+        for prompt in prompts:
+            batch = [n for n, p in enumerate(products) if f"{p['title']}\n" in prompt]
+            sent.append(batch)
+            complete = ",".join(f'{{"i": {i + 1}, "ok": true, "q": 7}}' for i in range(min(3, len(batch))))
+            text = f'[{complete}, {{"i": 4, "ok": true, "title": "Reg' if len(batch) == 4 else f"[{complete}]"
+            responses.append({"text": text, "finish_reason": "MAX_TOKENS" if len(batch) == 4 else "STOP",
+                              "output_tokens": 8192})
+        return responses
+
+    monkeypatch.setattr(gemini_client, "generate_many", fake_generate_many)
+    [results] = process_queue.classify_batches_with_gemini([products])
+
+    assert sent == [[0, 1, 2, 3], [3]]
+    assert all(r is not None for r in results)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test de payload_hashes.py - saltar envíos a WordPress que no cambian
+Sin red: base de datos temporal, WordPress simulado y el stub de api-ingest.php
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ingest_stub
+import inventory_sync
+import payload_hashes
+import wp_ingest
+import wp_limiter
+
+SEO = {"seo_title": "Cafetera italiana", "meta_description": "La de toda la vida", "pros": ["Acero", "6 tazas"]}
+
+
+@pytest.fixture
+def hashes(runtime_dir, monkeypatch):
+    monkeypatch.setattr(payload_hashes, "HASH_SKIP", True)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 50.0)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_MIN", 50.0)
+
+
+class FakeResponse:
+    status_code = 200
+    text = '{"success":true}'
+
+
+def test_hash_canonico_ignora_orden_y_marcas_de_tiempo():
+    a = {"asin": "B0HASH0001", "processed_at": "2026-10-17T10:00:00", **SEO}
+    b = dict(reversed(list(SEO.items())), asin="B0HASH0001", processed_at="2026-10-18T09:00:00")
+    assert payload_hashes.canonical_hash(a) == payload_hashes.canonical_hash(b)
+    assert payload_hashes.canonical_hash(a) != payload_hashes.canonical_hash(dict(a, seo_title="Otra"))
+
+
+def test_salta_lo_ya_enviado_por_cualquier_identificador(hashes, monkeypatch):
+    payload = {"asin": "B0HASH0001", **SEO}
+    assert not payload_hashes.unchanged("seo", payload, post_id=1001)
+    payload_hashes.remember("seo", payload, post_id=1001)
+    assert payload_hashes.unchanged("seo", payload)                            # Por ASIN
+    assert payload_hashes.unchanged("seo", dict(payload, asin=None), post_id=1001) is False  # Otro payload
+    payload_hashes.remember("seo", {"post_id": 1001, **SEO})
+    assert payload_hashes.unchanged("seo", {"post_id": 1001, **SEO})           # Por post_id, misma fila
+    assert payload_hashes.count() == 1
+    assert not payload_hashes.unchanged("seo", dict(payload, seo_title="Nuevo"), post_id=1001)
+    assert not payload_hashes.unchanged("stock", payload)                      # Otro scope
+    assert payload_hashes.stats == {"skipped": 2, "sent": 2}
+
+    monkeypatch.setattr(payload_hashes, "HASH_SKIP", False)  # PAYLOAD_HASH_SKIP=0: se envía todo
+    assert not payload_hashes.unchanged("seo", {"post_id": 1001, **SEO})
+
+
+def test_publicar_entero_olvida_los_hashes(hashes, monkeypatch):
+    payload_hashes.remember("seo", {"asin": "B0HASH0002", **SEO})
+    server, url = ingest_stub.start(latency=0, bulk=True, rate_429=0, rate_item_fail=0, seed=1)
+    monkeypatch.setattr(wp_ingest, "WP_API_URL", url)
+    try:
+        assert wp_ingest.ingest_one({"asin": "B0HASH0002", "title": "Cafetera"})["ok"]
+    finally:
+        server.shutdown()
+    # WordPress tiene ahora lo que mandó el ingest: el SEO se vuelve a enviar
+    assert not payload_hashes.unchanged("seo", {"asin": "B0HASH0002", **SEO})
+    assert payload_hashes.count() == 0
+
+
+def test_inventory_sync_no_reenvia_el_mismo_stock(hashes, monkeypatch):
+    sent = []
+
+    def fake_request(method, url, **kwargs):
+        sent.append(kwargs["json"]["post_id"])
+        return FakeResponse()
+
+    updates = [{"post_id": n, "stock_status": "outdated", "reason": "Stock agotado en feed"} for n in (1001, 1002, 1003)]
+    monkeypatch.setattr(wp_limiter, "request", fake_request)
+    inventory_sync.update_product_batch(updates)
+    inventory_sync.update_product_batch([dict(u, reason="Missing in feed & No EAN match") for u in updates])
+    updates[1]["stock_status"] = "in_stock"
+    inventory_sync.update_product_batch(updates)
+    assert sent == [1001, 1002, 1003, 1002]
+    assert payload_hashes.stats["skipped"] == 5
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
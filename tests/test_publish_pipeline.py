@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test de publish_outbox.py y de las etapas clasificar → publicar de process_queue.py
+Sin red externa: Gemini simulado y el stub de api-ingest.php en 127.0.0.1
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ingest_stub
+import process_queue
+import publish_outbox
+import queue_journal
+import wp_ingest
+import wp_limiter
+
+APPROVED = {"is_good_gift": True, "gift_quality": 8, "category": "Tech", "gender": "unisex"}
+
+
+@pytest.fixture
+def stub(runtime_dir, monkeypatch):
+    """Arranca el stub de api-ingest.php con la configuración dada y apunta wp_ingest a él."""
+    monkeypatch.setattr(wp_ingest, "INGEST_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 50.0)  # Sin esperas entre peticiones al stub
+    monkeypatch.setattr(wp_limiter, "WP_RATE_MIN", 50.0)
+    servers = []
+
+    def start(**config):
+        server, url = ingest_stub.start(**dict({
+            "latency": 0, "bulk": True, "rate_429": 0, "rate_item_fail": 0, "seed": 1}, **config))
+        servers.append(server)
+        monkeypatch.setattr(wp_ingest, "WP_API_URL", url)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _products(n, prefix="B0PIPE"):
+    return [{"asin": f"{prefix}{i:04d}", "title": f"Producto {i}", "price": "30"} for i in range(n)]
+
+
+def _put_and_exit(path):
+    publish_outbox.OUTBOX_FILE = path
+    publish_outbox.put([(p, APPROVED) for p in _products(3, "B0DEAD")])
+
+
+def test_outbox_put_done_y_reclamar_huerfanas(runtime_dir):
+    ids = publish_outbox.put([(p, APPROVED) for p in _products(3)])
+    publish_outbox.done(ids[:1])
+    assert [e["id"] for e in publish_outbox.pending()] == ids[1:]
+    assert publish_outbox.claim_stale() == []  # Son de este proceso y el lease sigue vivo
+
+    # Otro proceso las apunta y muere sin publicarlas
+    worker = multiprocessing.Process(target=_put_and_exit, args=(publish_outbox.OUTBOX_FILE,))
+    worker.start()
+    worker.join()
+    stale = publish_outbox.claim_stale()
+    assert [p["asin"] for _, p, _ in stale] == ["B0DEAD0000", "B0DEAD0001", "B0DEAD0002"]
+    assert publish_outbox.claim_stale() == []  # Ya reclamadas por este proceso
+
+    # Lease caducado: también vuelven
+    later = time.time() + publish_outbox.OUTBOX_LEASE_SECONDS + 1
+    assert len(publish_outbox.claim_stale(now=later)) == 5
+    assert publish_outbox.compact() == 5
+    publish_outbox.done([entry_id for entry_id, _, _ in publish_outbox.claim_stale(now=later * 2)])
+    assert publish_outbox.count() == 0
+
+
+def test_clasificar_no_espera_a_wordpress(stub, monkeypatch):
+    stub(latency=0.3)
+    queue_journal.add_many(_products(12))
+    events = []
+
+    def fake_classify(products):
+        events.append(("classify", time.monotonic()))
+        return [dict(APPROVED) for _ in products]
+
+    def slow_publish_prepared(prepared, ids):
+        start = time.monotonic()
+        statuses = original_publish(prepared, ids)
+        events.append(("publish", start, time.monotonic()))
+        return statuses
+
+    original_publish = process_queue.publish_prepared
+    monkeypatch.setattr(process_queue, "classify_products_with_gemini", fake_classify)
+    monkeypatch.setattr(process_queue, "publish_prepared", slow_publish_prepared)
+    monkeypatch.setattr(process_queue, "GEMINI_CONCURRENCY", 1)
+    monkeypatch.setattr(process_queue, "PUBLISH_CONCURRENCY", 1)
+    published = process_queue.run_processor()
+
+    assert published == 12 and len(ingest_stub.posts) == 12
+    classified_at = [e[1] for e in events if e[0] == "classify"]
+    publishes = [e for e in events if e[0] == "publish" and e[2] - e[1] > 0.2]
+    # Mientras WordPress tardaba con el primer bloque, Gemini ya clasificaba los siguientes
+    assert len(classified_at) == 4
+    assert any(publishes[0][1] < t < publishes[0][2] for t in classified_at)
+    assert publish_outbox.count() == 0
+
+
+def test_arranque_republica_el_outbox_de_un_proceso_muerto(stub):
+    stub()
+    worker = multiprocessing.Process(target=_put_and_exit, args=(publish_outbox.OUTBOX_FILE,))
+    worker.start()
+    worker.join()
+    published = process_queue.run_processor()  # Cola vacía, pero hay clasificados pendientes
+    assert published == 3
+    assert sorted(ingest_stub.posts) == ["B0DEAD0000", "B0DEAD0001", "B0DEAD0002"]
+    assert publish_outbox.count() == 0
+
+
+def test_sin_respuesta_de_wordpress_queda_con_backoff_y_se_aparca(runtime_dir, monkeypatch):
+    monkeypatch.setattr(publish_outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    ids = publish_outbox.put([(p, APPROVED) for p in _products(2)])
+    publish_outbox.done(ids[1:])
+    now = time.time()
+    assert publish_outbox.fail(ids[:1], "timeout") == 0
+    assert publish_outbox.claim_stale() == []  # Esperando el backoff
+    assert 0 < publish_outbox.next_due_in() <= publish_outbox.OUTBOX_RETRY_BACKOFF
+    later = now + publish_outbox.OUTBOX_RETRY_BACKOFF + 1
+    assert [entry_id for entry_id, _, _ in publish_outbox.claim_stale(now=later)] == ids[:1]
+    publish_outbox.fail(ids[:1])
+    assert publish_outbox.fail(ids[:1]) == 1  # Tercer envío sin respuesta: aparcado
+    assert publish_outbox.count() == 0 and len(publish_outbox.parked()) == 1
+    assert publish_outbox.claim_stale(now=later * 2) == []
+    assert publish_outbox.compact() == 1  # Las aparcadas no se pierden al compactar
+    assert publish_outbox.unpark() == 1
+    assert len(publish_outbox.claim_stale()) == 1
+
+
+def test_publicacion_sin_ack_se_republica_en_la_siguiente_pasada(stub, monkeypatch):
+    stub(rate_429=1.0, retry_after=0.01)
+    monkeypatch.setattr(wp_ingest, "INGEST_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(publish_outbox, "OUTBOX_RETRY_BACKOFF", 0.5)
+    monkeypatch.setattr(process_queue, "classify_products_with_gemini",
+                        lambda products: [dict(APPROVED) for _ in products])
+    queue_journal.add_many(_products(3))
+    assert process_queue.run_processor() == 0  # WordPress devuelve 429 siempre
+    assert queue_journal.count() == 0 and publish_outbox.count() == 3
+    assert all(e["attempts"] == 1 for e in publish_outbox.pending())
+    assert process_queue.run_processor() == 0  # Backoff sin vencer: no se reenvía
+    assert ingest_stub.stats["created"] == 0
+
+    ingest_stub.configure(rate_429=0)
+    time.sleep(0.5)
+    assert process_queue.run_processor() == 3  # Vuelve WordPress: se republica sin Gemini
+    assert sorted(ingest_stub.posts) == [p["asin"] for p in _products(3)]
+    assert publish_outbox.count() == 0
+
+
+def test_producto_suelto_pasa_por_el_outbox(stub, monkeypatch):
+    stub(rate_429=1.0, retry_after=0.01)
+    monkeypatch.setattr(wp_ingest, "INGEST_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(process_queue, "classify_with_gemini", lambda title, price, description="": dict(APPROVED))
+    product = _products(1, "B0SOLO")[0]
+    assert process_queue.process_product(dict(product)) is False
+    assert [e["product"]["asin"] for e in publish_outbox.pending()] == ["B0SOLO0000"]
+
+    ingest_stub.configure(rate_429=0)
+    assert process_queue.process_product(dict(product)) is True
+    # La primera entrada sigue pendiente (backoff); la segunda salió con el ack
+    assert publish_outbox.count() == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
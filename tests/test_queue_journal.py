@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Test de queue_journal.py - cola con journal append-only
+Sin red: todo en un directorio temporal
+"""
+import os
+import sys
+import json
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import queue_journal
+import queue_shards
+
+
+def test_fifo_y_persistencia(runtime_dir):
+    for i in range(5):
+        queue_journal.add({"asin": f"B00000000{i}", "title": f"Producto {i}"})
+    assert queue_journal.count() == 5
+
+    first = queue_journal.pop()
+    assert first["asin"] == "B000000000"
+    batch = queue_journal.pop_batch(2)
+    assert [p["asin"] for p in batch] == ["B000000001", "B000000002"]
+
+    # Otro proceso (simulado con reload) ve el mismo estado sin snapshot nuevo
+    queue_journal.reload()
+    assert [p["asin"] for p in queue_journal.items()] == ["B000000003", "B000000004"]
+
+
+def test_linea_incompleta_tras_crash(runtime_dir):
+    queue_journal.add({"asin": "B0CRASH001", "title": "Antes del crash"})
+    with open(queue_journal.QUEUE_JOURNAL_FILE, 'a', encoding='utf-8') as f:
+        f.write('{"op":"add","id":99,"item":{"asin":"B0CRA')  # Escritura cortada
+    queue_journal.reload()
+    assert [p["asin"] for p in queue_journal.items()] == ["B0CRASH001"]
+
+
+def test_compactacion_idempotente(runtime_dir):
+    for i in range(4):
+        queue_journal.add({"asin": f"B0COMPACT{i}"})
+    queue_journal.pop()
+    journal_before = open(queue_journal.QUEUE_JOURNAL_FILE, encoding='utf-8').read()
+
+    queue_journal.compact()
+    assert os.path.getsize(queue_journal.QUEUE_JOURNAL_FILE) == 0
+
+    # Crash entre renombrar snapshot y vaciar journal: reaplicar no cambia nada
+    with open(queue_journal.QUEUE_JOURNAL_FILE, 'w', encoding='utf-8') as f:
+        f.write(journal_before)
+    queue_journal.reload()
+    assert [p["asin"] for p in queue_journal.items()] == ["B0COMPACT1", "B0COMPACT2", "B0COMPACT3"]
+
+
+def test_replace_all_no_resucita_tras_crash_al_compactar(runtime_dir, monkeypatch):
+    for i in range(4):
+        queue_journal.add({"asin": f"B0REPL000{i}"})
+
+    # Muere tras escribir el snapshot nuevo y antes de truncar el journal
+    original = queue_journal._write_snapshot
+
+    def snapshot_and_die(items):
+        original(items)
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m, pytest.raises(KeyboardInterrupt):
+        m.setattr(queue_journal, "_write_snapshot", snapshot_and_die)
+        queue_journal.replace_all([{"asin": "B0REPL0001"}, {"asin": "B0REPLNEW0"}])
+
+    queue_journal.reload()
+    assert [p["asin"] for p in queue_journal.items()] == ["B0REPL0001", "B0REPLNEW0"]
+    assert not queue_journal.contains({"asin": "B0REPL0000"})
+
+
+def test_snapshot_legacy_sin_ids(runtime_dir):
+    with open(queue_journal.QUEUE_SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+        json.dump([{"asin": "B0LEGACY01"}, {"asin": "B0LEGACY02"}], f)
+    queue_journal.reload()
+    assert queue_journal.pop()["asin"] == "B0LEGACY01"
+    queue_journal.reload()
+    assert [p["asin"] for p in queue_journal.items()] == ["B0LEGACY02"]
+
+
+def test_indice_de_pertenencia(runtime_dir):
+    assert queue_journal.add_unique({"asin": "B0INDEX001"}) is not None
+    assert queue_journal.add_unique({"asin": "B0INDEX001", "title": "repetido"}) is None
+    queue_journal.add_unique({"identifiers": {"ean": "8400000000017"}, "merchant_id": "13075"})
+    assert queue_journal.contains({"ean": "8400000000017"})
+
+    # El índice se reconstruye al recargar y se actualiza al desencolar
+    queue_journal.reload()
+    assert queue_journal.contains({"asin": "B0INDEX001"})
+    queue_journal.pop()
+    assert not queue_journal.contains({"asin": "B0INDEX001"})
+
+
+def test_prioridad_y_antiinanicion(runtime_dir):
+    queue_journal.add({"asin": "B0LOW00001", "price": "5.00 €"})
+    for i in range(8):
+        queue_journal.add({"asin": f"B0TOP0000{i}", "rating_value": 4.8, "review_count": 5000,
+                           "price": "49.99 €", "pre_score": 80})
+
+    served = [queue_journal.pop()["asin"] for _ in range(5)]
+    # Los buenos salen antes, pero el marginal no espera para siempre
+    assert served[:4] == ["B0TOP00000", "B0TOP00001", "B0TOP00002", "B0TOP00003"]
+    assert "B0LOW00001" in served
+
+
+def test_reprioritize(runtime_dir):
+    queue_journal.add({"asin": "B0PRIO0001"})
+    queue_journal.add({"asin": "B0PRIO0002"})
+    queue_journal.reprioritize(lambda p: 100 if p["asin"] == "B0PRIO0002" else 0)
+    queue_journal.reload()
+    assert queue_journal.pop()["asin"] == "B0PRIO0002"
+
+
+
+def test_add_many_streaming(runtime_dir):
+    queue_journal.add({"ean": "8400000000001"})
+
+    def feed():
+        for i in range(1, 1201):
+            yield {"ean": f"84000000{i:05d}", "merchant_id": 13075}
+        yield {"ean": "8400000000005"}  # Duplicado dentro del propio feed
+
+    added, skipped = queue_journal.add_many(feed(), chunk_size=500)
+    assert (added, skipped) == (1199, 2)
+    assert queue_journal.count() == 1200
+    # Solo se escriben los nuevos: una línea por producto (+1 del add inicial)
+    with open(queue_journal.QUEUE_JOURNAL_FILE, 'rb') as f:
+        assert sum(1 for _ in f) == 1 + 1199
+    queue_journal.reload()
+    assert queue_journal.contains({"identifiers": {"ean": "8400000001200"}})
+
+
+
+def test_snapshot_jsonl_y_herramientas_de_estado(runtime_dir):
+    for i in range(6):
+        queue_journal.add({"asin": f"B0PEEK000{i}", "title": f"Producto {i}"})
+    queue_journal.compact()
+    with open(queue_journal.QUEUE_SNAPSHOT_FILE, 'rb') as f:
+        assert f.read(1) == b'{'  # JSONL, no array con indent=2
+
+    queue_journal.pop_batch(2)
+    queue_journal.add({"asin": "B0PEEK0006", "title": "Nuevo"})
+    # Sin cargar la cola: snapshot + journal
+    assert queue_journal.quick_count() == queue_journal.count() == 5
+    assert [p["asin"] for p in queue_journal.peek(2)] == ["B0PEEK0002", "B0PEEK0003"]
+    assert [p["asin"] for p in queue_journal.peek(2, newest=True)] == ["B0PEEK0006", "B0PEEK0005"]
+
+
+
+
+def test_shards_round_robin_ponderado(runtime_dir):
+    # Importación Awin masiva encolada antes que Amazon
+    queue_journal.add_many({"ean": f"84{i:011d}", "merchant_id": 13075} for i in range(50))
+    for i in range(6):
+        queue_journal.add({"asin": f"B0AMZ0000{i}", "rating_value": 4.5, "review_count": 100})
+
+    served = [queue_shards.shard_of(p) for p in queue_journal.pop_batch(8)]
+    # amazon=3, awin=1: Amazon no espera a que se vacíe Awin
+    assert served.count("amazon") == 6
+    assert served.count("awin:13075") == 2
+
+    stats = queue_journal.shard_stats()
+    assert stats["awin:13075"]["depth"] == 48 and "amazon" not in stats
+    assert stats["awin:13075"]["oldest_age"] >= 0
+
+
+def test_sidecar_metadatos_sin_cargar_la_cola(runtime_dir):
+    queue_journal.add_many({"ean": f"84{i:011d}", "merchant_id": 13075} for i in range(30))
+    queue_journal.add({"asin": "B0META0001"})
+    queue_journal.pop_batch(4)
+
+    # Otro proceso (monitor): no carga snapshot ni journal
+    queue_journal._loaded = False
+    assert queue_journal.quick_count() == 27
+    stats = queue_journal.shard_stats()
+    assert not queue_journal._loaded
+    assert sum(s["depth"] for s in stats.values()) == 27
+
+    # Crash entre journal y sidecar: el sidecar deja de valer y se recalcula
+    with open(queue_journal.QUEUE_JOURNAL_FILE, 'ab') as f:
+        f.write(b'{"op":"add","id":999,"item":{"asin":"B0CRASH001"}}\n')
+    assert queue_journal.quick_count() == 28
+    assert sum(s["depth"] for s in queue_journal.shard_stats().values()) == 28
+
+def _hunter(tmp_dir, prefix, total):
+    """Proceso hunter: encola productos uno a uno sobre la misma cola."""
+    queue_journal.QUEUE_SNAPSHOT_FILE = os.path.join(tmp_dir, "pending_products.json")
+    queue_journal.QUEUE_JOURNAL_FILE = os.path.join(tmp_dir, "pending_products.journal")
+    queue_journal.QUEUE_META_FILE = os.path.join(tmp_dir, "pending_products.meta.json")
+    queue_journal.COMPACT_MIN_OPS = 20  # Compactar a menudo mientras otros escriben
+    queue_journal.reload()
+    for i in range(total):
+        queue_journal.add({"asin": f"{prefix}{i:05d}"})
+
+
+def test_hunters_y_procesador_concurrentes(runtime_dir):
+    hunters = [multiprocessing.Process(target=_hunter, args=(str(runtime_dir), f"B0H{n}", 60)) for n in range(3)]
+    for h in hunters:
+        h.start()
+    popped = []
+    while any(h.is_alive() for h in hunters):
+        popped.extend(p["asin"] for p in queue_journal.pop_batch(5))
+    for h in hunters:
+        h.join()
+    popped.extend(p["asin"] for p in queue_journal.pop_batch(1000))
+
+    assert len(popped) == 180
+    assert len(set(popped)) == 180
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Test de queue_sqlite.py - leases, ack/nack y workers concurrentes
+Sin red: base SQLite en un directorio temporal
+"""
+import os
+import sys
+import time
+import sqlite3
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import queue_shards
+import queue_sqlite
+
+STARTERS = 16  # Procesos que abren la base a la vez en los tests de arranque
+
+
+def _claim_all(db_file, results):
+    """Worker: reserva en bucle hasta vaciar la cola."""
+    queue_sqlite.QUEUE_DB_FILE = db_file
+    queue_sqlite.reload()
+    claimed = []
+    while True:
+        batch = queue_sqlite.claim_batch(3)
+        if not batch:
+            break
+        claimed.extend(p["asin"] for p in batch)
+        queue_sqlite.ack(batch)
+    results.extend(claimed)
+
+
+def _start_and_add(db_file, start, errors, asin):
+    """Worker: arranca a la vez que los demás contra la misma base y encola uno."""
+    queue_sqlite.QUEUE_DB_FILE = db_file
+    queue_sqlite.reload()
+    start.wait()
+    try:
+        queue_sqlite.add({"asin": asin})
+    except Exception as e:
+        errors.append(f"{asin}: {e}")
+
+
+def _start_together(db_file, n=STARTERS):
+    """Lanza n procesos a la vez contra db_file. Retorna los errores."""
+    with multiprocessing.Manager() as manager:
+        errors = manager.list()
+        start = manager.Event()
+        workers = [multiprocessing.Process(target=_start_and_add, args=(db_file, start, errors, f"B0BOOT{i:04d}"))
+                   for i in range(n)]
+        for w in workers:
+            w.start()
+        start.set()
+        for w in workers:
+            w.join()
+        return list(errors)
+
+
+def test_claim_ack_nack(runtime_dir):
+    for i in range(5):
+        queue_sqlite.add({"asin": f"B0SQL0000{i}"})
+
+    batch = queue_sqlite.claim_batch(3)
+    assert [p["asin"] for p in batch] == ["B0SQL00000", "B0SQL00001", "B0SQL00002"]
+    # Reservados: no se vuelven a entregar
+    assert [p["asin"] for p in queue_sqlite.claim_batch(3)] == ["B0SQL00003", "B0SQL00004"]
+
+    batch[1]["retry_count"] = 1
+    queue_sqlite.nack(batch[1])
+    queue_sqlite.ack([batch[0], batch[2]])
+    retried = queue_sqlite.claim_batch(3)
+    assert [(p["asin"], p["retry_count"]) for p in retried] == [("B0SQL00001", 1)]
+    assert queue_sqlite.count() == 3  # 2 reservados sin ack + 1 reintento
+
+
+def test_lease_caducado_vuelve_a_la_cola(runtime_dir):
+    queue_sqlite.add({"asin": "B0LEASE001"})
+    assert len(queue_sqlite.claim_batch(1, lease_seconds=0.2)) == 1
+    assert queue_sqlite.claim_batch(1) == []
+    time.sleep(0.3)  # El worker "murió": el lease caduca
+    assert [p["asin"] for p in queue_sqlite.claim_batch(1)] == ["B0LEASE001"]
+
+
+def test_indice_de_pertenencia(runtime_dir):
+    assert queue_sqlite.add_unique({"asin": "B0INDEX001"}) is not None
+    assert queue_sqlite.add_unique({"asin": "B0INDEX001"}) is None
+    assert queue_sqlite.contains({"identifiers": {"ean": ""}, "asin": "B0INDEX001"})
+
+    batch = queue_sqlite.claim_batch(1)
+    assert queue_sqlite.contains({"asin": "B0INDEX001"})  # Reservado sigue "en cola"
+    queue_sqlite.ack(batch)
+    assert not queue_sqlite.contains({"asin": "B0INDEX001"})
+
+
+def test_prioridad(runtime_dir):
+    queue_sqlite.add({"asin": "B0AWIN0001", "source": "awin"})
+    queue_sqlite.add({"asin": "B0TOP00001", "rating_value": 4.8, "review_count": 5000, "pre_score": 80})
+    assert queue_sqlite.claim_batch(1)[0]["asin"] == "B0TOP00001"
+
+
+
+
+def test_shards_round_robin_ponderado(runtime_dir):
+    queue_sqlite.add_many({"ean": f"84{i:011d}", "merchant_id": 27904} for i in range(40))
+    for i in range(6):
+        queue_sqlite.add({"asin": f"B0AMZ0000{i}"})
+
+    shards = [queue_shards.shard_of(p) for p in queue_sqlite.claim_batch(8)]
+    assert shards.count("amazon") == 6 and shards.count("awin:27904") == 2
+    stats = queue_sqlite.shard_stats()
+    assert stats["awin:27904"]["depth"] == 40 and stats["amazon"]["depth"] == 6  # Reservados siguen en cola
+
+    queue_sqlite.remove_where(lambda p: p.get("merchant_id") == 27904)
+    assert queue_sqlite.count() == 6  # queue_stats mantenido por triggers
+    assert "awin:27904" not in queue_sqlite.shard_stats()
+
+def test_add_many_streaming(runtime_dir):
+    queue_sqlite.add({"asin": "AWIN000001"})
+    feed = ({"asin": f"AWIN{i:06d}"} for i in range(1, 1001))
+    assert queue_sqlite.add_many(feed, chunk_size=300) == (999, 1)
+    assert queue_sqlite.count() == 1000
+    assert queue_sqlite.add_many([{"asin": "AWIN000500"}, {"asin": "AWIN999999"}]) == (1, 1)
+
+def test_workers_concurrentes_sin_duplicados(runtime_dir):
+    db_file = queue_sqlite.QUEUE_DB_FILE
+    for i in range(60):
+        queue_sqlite.add({"asin": f"B0CONC{i:04d}"})
+    queue_sqlite.reload()
+
+    with multiprocessing.Manager() as manager:
+        results = manager.list()
+        workers = [multiprocessing.Process(target=_claim_all, args=(db_file, results)) for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        claimed = list(results)
+
+    assert len(claimed) == 60
+    assert len(set(claimed)) == 60
+    assert queue_sqlite.count() == 0
+
+
+def test_arranque_simultaneo_con_base_vacia(runtime_dir, monkeypatch):
+    for n in range(25):  # La carrera no sale en todos los arranques
+        db_file = str(runtime_dir / f"arranque_{n}.db")
+        monkeypatch.setattr(queue_sqlite, "QUEUE_DB_FILE", db_file)
+        queue_sqlite.reload()
+        assert _start_together(db_file) == []
+        queue_sqlite.reload()
+        # queue_stats cuadra con las filas: ningún proceso insertó antes de los triggers
+        assert queue_sqlite.count() == len(queue_sqlite.items()) == STARTERS
+
+
+def test_arranque_simultaneo_migra_una_base_antigua(runtime_dir, monkeypatch):
+    for n in range(25):
+        db_file = str(runtime_dir / f"arranque_{n}.db")
+        monkeypatch.setattr(queue_sqlite, "QUEUE_DB_FILE", db_file)
+        queue_sqlite.reload()
+        conn = sqlite3.connect(db_file)
+        conn.executescript("""
+            CREATE TABLE queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT INTO queue (payload, enqueued_at) VALUES ('{"asin": "B0OLD00001"}', 1);
+            INSERT INTO queue (payload, enqueued_at) VALUES ('{"asin": "B0OLD00002"}', 2);
+        """)
+        conn.close()
+        assert _start_together(db_file) == []
+        queue_sqlite.reload()
+        assert queue_sqlite.count() == len(queue_sqlite.items()) == STARTERS + 2
+        assert queue_sqlite.contains({"asin": "B0OLD00001"})
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test de records.py - formato JSONL para cola y logs de procesados
+Sin red: ficheros en un directorio temporal
+"""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import records
+
+
+def test_escritura_lectura_y_append(tmp_path):
+    path = str(tmp_path / "processed_products.json")
+    assert records.write_records(path, [{"asin": "B0REC00001", "title": "Taza ñandú"}]) == 1
+    records.append_records(path, [{"asin": "B0REC00002"}, {"asin": "B0REC00003"}])
+    assert [r["asin"] for r in records.iter_records(path)] == ["B0REC00001", "B0REC00002", "B0REC00003"]
+    assert records.count_records(path) == 3
+    with open(path, 'rb') as f:
+        assert f.read().count(b"\n") == 3  # Una línea por registro, sin indentar
+
+
+def test_array_legacy_y_conversion(tmp_path):
+    path = str(tmp_path / "processed_products.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{"asin": f"B0LEG0000{i}"} for i in range(4)], f, indent=2, ensure_ascii=False)
+    assert records.is_legacy(path)
+    assert records.count_records(path) == 4
+    before = os.path.getsize(path)
+
+    assert records.convert(path) == 4
+    assert not records.is_legacy(path)
+    assert os.path.getsize(path) < before
+    assert records.peek_records(path, 2) == [{"asin": "B0LEG00000"}, {"asin": "B0LEG00001"}]
+    # append sobre un array antiguo lo migra antes
+    legacy = str(tmp_path / "legacy_products.json")
+    with open(legacy, 'w', encoding='utf-8') as f:
+        json.dump([{"asin": "B0LEGACY01"}], f, indent=2)
+    records.append_records(legacy, [{"asin": "B0LEGACY02"}])
+    assert records.count_records(legacy) == 2
+
+
+def test_linea_incompleta_y_tail(tmp_path):
+    path = str(tmp_path / "processed_products.json")
+    records.write_records(path, ({"n": i} for i in range(1000)))
+    with open(path, 'ab') as f:
+        f.write(b'{"n": 10')  # Crash a mitad de escritura
+    assert records.count_records(path) == 1000
+    assert records.read_records(path)[-1] == {"n": 999}
+
+    old_chunk = records.READ_CHUNK
+    records.READ_CHUNK = 64  # Forzar varias lecturas hacia atrás
+    try:
+        assert records.tail_records(path, 3) == [{"n": 997}, {"n": 998}, {"n": 999}]
+    finally:
+        records.READ_CHUNK = old_chunk
+
+    assert records.trim_records(path, 5) == 5
+    assert [r["n"] for r in records.iter_records(path)] == [995, 996, 997, 998, 999]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test de retry_queue.py - reintentos diferidos, dead-letter y redrive
+Sin red: cola journal y ficheros en un directorio temporal
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import queue_store
+import retry_queue
+
+
+@pytest.fixture
+def retries(runtime_dir, monkeypatch):
+    monkeypatch.setattr(retry_queue, "MAX_RETRIES", 3)
+    monkeypatch.setattr(retry_queue, "RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(retry_queue, "RETRY_MAX_SECONDS", 600)
+
+
+def test_backoff_exponencial_con_tope(retries, monkeypatch):
+    monkeypatch.setattr(retry_queue, "RETRY_JITTER", 0)
+    assert [retry_queue.backoff_seconds(n) for n in (1, 2, 3, 4, 5)] == [60, 120, 240, 480, 600]
+
+
+def test_reintento_no_vuelve_antes_de_tiempo(retries):
+    queue_store.add({"asin": "B0RETRY001"})
+    product = queue_store.pop()
+    assert retry_queue.schedule(product, "timeout")
+    assert queue_store.count() == 0
+
+    assert retry_queue.promote_due() == 0  # Aún no ha vencido
+    assert queue_store.count() == 0
+    assert 40 < retry_queue.next_due_in() < 80
+
+    assert retry_queue.promote_due(now=time.time() + 3600) == 1
+    back = queue_store.pop()
+    assert (back["asin"], back["retry_count"], "not_before" in back) == ("B0RETRY001", 1, False)
+    assert retry_queue.counts() == (0, 0)
+
+
+def test_dead_letter_y_redrive(retries):
+    products = [{"asin": f"B0DEAD000{i}", "retry_count": 3} for i in range(3)]
+    assert not retry_queue.schedule(products[0], "HTTP 429")
+    assert not retry_queue.schedule(products[1], "JSON inválido")
+    assert not retry_queue.schedule(products[2], "HTTP 429")
+    assert retry_queue.counts() == (0, 3)
+
+    moved = retry_queue.redrive(lambda item: "429" in item["last_error"])
+    assert moved == 2
+    assert retry_queue.counts() == (0, 1)
+    assert sorted(p["asin"] for p in queue_store.items()) == ["B0DEAD0000", "B0DEAD0002"]
+    assert all(p["retry_count"] == 0 and "dead_at" not in p for p in queue_store.items())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test de state_store.py - locks entre procesos, escritura atómica y versiones
+Sin red: ficheros en un directorio temporal
+"""
+import os
+import sys
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import state_store
+
+
+def _increment(path, times):
+    for _ in range(times):
+        state_store.update(path, lambda data: {"n": data["n"] + 1}, {"n": 0})
+
+
+def test_update_concurrente_sin_perdidas(tmp_path):
+    path = str(tmp_path / "published_inventory.json")
+    workers = [multiprocessing.Process(target=_increment, args=(path, 50)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert state_store.read_json(path) == {"n": 200}
+    assert not [f for f in os.listdir(os.path.dirname(path)) if f.endswith(".tmp")]
+
+
+def test_save_optimista_detecta_conflicto(tmp_path):
+    path = str(tmp_path / "hunter_awin_state.json")
+    state_store.write_json(path, {"processed_ids": ["a"]})
+    mine, version = state_store.load(path)
+
+    other, other_version = state_store.load(path)
+    assert state_store.save(path, {"processed_ids": ["a", "b"]}, other_version)
+
+    mine["processed_ids"].append("c")
+    assert not state_store.save(path, mine, version)  # Otro proceso escribió antes
+    assert state_store.read_json(path) == {"processed_ids": ["a", "b"]}
+
+    current, version = state_store.load(path)
+    assert state_store.save(path, {"processed_ids": current["processed_ids"] + ["c"]}, version)
+
+
+def test_lock_reentrante(tmp_path):
+    path = str(tmp_path / "published_inventory.json")
+    with state_store.file_lock(path):
+        with state_store.file_lock(path):
+            state_store.update(path, lambda data: {"ok": True}, {})
+    assert state_store.read_json(path) == {"ok": True}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
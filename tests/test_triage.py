@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test de la criba de process_queue.py - ficha SEO solo para los aprobados
+Sin red: generate_many se sustituye por respuestas simuladas
+"""
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import process_queue
+
+
+def test_solo_los_aprobados_reciben_ficha_seo(runtime_dir, monkeypatch):
+    monkeypatch.setattr(process_queue, "TRIAGE_ENABLED", True)
+    titles = ["Pilas AA pack 4", "Kindle Paperwhite", "Cable HDMI 2m", "Lego Bonsái", "Taza blanca"]
+    products = [{"title": t, "price": "20"} for t in titles]
+    approved = {"Kindle Paperwhite": 8, "Lego Bonsái": 9, "Taza blanca": 4}
+    calls = {"triage": [], "seo": []}
+
+    def fake_generate_many(prompts, **kwargs):
+        responses = []
+        for prompt in prompts:
+            batch = [t for t in titles if f"{t} |" in prompt or f"{t}\n" in prompt]
+            if kwargs["max_output_tokens"] == process_queue.TRIAGE_MAX_OUTPUT_TOKENS:
+                calls["triage"].append(batch)
+                responses.append(json.dumps([{"i": n + 1, "ok": t in approved, "q": approved.get(t, 2),
+                                              "category": "Tech"} for n, t in enumerate(batch)]))
+            else:
+                calls["seo"].append(batch)
+                items = [{"i": n + 1, "ok": True, "q": approved[t], "category": "Lector"} for n, t in enumerate(batch)]
+                responses.append({"text": json.dumps(items), "finish_reason": "STOP", "output_tokens": 500})
+        return responses
+
+    monkeypatch.setattr(gemini_client, "generate_many", fake_generate_many)
+    results = process_queue.classify_products_with_gemini(products)
+    again = process_queue.classify_products_with_gemini(products)
+
+    # Una sola petición de criba con todos los títulos; ficha SEO solo para q >= 5
+    assert calls["triage"] == [titles]
+    assert sorted(t for batch in calls["seo"] for t in batch) == ["Kindle Paperwhite", "Lego Bonsái"]
+    assert [r["is_good_gift"] for r in results] == [False, True, False, True, False]
+    assert results[0]["source"] == "gemini-triage"
+    assert results[4]["gift_quality"] == 4
+    assert process_queue.token_stats["triaged"] == 5
+    assert process_queue.token_stats["triage_rejected"] == 3
+    assert again == results  # Segunda pasada: todo de caché
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
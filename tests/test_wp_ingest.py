@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test de wp_ingest.py - publicación en bloque contra el stub de api-ingest.php
+Sin red externa: ingest_stub.py escucha en 127.0.0.1 en un puerto libre
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ingest_stub
+import process_queue
+import wp_ingest
+import wp_limiter
+
+
+@pytest.fixture
+def stub(runtime_dir, monkeypatch):
+    """Arranca el stub con la configuración dada y apunta wp_ingest a él."""
+    monkeypatch.setattr(wp_ingest, "INGEST_BULK", True)
+    monkeypatch.setattr(wp_ingest, "INGEST_BULK_SIZE", 10)
+    monkeypatch.setattr(wp_ingest, "INGEST_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(wp_ingest, "INGEST_MAX_ATTEMPTS", 8)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 50.0)  # Sin esperas entre peticiones al stub
+    monkeypatch.setattr(wp_limiter, "WP_RATE_MIN", 50.0)
+    servers = []
+
+    def start(**config):
+        server, url = ingest_stub.start(**dict({
+            "latency": 0, "bulk": True, "rate_429": 0, "retry_after": 0.05, "rate_item_fail": 0, "seed": 1}, **config))
+        servers.append(server)
+        monkeypatch.setattr(wp_ingest, "WP_API_URL", url)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _products(n):
+    return [{"asin": f"B0TEST{i:04d}", "title": f"Producto {i}", "price": "30"} for i in range(n)]
+
+
+def test_bloques_y_reintento_solo_de_los_fallidos(stub):
+    stub(rate_item_fail=0.3)
+    results = wp_ingest.ingest_many(_products(25))
+    assert all(r["ok"] for r in results)
+    assert len(ingest_stub.posts) == 25
+    assert ingest_stub.stats["failed"] > 0  # Hubo fallos transitorios...
+    assert any(r["attempts"] > 1 for r in results)  # ...y solo esos se reenviaron
+    assert wp_ingest.stats["retried"] == ingest_stub.stats["failed"]
+    assert ingest_stub.stats["bulk_requests"] == wp_ingest.stats["requests"] < 25
+    assert len({r["post_id"] for r in results}) == 25
+
+
+def test_rechazo_permanente_no_se_reintenta(stub):
+    stub()
+    results = wp_ingest.ingest_many(_products(2) + [{"title": "Sin ASIN"}])
+    assert [r["ok"] for r in results] == [True, True, False]
+    assert results[2]["http_code"] == 400 and results[2]["attempts"] == 1
+    assert wp_ingest.stats["requests"] == 1
+
+
+def test_plugin_sin_bulk_vuelve_a_un_post_por_producto(stub):
+    stub(bulk=False)
+    results = wp_ingest.ingest_many(_products(4))
+    again = wp_ingest.ingest_one(_products(1)[0])  # Mismo ASIN: actualiza el mismo post
+    assert all(r["ok"] for r in results) and again["ok"]
+    assert wp_ingest._bulk_supported is False
+    assert ingest_stub.stats["bulk_requests"] == 0
+    assert ingest_stub.stats["created"] == 4 and ingest_stub.stats["updated"] == 1
+    assert again["post_id"] == results[0]["post_id"]
+
+
+def test_bloque_con_400_va_uno_a_uno_sin_apagar_el_bulk(stub):
+    stub()
+    bad_block = _products(9) + ["no es un producto"]
+    good_block = [dict(p, asin=p["asin"].replace("TEST", "GOOD")) for p in _products(10)]
+    results = wp_ingest.ingest_many(bad_block + good_block)
+    assert [r["ok"] for r in results] == [True] * 9 + [False] + [True] * 10
+    assert results[9]["http_code"] == 400 and results[9]["attempts"] == 1
+    assert wp_ingest._bulk_supported is True
+    # Bloque malo rechazado + 10 POST sueltos + bloque bueno en un POST
+    assert ingest_stub.stats["bulk_requests"] == 2 and wp_ingest.stats["requests"] == 12
+    assert len(ingest_stub.posts) == 19
+
+
+def test_429_respeta_retry_after(stub):
+    stub(rate_429=0.3)
+    results = wp_ingest.ingest_many(_products(30))
+    assert all(r["ok"] for r in results)
+    assert wp_ingest.stats["rate_limited"] == ingest_stub.stats["rate_limited"] > 0
+
+
+def test_publish_many_publica_aprobados_en_un_post(stub, monkeypatch):
+    stub()
+    classification = {"is_good_gift": True, "gift_quality": 8, "category": "Tech", "gender": "unisex"}
+    rejected = dict(classification, gift_quality=2)
+    classified = [(p, c) for p, c in zip(_products(4), [classification, rejected, classification, None])]
+    monkeypatch.setattr(process_queue, "add_back_to_queue", lambda product, reason="": None)
+    statuses = process_queue.publish_many(classified)
+    assert statuses == ["published", "rejected", "published", "retry"]
+    assert ingest_stub.stats["bulk_requests"] == 1 and len(ingest_stub.posts) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test de wp_limiter.py - ritmo AIMD compartido frente a WordPress
+Sin red externa: el stub de api-ingest.php escucha en 127.0.0.1
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ingest_stub
+import wp_ingest
+import wp_limiter
+
+
+@pytest.fixture
+def limiter(runtime_dir, monkeypatch):
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 10.0)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_MIN", 1.0)
+    monkeypatch.setattr(wp_limiter, "WP_RATE_MAX", 50.0)
+
+
+def _throttle_and_exit(path, seconds):
+    wp_limiter.WP_RATE_FILE = path
+    wp_limiter.record(429, 0.1, retry_after=seconds)
+
+
+def test_sube_con_respuestas_sanas_y_baja_a_la_mitad_con_429(limiter):
+    for _ in range(20):
+        wp_limiter.record(200, 0.05)
+    ramped = wp_limiter.status()["rate"]
+    assert abs(ramped - (10 + 20 * wp_limiter.WP_RATE_INCREASE)) < 1e-6
+    assert wp_limiter.record(429, 0.05) == ramped * wp_limiter.WP_RATE_DECREASE
+    assert wp_limiter.record(503, 0.05) == ramped * wp_limiter.WP_RATE_DECREASE ** 2
+    for _ in range(10):
+        wp_limiter.record(None, 30)  # Timeouts: nunca por debajo del mínimo
+    assert wp_limiter.status()["rate"] == wp_limiter.WP_RATE_MIN
+    assert wp_limiter.status()["throttled"] == 12
+
+
+def test_latencia_alta_frena_pero_un_bloque_se_mide_por_producto(limiter):
+    assert wp_limiter.record(200, wp_limiter.WP_LATENCY_TARGET * 2) == 10 * wp_limiter.WP_RATE_SLOW
+    # 25 productos en 6s es rápido: sube
+    assert wp_limiter.record(200, wp_limiter.WP_LATENCY_TARGET * 2, units=25) > 10 * wp_limiter.WP_RATE_SLOW
+
+
+def test_acquire_espacia_las_peticiones_al_ritmo_actual(limiter, monkeypatch):
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 20.0)
+    start = time.monotonic()
+    for _ in range(6):
+        wp_limiter.acquire()
+    assert time.monotonic() - start >= 5 / 20 - 0.01
+
+
+def test_retry_after_de_otro_proceso_pausa_a_todos(limiter):
+    worker = multiprocessing.Process(target=_throttle_and_exit, args=(wp_limiter.WP_RATE_FILE, 0.5))
+    worker.start()
+    worker.join()
+    assert wp_limiter.status()["cooldown_for"] > 0.3
+    start = time.monotonic()
+    wp_limiter.acquire()
+    assert time.monotonic() - start >= 0.3
+    wp_limiter.reset()
+    assert wp_limiter.status()["rate"] == 10.0 and wp_limiter.status()["cooldown_for"] == 0
+
+
+def test_wp_ingest_informa_al_limitador(limiter, monkeypatch):
+    monkeypatch.setattr(wp_limiter, "WP_RATE_INITIAL", 30.0)
+    monkeypatch.setattr(wp_ingest, "INGEST_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(wp_ingest, "INGEST_MAX_ATTEMPTS", 8)
+    server, url = ingest_stub.start(latency=0, bulk=False, rate_429=0.3, retry_after=0.05, rate_item_fail=0, seed=3)
+    monkeypatch.setattr(wp_ingest, "WP_API_URL", url)
+    try:
+        results = wp_ingest.ingest_many([{"asin": f"B0RATE{i:04d}", "title": f"Producto {i}"} for i in range(20)])
+    finally:
+        server.shutdown()
+    assert all(r["ok"] for r in results)
+    status = wp_limiter.status()
+    assert status["throttled"] == ingest_stub.stats["rate_limited"] > 0
+    assert status["requests"] == ingest_stub.stats["requests"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -2,10 +2,14 @@
 """
 Verificar calidad de datos de Gemini
 """
-import json
+import os
+import sys
 
-with open('processed_products.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import records
+
+data = records.read_records('processed_products.json')
 
 # Filtrar publicados
 published = [p for p in data if p.get('ai_result', {}).get('status') == 'published']
@@ -1,44 +1,52 @@
 #!/usr/bin/env python3
 """
 Verificar estado de la cola de productos pendientes
+
+Cuenta y muestra productos sin cargar la cola entera. El desglose por
+categorías sí recorre toda la cola: python tools/check_queue.py --categorias
 """
-import json
 import os
+import sys
+import argparse
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import queue_store
+
 def main():
-    queue_file = 'pending_products.json'
-    if not os.path.exists(queue_file):
-        print('❌ No hay archivo pending_products.json')
-        return
-    
-    with open(queue_file, 'r', encoding='utf-8') as f:
-        products = json.load(f)
-    
-    print(f'📦 PRODUCTOS EN COLA: {len(products)}')
-    
-    if len(products) == 0:
+    parser = argparse.ArgumentParser(description='Estado de la cola de productos pendientes')
+    parser.add_argument('--categorias', action='store_true', help='Desglose por categorías (lee toda la cola)')
+    args = parser.parse_args()
+
+    total = queue_store.quick_count()
+    print(f'📦 PRODUCTOS EN COLA: {total}')
+
+    if total == 0:
         print('✅ La cola está vacía')
         return
-    
-    print(f'▶️ Último agregado: {products[-1]["title"][:80]}...')
-    
+
+    last = queue_store.peek(1, newest=True)
+    if last:
+        print(f'▶️ Último agregado: {last[0]["title"][:80]}...')
+
     # Contar por categorías
-    categories = {}
-    for p in products:
-        cat = p.get('category', 'Sin categoría')
-        categories[cat] = categories.get(cat, 0) + 1
-    
-    print('\n📊 Por categorías:')
-    for cat, count in sorted(categories.items()):
-        print(f'  - {cat}: {count}')
-    
+    if args.categorias:
+        categories = {}
+        for p in queue_store.items():
+            cat = p.get('category', 'Sin categoría')
+            categories[cat] = categories.get(cat, 0) + 1
+
+        print('\n📊 Por categorías:')
+        for cat, count in sorted(categories.items()):
+            print(f'  - {cat}: {count}')
+
     print(f'\n🔍 Primeros 3 productos:')
-    for i, p in enumerate(products[:3]):
+    for i, p in enumerate(queue_store.peek(3)):
         print(f'  {i+1}. [{p.get("category", "?")}] {p["title"][:60]}...')
-    
-    if len(products) > 3:
-        print(f'  ... y {len(products) - 3} más')
+
+    if total > 3:
+        print(f'  ... y {total - 3} más')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -2,10 +2,16 @@
 """
 Verificar productos en WordPress y el rate limit
 """
+import os
+import sys
 import requests
 import json
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import wp_limiter
+
 def check_wordpress_products():
     """Verificar productos en WordPress de hoy"""
     url = 'https://giftia.es/wp-json/wp/v2/gf_gift'
@@ -16,7 +22,7 @@ def check_wordpress_products():
     }
 
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = wp_limiter.request("GET", url, params=params, timeout=30)
         print(f'Status: {response.status_code}')
         
         if response.status_code == 200:
@@ -65,6 +71,8 @@ def reset_rate_limit():
         
         if response.status_code == 200:
             print('✅ Rate limit reseteado exitosamente')
+            wp_limiter.reset()  # Nuestro ritmo también vuelve al inicial
+            print(f'🚦 Ritmo local de WordPress: {wp_limiter.WP_RATE_INITIAL:g} pet/s')
             return True
         else:
             print(f'❌ Error reseteando: {response.status_code}')
@@ -76,6 +84,9 @@ def reset_rate_limit():
 
 def main():
     print('=== DIAGNÓSTICO WORDPRESS ===')
+    limiter = wp_limiter.status()
+    print(f"🚦 Ritmo local: {limiter['rate']:.2f} pet/s, {limiter['throttled']} frenadas"
+          + (f", pausa {limiter['cooldown_for']:.0f}s" if limiter['cooldown_for'] else ''))
     has_products = check_wordpress_products()
     
     print('\n=== RESET RATE LIMIT ===')
@@ -8,23 +8,29 @@ y los procesa con Gemini para generar todo el contenido SEO v51.
 """
 
 import os
+import re
+import sys
 import json
-import time
-import requests
 from datetime import date, timedelta
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import classification_cache
+import gemini_client
+import payload_hashes
+import wp_limiter
+
 # Cargar .env
 load_dotenv()
 
 # Configuración
 WP_API_URL = "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php"
 WP_TOKEN = os.getenv("WP_API_TOKEN", "nu27OrX2t5VZQmrGXfoZk3pbcS97yiP5")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
-# Pacing para no saturar APIs
-GEMINI_PACING_SECONDS = 3  # 20 RPM, muy conservador
-WORDPRESS_PACING_SECONDS = 2  # 30 RPM
+# Sin pacing fijo: Gemini lo controla el token bucket de gemini_client y WordPress wp_limiter
+GEMINI_OPTIONS = {"temperature": 0.3, "max_output_tokens": 2500, "timeout": 45}
+PROMPT_VERSION = "seo-fix-v51"  # Subir al cambiar el prompt (invalida la caché)
 
 def get_products_without_seo():
     """Obtener productos de hoy sin SEO."""
@@ -48,7 +54,7 @@ def get_products_without_seo():
         }
         
         try:
-            response = requests.get(base_url, params=params, timeout=30)
+            response = wp_limiter.request("GET", base_url, params=params, timeout=30)
             
             if response.status_code != 200:
                 print(f"Error obteniendo página {page}: {response.status_code}")
@@ -102,8 +108,11 @@ def get_products_without_seo():
 
 def generate_seo_with_gemini(title, price, asin):
     """Generar contenido SEO v51 con Gemini."""
-    
-    prompt = f"""Eres el curador premium de Giftia.es, experto en crear contenido SEO que convierte visitantes en compradores.
+    return parse_seo_response(gemini_client.generate(build_seo_prompt(title, price), **GEMINI_OPTIONS))
+
+def build_seo_prompt(title, price):
+    """Prompt de clasificación + SEO v51 para un producto."""
+    return f"""Eres el curador premium de Giftia.es, experto en crear contenido SEO que convierte visitantes en compradores.
 
 PRODUCTO: {title}
 PRECIO: {price}€
@@ -152,47 +161,22 @@ IMPORTANTE:
 - Crear DESEO, no solo informar
 - SEO natural optimizado para conversión"""
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.3,
-            "maxOutputTokens": 2500
-        }
-    }
-    
+def parse_seo_response(text_response):
+    """JSON de Gemini (sin markdown) o None."""
+    if not text_response:
+        return None
     try:
-        response = requests.post(url, json=payload, timeout=45)
-        
-        if response.status_code == 429:
-            print(f"⚠️ Gemini rate limit, esperando 60s...")
-            time.sleep(60)
-            response = requests.post(url, json=payload, timeout=45)
-        
-        if response.status_code != 200:
-            print(f"❌ Gemini error {response.status_code}: {response.text[:200]}")
-            return None
-            
-        data = response.json()
-        text_response = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        
         # Limpiar respuesta
         text_response = text_response.strip()
         if text_response.startswith("```"):
-            import re
             text_response = re.sub(r'^```json?\s*', '', text_response)
             text_response = re.sub(r'\s*```$', '', text_response)
         
-        result = json.loads(text_response)
-        return result
+        return json.loads(text_response)
         
     except json.JSONDecodeError as e:
         print(f"❌ JSON inválido: {text_response[:200]}")
         return None
-    except Exception as e:
-        print(f"❌ Error Gemini: {e}")
-        return None
 
 def update_product_with_seo(product_id, asin, price, seo_data):
     """Actualizar producto en WordPress."""
@@ -206,6 +190,10 @@ def update_product_with_seo(product_id, asin, price, seo_data):
         **seo_data
     }
     
+    if payload_hashes.unchanged("seo", update_payload, post_id=product_id):
+        print(f"  ♻️ Sin cambios, no se reenvía")
+        return True
+    
     headers = {
         'Content-Type': 'application/json',
         'X-GIFTIA-TOKEN': WP_TOKEN,
@@ -213,14 +201,15 @@ def update_product_with_seo(product_id, asin, price, seo_data):
     }
     
     try:
-        response = requests.post(
-            WP_API_URL,
+        response = wp_limiter.request(
+            "POST", WP_API_URL,
             data=json.dumps(update_payload, ensure_ascii=False).encode('utf-8'),
             headers=headers,
             timeout=30
         )
         
         if response.status_code == 200:
+            payload_hashes.remember("seo", update_payload, post_id=product_id)
             return True
         else:
             print(f"❌ Error WP {response.status_code}: {response.text[:200]}")
@@ -245,7 +234,7 @@ def main():
     
     # 2. Confirmar antes de procesar
     print(f"\n⚠️  Esto procesará {len(products)} productos con Gemini")
-    print(f"⏱️  Tiempo estimado: {len(products) * (GEMINI_PACING_SECONDS + WORDPRESS_PACING_SECONDS) / 60:.1f} minutos")
+    print(f"⏱️  Tiempo estimado: {len(products) / wp_limiter.status()['rate'] / 60:.1f} minutos (WordPress marca el ritmo)")
     
     confirm = input("\n¿Continuar? (s/N): ").lower().strip()
     if confirm != 's':
@@ -258,14 +247,11 @@ def main():
     failed = 0
     
     print(f"\n🧠 Iniciando procesamiento...")
-    print(f"⏱️ Pacing: {GEMINI_PACING_SECONDS}s Gemini + {WORDPRESS_PACING_SECONDS}s WordPress")
+    print(f"⏱️ Pacing: Gemini {gemini_client.GEMINI_CONCURRENCY} en vuelo (token bucket) + WordPress adaptativo ({wp_limiter.status()['rate']:.2f} pet/s)")
     print("─" * 60)
     
-    for i, product in enumerate(products):
-        # Obtener datos del producto con precio válido
-        product_id = product['id']
+    for product in products:
         title = product['title']
-        asin = product['asin']
         price = product.get('price', 0)
         
         # Si precio es 0, usar precio por defecto basado en título
@@ -278,38 +264,52 @@ def main():
                 price = 19.99
             else:
                 price = 39.99
+        product['price'] = price
+    
+    # Generar SEO con Gemini por bloques, con varias peticiones en vuelo
+    block_size = gemini_client.GEMINI_CONCURRENCY
+    for start in range(0, len(products), block_size):
+        block = products[start:start + block_size]
+        cached = [classification_cache.get(p['title'], p['price'], PROMPT_VERSION) for p in block]
+        responses = iter(gemini_client.generate_many(
+            [build_seo_prompt(p['title'], p['price']) for p, c in zip(block, cached) if c is None],
+            **GEMINI_OPTIONS))
         
-        progress = f"[{i+1}/{len(products)}]"
-        print(f"\n{progress} ID {product_id}: {title[:50]}...")
-        
-        # Generar SEO con Gemini
-        seo_data = generate_seo_with_gemini(title, price, asin)
-        
-        if not seo_data or not seo_data.get('is_good_gift', False):
-            print(f"  ⚠️ Gemini rechazó el producto")
-            failed += 1
-            time.sleep(1)  # Breve pausa
-            continue
-        
-        print(f"  ✅ SEO generado: {seo_data.get('seo_title', '')[:40]}...")
-        
-        # Actualizar en WordPress
-        if update_product_with_seo(product_id, asin, price, seo_data):
-            print(f"  ✅ WordPress actualizado")
-            success += 1
-        else:
-            print(f"  ❌ Error actualizando WordPress")
-            failed += 1
-        
-        processed += 1
-        
-        # Mostrar progreso cada 10
-        if processed % 10 == 0:
-            print(f"\n📊 Progreso: {processed}/{len(products)} | ✅ {success} éxito | ❌ {failed} fallos")
-        
-        # Pacing para APIs
-        time.sleep(GEMINI_PACING_SECONDS)
-        time.sleep(WORDPRESS_PACING_SECONDS)
+        for i, (product, seo_data) in enumerate(zip(block, cached), start):
+            product_id = product['id']
+            title = product['title']
+            asin = product['asin']
+            price = product['price']
+            
+            progress = f"[{i+1}/{len(products)}]"
+            print(f"\n{progress} ID {product_id}: {title[:50]}...")
+            
+            if seo_data is None:
+                seo_data = parse_seo_response(next(responses))
+                classification_cache.put(title, price, PROMPT_VERSION, seo_data)
+            else:
+                print(f"  💾 SEO desde caché")
+            
+            if not seo_data or not seo_data.get('is_good_gift', False):
+                print(f"  ⚠️ Gemini rechazó el producto")
+                failed += 1
+                continue
+            
+            print(f"  ✅ SEO generado: {seo_data.get('seo_title', '')[:40]}...")
+            
+            # Actualizar en WordPress
+            if update_product_with_seo(product_id, asin, price, seo_data):
+                print(f"  ✅ WordPress actualizado")
+                success += 1
+            else:
+                print(f"  ❌ Error actualizando WordPress")
+                failed += 1
+            
+            processed += 1
+            
+            # Mostrar progreso cada 10
+            if processed % 10 == 0:
+                print(f"\n📊 Progreso: {processed}/{len(products)} | ✅ {success} éxito | ❌ {failed} fallos")
     
     print(f"\n" + "="*60)
     print(f"🏆 COMPLETADO")
@@ -317,6 +317,8 @@ def main():
     print(f"   Éxitos: {success}")
     print(f"   Fallos: {failed}")
     print(f"   Tasa de éxito: {(success/max(processed,1)*100):.1f}%")
+    print(f"   {classification_cache.report()}")
+    print(f"   {payload_hashes.report()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -12,22 +12,24 @@ Uso: python fix_seo_today.py
 """
 
 import os
+import sys
 import json
-import time
-import requests
 from datetime import datetime, date
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gemini_client
+import payload_hashes
+import wp_limiter
+
 # Cargar .env
 load_dotenv()
 
 # Configuración
 WP_API_URL = "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php"
 WP_TOKEN = os.getenv("WP_API_TOKEN", "nu27OrX2t5VZQmrGXfoZk3pbcS97yiP5")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-
-GEMINI_PACING_SECONDS = 2
-WORDPRESS_PACING_SECONDS = 1
+# Sin pacing fijo: Gemini lo controla el token bucket de gemini_client y WordPress wp_limiter
 
 def check_products_today():
     """Verificar qué productos hay de hoy en WordPress."""
@@ -112,31 +114,13 @@ CRITERIOS:
 - Generar DESEO no solo informar
 """
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.3,
-            "maxOutputTokens": 2000
-        }
-    }
+    # Cliente compartido: pool de keys, token bucket y reintentos ante 429
+    text_response = gemini_client.generate(prompt, temperature=0.3, max_output_tokens=2000, timeout=30)
+    if not text_response:
+        print(f"❌ Gemini sin respuesta")
+        return None
     
     try:
-        response = requests.post(url, json=payload, timeout=30)
-        
-        if response.status_code == 429:
-            print(f"⚠️ Gemini rate limit, esperando 60s...")
-            time.sleep(60)
-            response = requests.post(url, json=payload, timeout=30)
-        
-        if response.status_code != 200:
-            print(f"❌ Gemini error {response.status_code}: {response.text[:200]}")
-            return None
-            
-        data = response.json()
-        text_response = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        
         # Limpiar respuesta
         text_response = text_response.strip()
         if text_response.startswith("```"):
@@ -165,14 +149,18 @@ def update_product_seo(asin, seo_data):
         **seo_data
     }
     
+    if payload_hashes.unchanged("seo", update_data):
+        print(f"♻️ Sin cambios: {asin}")
+        return True
+    
     headers = {
         'Content-Type': 'application/json',
         'X-GIFTIA-TOKEN': WP_TOKEN
     }
     
     try:
-        response = requests.post(
-            WP_API_URL,
+        response = wp_limiter.request(
+            "POST", WP_API_URL,
             data=json.dumps(update_data, ensure_ascii=False).encode('utf-8'),
             headers=headers,
             timeout=30
@@ -180,6 +168,7 @@ def update_product_seo(asin, seo_data):
         
         if response.status_code == 200:
             print(f"✅ WordPress actualizado: {asin}")
+            payload_hashes.remember("seo", update_data)
             return True
         else:
             print(f"❌ Error WordPress {response.status_code}: {response.text[:200]}")
@@ -247,16 +236,11 @@ def main():
             # Actualizar en WordPress
             if update_product_seo(asin, seo_data):
                 processed += 1
-            
-            # Pacing
-            time.sleep(WORDPRESS_PACING_SECONDS)
         else:
             print(f"⚠️ Gemini rechazó el producto")
-        
-        # Pacing para Gemini
-        time.sleep(GEMINI_PACING_SECONDS)
     
     print(f"\n🏆 COMPLETADO: {processed} productos actualizados con SEO v51")
+    print(payload_hashes.report())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,22 +6,28 @@ Toma productos sin taxonomías completas, los pasa por Gemini y actualiza WordPr
 import json
 import os
 import re
+import sys
 import requests
 import time
 from dotenv import load_dotenv
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import classification_cache
+import gemini_client
+
 load_dotenv()
 
 print("="*70)
 print("REPROCESADOR DE PRODUCTOS - Giftia v51")
 print("="*70)
 
-# Configuracion
-API_KEY = os.getenv('GEMINI_API_KEY')
+# Configuracion (Gemini: keys y limites en gemini_client)
 WP_API_URL = os.getenv('WP_API_URL')
 WP_TOKEN = os.getenv('WP_API_TOKEN')
 AMAZON_TAG = os.getenv('AMAZON_TAG', 'GIFTIA-21')
+PROMPT_VERSION = "reprocess-v51"  # Subir al cambiar el prompt (invalida la cache)
 
 # Cargar schema
 with open('giftia_schema.json', 'r', encoding='utf-8') as f:
@@ -52,7 +58,11 @@ def get_product_details(post_id):
     return None
 
 def classify_with_gemini(title, price="0"):
-    """Clasificar producto con Gemini"""
+    """Clasificar producto con Gemini (o cache si ya se clasifico con este prompt)"""
+    cached = classification_cache.get(title, price, PROMPT_VERSION)
+    if cached:
+        return cached
+    
     prompt = f"""Clasifica este producto como regalo:
 
 PRODUCTO: {title}
@@ -68,31 +78,18 @@ Responde JSON:
 
 SOLO JSON."""
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    
-    for attempt in range(3):  # 3 reintentos
+    # Cliente compartido: token bucket RPM/TPM, rotacion de keys y reintentos en 429
+    text = gemini_client.generate(prompt, temperature=0.4, max_output_tokens=8192, timeout=90)
+    if not text:
+        return None
+    json_match = re.search(r'\{[\s\S]*\}', text)
+    if json_match:
         try:
-            response = requests.post(url, json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0.4, "maxOutputTokens": 8192}
-            }, timeout=90)
-            
-            if response.status_code == 200:
-                text = response.json().get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                json_match = re.search(r'\{[\s\S]*\}', text)
-                if json_match:
-                    return json.loads(json_match.group())
-            elif response.status_code == 429:  # Rate limit
-                print(f"    Rate limit, esperando 30s...")
-                time.sleep(30)
-                continue
-        except requests.exceptions.Timeout:
-            print(f"    Timeout, reintentando ({attempt+1}/3)...")
-            time.sleep(5)
-        except Exception as e:
-            print(f"    Error Gemini: {e}")
-            time.sleep(5)
-    
+            classification = json.loads(json_match.group())
+            classification_cache.put(title, price, PROMPT_VERSION, classification)
+            return classification
+        except json.JSONDecodeError as e:
+            print(f"    JSON invalido: {e}")
     return None
 
 def send_to_wordpress(product):
@@ -243,4 +240,5 @@ print("REPROCESAMIENTO COMPLETADO")
 print(f"Procesados: {stats['procesados']}")
 print(f"Exitosos: {stats['exitosos']}")
 print(f"Errores: {stats['errores']}")
+print(classification_cache.report())
 print("="*70)
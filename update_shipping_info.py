@@ -18,6 +18,8 @@ import requests
 from datetime import datetime
 from dotenv import load_dotenv
 
+import queue_store
+
 # Cargar configuración
 load_dotenv()
 
@@ -227,16 +229,9 @@ def scan_local_database():
     Alternativa: escanear directamente la base de datos local de productos
     pendientes para detectar los que necesitan actualización de envío
     """
-    pending_file = 'pending_products.json'
-    if not os.path.exists(pending_file):
-        return []
-    
-    with open(pending_file, 'r', encoding='utf-8') as f:
-        products = json.load(f)
-    
     # Filtrar los que no tienen info de envío
     needs_update = []
-    for p in products:
+    for p in queue_store.items():
         if 'is_prime' not in p or p.get('is_prime') is None:
             needs_update.append(p)
     
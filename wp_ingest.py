@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente de api-ingest.php: publica muchos productos por petición.
+
+Antes cada producto era un POST y luego time.sleep(WP_PACING_SECONDS),
+saliera bien o mal: unos 12 productos por minuto por rápido que fuera
+Gemini.
+
+- ingest_many(products): trocea en bloques de WP_INGEST_BULK_SIZE y manda
+  cada bloque en un solo POST a api-ingest.php?action=bulk_ingest con
+  {"products": [...]}. La respuesta trae un resultado por producto
+  {"index", "success", "post_id", "code", "error"}: solo se reintentan los
+  que fallaron con un error transitorio (429, 5xx), no el bloque entero.
+- Un 429 del bloque espera lo que diga Retry-After; timeouts y 5xx se
+  reintentan con backoff exponencial hasta WP_INGEST_MAX_ATTEMPTS.
+- El ritmo de peticiones lo marca wp_limiter.py (compartido con el resto
+  de clientes de WordPress): sube mientras WordPress responde bien y baja
+  con los 429/5xx.
+- Si el endpoint no conoce action=bulk_ingest (404/405/501 o un 200 sin
+  "results") se vuelve a un POST por producto para el resto del proceso.
+  WP_INGEST_BULK=0 fuerza ese modo. Un 400 es culpa del bloque (algún
+  producto mal formado), no del endpoint: ese bloque va uno a uno y los
+  siguientes siguen en bloque.
+- ingest_one(product): lo mismo para un producto suelto.
+- Un producto publicado entero deja obsoletos los hashes de las
+  herramientas de mantenimiento (payload_hashes.py): se olvidan.
+
+Resultado por producto: {"ok", "http_code", "post_id", "error", "attempts",
+"retryable"}. retryable = falló por algo transitorio (WordPress no llegó a
+contestar de verdad): quien lo llama puede volver a intentarlo más tarde.
+Para pruebas sin WordPress: ingest_stub.py.
+"""
+
+import os
+import json
+import time
+import logging
+from dotenv import load_dotenv
+
+import payload_hashes
+import wp_limiter
+
+load_dotenv()
+
+logger = logging.getLogger("WPIngest")
+
+# Configuración
+WP_API_URL = os.getenv("WP_API_URL", "https://giftia.es/wp-content/plugins/giftfinder-core/api-ingest.php")
+WP_TOKEN = os.getenv("WP_API_TOKEN", "nu27OrX2t5VZQmrGXfoZk3pbcS97yiP5")  # Fallback para desarrollo (el del hunter)
+INGEST_BULK = os.getenv("WP_INGEST_BULK", "1") != "0"
+INGEST_BULK_SIZE = int(os.getenv("WP_INGEST_BULK_SIZE", "25"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("WP_INGEST_MAX_ATTEMPTS", "4"))
+INGEST_TIMEOUT = 60            # Un bloque tarda más que un producto suelto
+INGEST_RETRY_BACKOFF = 2       # Segundos del primer reintento (se dobla)
+INGEST_RETRY_BACKOFF_MAX = 60
+USER_AGENT = "GiftiaQueueProcessor/2.0"
+
+stats = {"requests": 0, "published": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+
+_bulk_supported = None  # None = sin probar todavía
+
+
+def _headers(user_agent=None):
+    return {
+        'Content-Type': 'application/json',
+        'X-GIFTIA-TOKEN': WP_TOKEN,
+        'User-Agent': user_agent or USER_AGENT,
+    }
+
+def _transient(code):
+    return code is None or code == 429 or code >= 500
+
+def _backoff(attempt):
+    return min(INGEST_RETRY_BACKOFF_MAX, INGEST_RETRY_BACKOFF * 2 ** attempt)
+
+
+# ============================================================================
+# ENVÍO
+# ============================================================================
+
+def _post_one(product, user_agent=None):
+    """Un producto por POST (modo clásico). Retorna (resultado, segundos de Retry-After o None)."""
+    try:
+        response = wp_limiter.request("POST", WP_API_URL, data=json.dumps(product, ensure_ascii=False).encode('utf-8'),
+                                      headers=_headers(user_agent), timeout=15)
+    except Exception as e:
+        return {"ok": False, "http_code": None, "error": str(e)}, None
+    stats["requests"] += 1
+    stats["rate_limited"] += response.status_code == 429
+    # WordPress a veces devuelve 500 pero el producto sí se guarda
+    if response.status_code == 200 or '"success":true' in response.text:
+        try:
+            post_id = response.json().get("post_id")
+        except (ValueError, AttributeError):
+            post_id = None
+        return {"ok": True, "http_code": response.status_code, "post_id": post_id}, None
+    return ({"ok": False, "http_code": response.status_code, "error": response.text[:200]},
+            wp_limiter.parse_retry_after(response) if response.status_code == 429 else None)
+
+def _post_bulk(products, user_agent=None):
+    """Un bloque por POST. Retorna (resultados por producto o None si no hay bulk, código, Retry-After)."""
+    global _bulk_supported
+    try:
+        response = wp_limiter.request("POST", f"{WP_API_URL}?action=bulk_ingest", units=len(products),
+                                      data=json.dumps({"products": products}, ensure_ascii=False).encode('utf-8'),
+                                      headers=_headers(user_agent), timeout=INGEST_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"⚠️ Excepción WP bulk: {e}")
+        return None, None, None
+    stats["requests"] += 1
+    stats["rate_limited"] += response.status_code == 429
+    if response.status_code == 400:
+        logger.warning(f"⚠️ Bloque de {len(products)} rechazado (400): se envía uno a uno - {response.text[:100]}")
+        return None, 400, None
+    if response.status_code in (404, 405, 501):
+        _bulk_supported = False
+        logger.warning(f"⚠️ api-ingest.php sin action=bulk_ingest ({response.status_code}): un POST por producto")
+        return None, response.status_code, None
+    if response.status_code != 200:
+        return None, response.status_code, wp_limiter.parse_retry_after(response) if response.status_code == 429 else None
+    try:
+        items = response.json().get("results")
+    except (ValueError, AttributeError):
+        items = None
+    if not isinstance(items, list):
+        _bulk_supported = False
+        logger.warning("⚠️ Respuesta bulk sin 'results': un POST por producto")
+        return None, response.status_code, None
+    _bulk_supported = True
+
+    results = [None] * len(products)
+    for position, item in enumerate(items):
+        index = item.get("index", position)
+        if isinstance(index, int) and 0 <= index < len(products):
+            results[index] = {"ok": bool(item.get("success")), "http_code": item.get("code", 200 if item.get("success") else 500),
+                              "post_id": item.get("post_id"), "error": item.get("error", "")}
+    # Un producto sin resultado se trata como fallo transitorio
+    return [r or {"ok": False, "http_code": None, "error": "sin resultado en la respuesta"} for r in results], 200, None
+
+def _send(products, user_agent=None):
+    """Envía un bloque (o uno a uno sin bulk). Retorna (resultados, segundos de Retry-After o None)."""
+    if INGEST_BULK and _bulk_supported is not False:
+        results, code, retry_after = _post_bulk(products, user_agent)
+        if results is not None:
+            return results, retry_after
+        if code != 400 and _bulk_supported is not False:
+            return [{"ok": False, "http_code": code, "error": f"bloque falló ({code})"}] * len(products), retry_after
+    results, waits = [], []
+    for product in products:
+        result, retry_after = _post_one(product, user_agent)
+        results.append(result)
+        waits.append(retry_after or 0)
+    return results, max(waits, default=0) or None
+
+def ingest_many(products, user_agent=None):
+    """Publica los productos en WordPress. Retorna un resultado por producto, en orden."""
+    results = [{"ok": False, "http_code": None, "error": "sin enviar", "attempts": 0}] * len(products)
+    pending = list(range(len(products)))
+    wait = 0
+    for attempt in range(INGEST_MAX_ATTEMPTS):
+        if attempt:
+            delay = wait or _backoff(attempt - 1)
+            logger.info(f"⏳ {len(pending)} productos sin publicar, reintento en {delay:.0f}s")
+            time.sleep(delay)
+            stats["retried"] += len(pending)
+        wait = 0
+        retry = []
+        for start in range(0, len(pending), INGEST_BULK_SIZE):
+            chunk = pending[start:start + INGEST_BULK_SIZE]
+            chunk_results, retry_after = _send([products[i] for i in chunk], user_agent)
+            wait = max(wait, retry_after or 0)
+            for i, result in zip(chunk, chunk_results):
+                results[i] = dict(result, attempts=attempt + 1)
+                if not result["ok"] and _transient(result.get("http_code")):
+                    retry.append(i)
+        pending = retry
+        if not pending:
+            break
+
+    results = [dict(r, retryable=not r["ok"] and _transient(r.get("http_code"))) for r in results]
+    for product, result in zip(products, results):
+        if result["ok"]:
+            payload_hashes.forget(product, result.get("post_id"))
+    stats["published"] += sum(1 for r in results if r["ok"])
+    stats["failed"] += sum(1 for r in results if not r["ok"])
+    return results
+
+def ingest_one(product, user_agent=None):
+    """Publica un producto suelto (con los mismos reintentos)."""
+    return ingest_many([product], user_agent)[0]
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limitador adaptativo (AIMD) compartido por todos los clientes de WordPress.
+
+Antes cada script tenía su sleep fijo entre peticiones (WP_PACING_SECONDS
+en process_queue.py, 0.1s en inventory_sync.py, 1-2s en recover_asins.py y
+en las herramientas de SEO). Demasiado lento cuando WordPress va holgado y
+demasiado rápido cuando va cargado: acabábamos disparando su rate limit y
+reseteándolo a mano (tools/check_wp_status.py).
+
+- Un solo ritmo (peticiones por segundo) para todo WordPress, en
+  wp_rate_state.json bajo el lock de state_store: lo comparten el
+  procesador, el hunter y las herramientas aunque corran a la vez.
+- acquire(): reserva el siguiente hueco (1/ritmo después del anterior) y
+  espera hasta él.
+- record(código, latencia): respuesta sana y rápida → el ritmo sube
+  WP_RATE_INCREASE (aditivo). 429, 5xx o error de red → el ritmo se
+  multiplica por WP_RATE_DECREASE. Respuesta sana pero lenta (más de
+  WP_LATENCY_TARGET segundos por unidad) → baja un poco (WP_RATE_SLOW).
+- Retry-After (429/503) bloquea a todos los procesos hasta que pase.
+- request(method, url, **kwargs): requests.request con acquire + record.
+
+Uso:
+    python wp_limiter.py              # Ritmo actual
+    python wp_limiter.py --reset      # Volver al ritmo inicial (tras resetear el limitador del servidor)
+"""
+
+import os
+import sys
+import time
+import logging
+import requests
+
+import state_store
+
+logger = logging.getLogger("WPLimiter")
+
+# Configuración
+WP_RATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wp_rate_state.json")
+WP_RATE_INITIAL = float(os.getenv("WP_RATE_INITIAL", "1"))   # Peticiones por segundo al arrancar
+WP_RATE_MIN = float(os.getenv("WP_RATE_MIN", "0.1"))         # Nunca más lento que una cada 10s
+WP_RATE_MAX = float(os.getenv("WP_RATE_MAX", "10"))
+WP_RATE_INCREASE = 0.05       # Peticiones/s que se suman por respuesta sana
+WP_RATE_DECREASE = 0.5        # Factor tras un 429/5xx/error de red
+WP_RATE_SLOW = 0.9            # Factor tras una respuesta lenta
+WP_LATENCY_TARGET = float(os.getenv("WP_LATENCY_TARGET", "3"))  # Segundos por unidad (producto)
+WP_RATE_MAX_WAIT = 300        # Un Retry-After absurdo no bloquea más que esto
+
+stats = {"requests": 0, "throttled": 0, "slow": 0, "waited": 0.0}
+
+
+def _read(now):
+    """Estado del limitador (llamar con el lock cogido)."""
+    state = state_store.read_json(WP_RATE_FILE, None) or {}
+    state.setdefault("rate", WP_RATE_INITIAL)
+    state["rate"] = min(WP_RATE_MAX, max(WP_RATE_MIN, state["rate"]))
+    state.setdefault("next_at", now)
+    state.setdefault("cooldown_until", 0)
+    return state
+
+def _write(state):
+    # Sin fsync: si se pierde, se arranca con el último ritmo escrito y los 429 lo corrigen
+    state_store.write_json(WP_RATE_FILE, state, indent=None, fsync=False)
+
+def parse_retry_after(response):
+    """Segundos de la cabecera Retry-After (o None)."""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def acquire():
+    """Espera al siguiente hueco libre para una petición a WordPress. Retorna los segundos esperados."""
+    now = time.time()
+    with state_store.file_lock(WP_RATE_FILE):
+        state = _read(now)
+        slot = max(now, state["next_at"], state["cooldown_until"])
+        state["next_at"] = slot + 1 / state["rate"]
+        _write(state)
+    wait = slot - now
+    if wait > 0:
+        stats["waited"] += wait
+        time.sleep(wait)
+    return wait
+
+def record(status_code, latency=0.0, retry_after=None, units=1):
+    """Ajusta el ritmo con el resultado de una petición.
+
+    status_code None = timeout o error de conexión. units = productos que
+    llevaba la petición (un bloque tarda más sin que WordPress vaya lento).
+    Retorna el ritmo nuevo.
+    """
+    now = time.time()
+    throttled = status_code is None or status_code == 429 or status_code >= 500
+    slow = not throttled and latency / max(1, units) > WP_LATENCY_TARGET
+    stats["requests"] += 1
+    stats["throttled"] += throttled
+    stats["slow"] += slow
+    with state_store.file_lock(WP_RATE_FILE):
+        state = _read(now)
+        if throttled:
+            state["rate"] = max(WP_RATE_MIN, state["rate"] * WP_RATE_DECREASE)
+            state["throttled"] = state.get("throttled", 0) + 1
+        elif slow:
+            state["rate"] = max(WP_RATE_MIN, state["rate"] * WP_RATE_SLOW)
+        else:
+            state["rate"] = min(WP_RATE_MAX, state["rate"] + WP_RATE_INCREASE)
+        if retry_after:
+            state["cooldown_until"] = max(state["cooldown_until"], now + min(retry_after, WP_RATE_MAX_WAIT))
+        if throttled or slow:
+            # El siguiente hueco ya se espacia al ritmo nuevo
+            state["next_at"] = max(state["next_at"], now + 1 / state["rate"])
+        state["requests"] = state.get("requests", 0) + 1
+        _write(state)
+    if throttled:
+        logger.warning(f"🐢 WordPress respondió {status_code or 'sin respuesta'}: ritmo {state['rate']:.2f} pet/s"
+                       + (f", pausa {retry_after:g}s" if retry_after else ""))
+    return state["rate"]
+
+def request(method, url, units=1, **kwargs):
+    """requests.request respetando el ritmo compartido. Las excepciones se propagan."""
+    acquire()
+    start = time.monotonic()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.RequestException:
+        record(None, time.monotonic() - start, units=units)
+        raise
+    record(response.status_code, time.monotonic() - start,
+           parse_retry_after(response) if response.status_code in (429, 503) else None, units)
+    return response
+
+def status():
+    """{"rate", "cooldown_for", "requests", "throttled"} del limitador compartido."""
+    now = time.time()
+    with state_store.file_lock(WP_RATE_FILE):
+        state = _read(now)
+    return {
+        "rate": state["rate"],
+        "cooldown_for": max(0.0, state["cooldown_until"] - now),
+        "requests": state.get("requests", 0),
+        "throttled": state.get("throttled", 0),
+    }
+
+def reset():
+    """Vuelve al ritmo inicial y quita la pausa (p. ej. tras resetear el limitador del servidor)."""
+    with state_store.file_lock(WP_RATE_FILE):
+        state = _read(time.time())
+        state.update(rate=WP_RATE_INITIAL, next_at=time.time(), cooldown_until=0)
+        _write(state)
+
+
+if __name__ == "__main__":
+    if "--reset" in sys.argv:
+        reset()
+        print(f"🔄 Ritmo de WordPress reiniciado a {WP_RATE_INITIAL:g} pet/s")
+    s = status()
+    cooling = f" | ⏳ pausa {s['cooldown_for']:.0f}s" if s["cooldown_for"] else ""
+    print(f"🚦 WordPress: {s['rate']:.2f} pet/s ({s['rate'] * 60:.0f}/min) | "
+          f"{s['requests']} peticiones, {s['throttled']} frenadas{cooling}")